@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Body
+from fastapi import APIRouter, Depends, HTTPException, Body
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from shared_models.db import get_session
-from backend.services.auth_service import AuthService
-from typing import Optional
+from backend.services.auth_service import auth_service
+from backend.dependencies import get_current_user_id, get_user_read_session
+from shared_models.cache import get_user_balance_cached
 
 router = APIRouter(
     prefix="/auth",
@@ -36,8 +37,6 @@ async def login(
     if not init_data:
         raise HTTPException(status_code=400, detail="init_data missing")
 
-    auth_service = AuthService()
-
     token = await auth_service.login_via_telegram(db, init_data)
 
     return TokenResponse(access_token=token)
@@ -47,36 +46,16 @@ async def login(
 # -----------------------
 @router.get("/me", response_model=UserResponse)
 async def get_me(
-    authorization: Optional[str] = Header(None),
-    db: AsyncSession = Depends(get_session),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_user_read_session),
 ):
     """
     Возвращает данные пользователя по JWT в заголовке Authorization.
     """
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-
-    # Получаем сам токен из заголовка
-    token = authorization.replace("Bearer ", "")
-    auth_service = AuthService()
-
-    try:
-        # Извлекаем user_id из токена
-        user_id = auth_service.decode_access_token(token)
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    # Получаем пользователя из БД по id
-    from shared_models.crud.user import get_user_by_id
-
-    user = await get_user_by_id(db, user_id)
+    # Балансы из read-through кэша, в БД — только при промахе
+    user = await get_user_balance_cached(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return UserResponse(
-        id=user.id,
-        username=user.username,
-        coins_balance=user.coins_balance,
-        ton_balance=user.ton_balance
-    )
+    return UserResponse(**user)
 
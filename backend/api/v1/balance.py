@@ -1,8 +1,7 @@
-from fastapi import APIRouter, HTTPException, Header, Body, Depends
+from fastapi import APIRouter, HTTPException, Body, Depends
 from pydantic import BaseModel
-from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from services.auth_service import AuthService
+from backend.dependencies import get_current_user_id
 from shared_models.db import get_session
 from services.balance_service import ExchangeRequest, ExchangeResponse, convert_currency_for_user
 
@@ -11,8 +10,6 @@ router = APIRouter(
     tags=["balance"]
 )
 
-auth_service = AuthService()
-
 
 # ------------------------
 # /balance/convert
@@ -20,28 +17,12 @@ auth_service = AuthService()
 @router.post("/convert", response_model=ExchangeResponse)
 async def convert(
     payload: ExchangeRequest = Body(...),
-    authorization: Optional[str] = Header(None),
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_session),
 ):
     """
     Конвертирует валюту (например, TON → COINS) для пользователя по токену.
     """
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-
-    # ⚙️ Безопасно извлекаем токен
-    parts = authorization.split(" ")
-    if len(parts) != 2 or parts[0].lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Invalid authorization format")
-
-    token = parts[1]
-
-    try:
-        user_id = auth_service.decode_access_token(token)
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-
     return await convert_currency_for_user(
         user_id=user_id,
         in_currency=payload.inCurrency,
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.dependencies import get_current_user_id, get_user_read_session
+from shared_models.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from shared_models.crud.transactions import get_transactions_by_user
+from shared_models.crud.lottery_tickets import get_user_lottery_tickets
+from shared_models.crud.mines_game import get_user_games
+from shared_models.schemas.pagination import Page
+from shared_models.schemas.transactions import TransactionRead
+from shared_models.schemas.lottery_ticket import LotteryTicketRead
+from shared_models.schemas.mines_game import MinesGameRead
+
+
+router = APIRouter(
+    prefix="/history",
+    tags=["history"]
+)
+
+
+# -----------------------
+# Постраничная история пользователя.
+# Первый запрос без cursor, дальше передаём next_cursor из ответа,
+# пока он не станет null.
+# -----------------------
+async def _page(fetch, db: AsyncSession, user_id: int, cursor: Optional[str], limit: int) -> dict:
+    try:
+        items, next_cursor = await fetch(db, user_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+# -----------------------
+# /history/transactions
+# -----------------------
+@router.get("/transactions", response_model=Page[TransactionRead])
+async def history_transactions(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_user_read_session),
+):
+    return await _page(get_transactions_by_user, db, user_id, cursor, limit)
+
+
+# -----------------------
+# /history/tickets
+# -----------------------
+@router.get("/tickets", response_model=Page[LotteryTicketRead])
+async def history_tickets(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_user_read_session),
+):
+    return await _page(get_user_lottery_tickets, db, user_id, cursor, limit)
+
+
+# -----------------------
+# /history/mines
+# -----------------------
+@router.get("/mines", response_model=Page[MinesGameRead])
+async def history_mines(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_user_read_session),
+):
+    return await _page(get_user_games, db, user_id, cursor, limit)
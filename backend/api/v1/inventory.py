@@ -1,17 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Query
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from pydantic import BaseModel, Field
+from typing import List, Optional, Tuple, Iterable
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.services.auth_service import AuthService
-from shared_models.db import get_session
+from backend.dependencies import get_current_user_id, get_user_read_session
+from shared_models.db import get_session, unit_of_work
+from shared_models.user_lock import user_locks
+from shared_models.catalog import gift_catalog, CatalogSnapshot, TON_TO_HRPN
 from shared_models.crud.inventory import (
     get_inventory_by_user_id,
+    get_inventory_stacks,
+    get_inventory_page,
     get_inventory_item,
-    remove_gift_from_user,
+    remove_inventory_item,
+    remove_inventory_items,
 )
-from shared_models.crud.user import update_user_balance, get_user_by_id
-from shared_models.crud.transactions import create_transaction
-from shared_models.schemas.inventory import InventoryRead
+from shared_models.crud.user import change_user_balance
+from shared_models.crud.transactions import create_transaction, create_transactions
+from shared_models.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from shared_models.schemas.gift import GiftRead
+from shared_models.schemas.inventory import InventoryRead, InventoryStacksResponse, InventoryItemsPage
 from shared_models.schemas.transactions import TransactionCreate
 
 
@@ -20,59 +28,176 @@ router = APIRouter(
     tags=["inventory"]
 )
 
-auth_service = AuthService()  # SECRET_KEY берется из settings
+MAX_ITEMS_PER_REQUEST = 500
 
 
 # -----------------------
-# Вспомогательная функция (чтобы не дублировать код)
+# Schemas
 # -----------------------
-async def get_current_user_id(authorization: Optional[str]) -> int:
+class ItemsRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_ITEMS_PER_REQUEST)
+
+
+class SellManyResponse(BaseModel):
+    sold: int
+    gain: float
+    message: str
+
+
+class WithdrawManyResponse(BaseModel):
+    requested: int
+    message: str
+
+
+# -----------------------
+# Вспомогательные функции
+# -----------------------
+def _gift_side_table(catalog: CatalogSnapshot, gift_ids: Iterable[int]) -> List[GiftRead]:
     """
-    Достаёт user_id из JWT токена. 
-    Поднимает 401, если токен отсутствует или неверен.
+    Метаданные подарков из снимка каталога, по одному разу на gift_id.
     """
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
+    gifts = []
+    for gift_id in dict.fromkeys(gift_ids):
+        gift = catalog.by_id.get(gift_id)
+        if gift is not None:
+            gifts.append(GiftRead.model_validate(gift, from_attributes=True))
+    return gifts
 
-    parts = authorization.split(" ")
-    if len(parts) != 2 or parts[0].lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Invalid authorization format")
 
-    token = parts[1]
-    try:
-        user_id = auth_service.decode_access_token(token)
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
+def _sale_value(catalog: CatalogSnapshot, gift_id: int) -> Tuple[float, str]:
+    """
+    Цена продажи подарка в HRPN и исходная валюта его стоимости.
+    """
+    gift = catalog.by_id.get(gift_id)
+    if gift is None:
+        raise HTTPException(status_code=400, detail="This item has no sellable value")
+    if gift.cost_coins is not None:
+        return gift.cost_coins, "HRPN"
+    if gift.cost_ton is not None:
+        return gift.cost_ton * TON_TO_HRPN, "TON"  # примерная конвертация
+    raise HTTPException(status_code=400, detail="This item has no sellable value")
+
+
+async def _sell(
+    db: AsyncSession,
+    user_id: int,
+    inventory_ids: Optional[List[int]] = None,
+    gift_id: Optional[int] = None,
+) -> SellManyResponse:
+    """
+    Пакетная продажа в одной транзакции: DELETE … RETURNING,
+    одно суммарное начисление и многострочная вставка транзакций.
+    """
+    catalog = await gift_catalog.get(db)
+
+    async with user_locks.hold(user_id), unit_of_work(db):
+        removed = await remove_inventory_items(db, user_id, inventory_ids=inventory_ids, gift_id=gift_id)
+        if not removed:
+            raise HTTPException(status_code=404, detail="Items not found")
+
+        values = [_sale_value(catalog, row.gift_id)[0] for row in removed]
+        total = sum(values)
 
-    return user_id
+        await change_user_balance(db, user_id, coins_delta=total)
+        await create_transactions(db, [
+            TransactionCreate(
+                user_id=user_id,
+                type="gift_sale",
+                amount=gain,
+                gift_id=row.gift_id,
+                status="completed",
+            )
+            for row, gain in zip(removed, values)
+        ])
 
+    return SellManyResponse(sold=len(removed), gain=total, message=f"{len(removed)} items sold for {total} HRPN")
+
+
+async def _withdraw(db: AsyncSession, user_id: int, inventory_ids: List[int]) -> int:
+    """
+    Предметы забираются из инвентаря сразу (их нельзя продать или вывести
+    повторно), на каждый создаётся pending-заявка для бота вывода.
+    Заявка хранит id и received_at предмета — при отказе его возвращает
+    shared_models.crud.transactions.restore_withdrawal.
+    """
+    async with user_locks.hold(user_id), unit_of_work(db):
+        removed = await remove_inventory_items(db, user_id, inventory_ids=inventory_ids)
+        if not removed:
+            raise HTTPException(status_code=404, detail="Item not found")
+
+        await create_transactions(db, [
+            TransactionCreate(
+                user_id=user_id,
+                type="gift_withdrawal",
+                gift_id=row.gift_id,
+                status="pending",
+                inventory_id=row.id,
+                item_received_at=row.received_at,
+            )
+            for row in removed
+        ])
+    return len(removed)
 
 # -----------------------
 # /inventory/ — все предметы пользователя
 # -----------------------
 @router.get("/", response_model=List[InventoryRead])
 async def get_inventory(
-    authorization: Optional[str] = Header(None),
-    db: AsyncSession = Depends(get_session),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_user_read_session),
 ):
-    user_id = await get_current_user_id(authorization)
-
     inventory = await get_inventory_by_user_id(db, user_id)
     return inventory
 
 
+# -----------------------
+# /inventory/stacks — инвентарь, сгруппированный по подаркам
+# -----------------------
+@router.get("/stacks", response_model=InventoryStacksResponse)
+async def get_stacks(
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_user_read_session),
+):
+    stacks = await get_inventory_stacks(db, user_id)
+    catalog = await gift_catalog.get(db)
+    return {
+        "stacks": stacks,
+        "gifts": _gift_side_table(catalog, (s.gift_id for s in stacks)),
+    }
+
+
+# -----------------------
+# /inventory/items?cursor=&limit=&giftId= — отдельные предметы страницами
+# -----------------------
+@router.get("/items", response_model=InventoryItemsPage)
+async def get_items(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    gift_id: Optional[int] = Query(None, alias="giftId"),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_user_read_session),
+):
+    try:
+        items, next_cursor = await get_inventory_page(db, user_id, gift_id=gift_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    catalog = await gift_catalog.get(db)
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "gifts": _gift_side_table(catalog, (i.gift_id for i in items)),
+    }
+
+
 # -----------------------
 # /inventory/getItem?id=
 # -----------------------
 @router.get("/getItem", response_model=InventoryRead)
 async def get_item(
     id: int = Query(...),
-    authorization: Optional[str] = Header(None),
-    db: AsyncSession = Depends(get_session),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_user_read_session),
 ):
-    user_id = await get_current_user_id(authorization)
-
-
     item = await get_inventory_item(db, id)
     if not item or item.user_id != user_id:
         raise HTTPException(status_code=404, detail="Item not found")
@@ -86,45 +211,56 @@ async def get_item(
 @router.post("/sellItem")
 async def sell_item(
     id: int = Query(...),
-    authorization: Optional[str] = Header(None),
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_session),
 ):
-    user_id = await get_current_user_id(authorization)
-
-    item = await get_inventory_item(db, id)
-    if not item or item.user_id != user_id:
-        raise HTTPException(status_code=404, detail="Item not found")
-
-    gift = item.gift
-    if gift.cost_coins is not None:
-        gain = gift.cost_coins
-        currency = "HRPN"
-    elif gift.cost_ton is not None:
-        gain = gift.cost_ton * 1000  # примерная конвертация
-        currency = "TON"
-    else:
-        raise HTTPException(status_code=400, detail="This item has no sellable value")
-    
-    user = await get_user_by_id(db, user_id)
-    new_balance = user.coins_balance + gain
-
-    await update_user_balance(db, user_id, coins_balance=new_balance)
+    catalog = await gift_catalog.get(db)
+
+    # Удаление предмета, начисление и запись транзакции — один COMMIT
+    async with user_locks.hold(user_id), unit_of_work(db):
+        gift_id = await remove_inventory_item(db, user_id, id)
+        if gift_id is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+
+        gain, currency = _sale_value(catalog, gift_id)
+
+        await change_user_balance(db, user_id, coins_delta=gain)
+
+        # Создаём транзакцию
+        tx = TransactionCreate(
+            user_id=user_id,
+            type="gift_sale",
+            amount=gain,
+            gift_id=gift_id,
+            status="completed",
+        )
+        await create_transaction(db, tx)
 
+    return {"message": f"Item sold for {gain} {currency}"}
 
-    await remove_gift_from_user(db, user_id, gift.id)
 
-    # Создаём транзакцию
-    tx = TransactionCreate(
-        user_id=user_id,
-        type="gift_sale",
-        amount=gain,
-        gift_id=gift.id,
-        status="completed",
-   )
+# -----------------------
+# /inventory/sellMany — несколько предметов по id
+# -----------------------
+@router.post("/sellMany", response_model=SellManyResponse)
+async def sell_many(
+    payload: ItemsRequest = Body(...),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_session),
+):
+    return await _sell(db, user_id, inventory_ids=payload.ids)
 
-    await create_transaction(db, tx)
 
-    return {"message": f"Item sold for {gain} {currency}"}
+# -----------------------
+# /inventory/sellAll?giftId= — все экземпляры подарка (без giftId — весь инвентарь)
+# -----------------------
+@router.post("/sellAll", response_model=SellManyResponse)
+async def sell_all(
+    gift_id: Optional[int] = Query(None, alias="giftId"),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_session),
+):
+    return await _sell(db, user_id, gift_id=gift_id)
 
 
 # -----------------------
@@ -133,23 +269,21 @@ async def sell_item(
 @router.post("/withdrawItem")
 async def withdraw_item(
     id: int = Query(...),
-    authorization: Optional[str] = Header(None),
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_session),
 ):
-    user_id = await get_current_user_id(authorization)
-
-
-    item = await get_inventory_item(db, id)
-    if not item or item.user_id != user_id:
-        raise HTTPException(status_code=404, detail="Item not found")
+    await _withdraw(db, user_id, [id])
+    return {"message": "Withdrawal request created"}
 
-    tx = TransactionCreate(
-        user_id=user_id,
-        type="gift_withdrawal",
-        gift_id=item.gift_id,
-        status="pending",
-    )
-    async with get_session() as db:
-        await create_transaction(db, tx)
 
-    return {"message": "Withdrawal request created"}
+# -----------------------
+# /inventory/withdrawMany
+# -----------------------
+@router.post("/withdrawMany", response_model=WithdrawManyResponse)
+async def withdraw_many(
+    payload: ItemsRequest = Body(...),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_session),
+):
+    requested = await _withdraw(db, user_id, payload.ids)
+    return WithdrawManyResponse(requested=requested, message=f"{requested} withdrawal requests created")
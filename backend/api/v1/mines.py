@@ -1,12 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Body
+from fastapi import APIRouter, Depends, HTTPException, Header, Body, Response
 from pydantic import BaseModel
-from typing import Optional, Literal
+from typing import Optional, Literal, List
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.services.auth_service import AuthService
-from backend.services.mines_service import MinesService
+from backend.services.mines_service import MinesService, PAYOUT_TABLES_JSON, PAYOUT_TABLES_ETAG
 from shared_models.db import get_session
-from backend.dependencies import get_redis
+from backend.dependencies import get_redis, get_current_user_id
+from backend.rate_limit import RateLimit, Bucket
 
 
 router = APIRouter(
@@ -14,7 +14,9 @@ router = APIRouter(
     tags=["mines"]
 )
 
-auth_service = AuthService()
+# Бюджеты запросов: на пользователя и на IP (за одним NAT бывает много игроков)
+START_LIMIT = RateLimit("mines_start", user=Bucket(rate=2, burst=5), ip=Bucket(rate=20, burst=40))
+OPEN_LIMIT = RateLimit("mines_open", user=Bucket(rate=10, burst=25), ip=Bucket(rate=100, burst=200))
 
 
 # -----------------------
@@ -31,52 +33,75 @@ class StartGameResponse(BaseModel):
     gameData: dict
 
 
+class OpenCellRequest(BaseModel):
+    cell: int  # 0..24
+
+
 class OpenCellResponse(BaseModel):
     coeff: float
     totalWin: float
     isEnd: bool
+    cell: Optional[int] = None
+    isMine: bool = False
+    # Раскрытое поле — только когда игра закончилась
+    mines: Optional[List[int]] = None
+    openedCells: Optional[List[int]] = None
+
+
+class OpenCellsRequest(BaseModel):
+    cells: Optional[List[int]] = None  # конкретные клетки по порядку
+    count: Optional[int] = None        # или сколько случайных клеток открыть
+    cashout: bool = False              # вывести выигрыш сразу после открытия
+
+
+class OpenStep(BaseModel):
+    cell: int
+    isMine: bool
+    coeff: float
+    totalWin: float
+
+
+class OpenCellsResponse(OpenCellResponse):
+    steps: List[OpenStep]
 
 
 class CashoutResponse(BaseModel):
     totalWin: float
     message: str
+    mines: Optional[List[int]] = None
+    openedCells: Optional[List[int]] = None
 
 
 # -----------------------
-# Вспомогательная функция
+# /mines/tables — таблицы выплат для всех 1–24 мин
 # -----------------------
-async def get_current_user_id(authorization: Optional[str]) -> int:
+@router.get("/tables")
+async def payout_tables(if_none_match: Optional[str] = Header(None)):
     """
-    Унифицированная проверка заголовка Authorization.
-    Возвращает user_id из JWT токена.
+    Таблицы не меняются между релизами, поэтому отдаём заранее сериализованный
+    ответ с долгоживущим ETag; клиент перезапрашивает их с If-None-Match.
     """
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-
-    parts = authorization.split(" ")
-    if len(parts) != 2 or parts[0].lower() != "bearer":
-        raise HTTPException(status_code=401, detail="Invalid authorization format")
-
-    token = parts[1]
-    try:
-        user_id = auth_service.decode_access_token(token)
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    return user_id
+    headers = {
+        "ETag": PAYOUT_TABLES_ETAG,
+        "Cache-Control": "public, max-age=86400",
+    }
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        if "*" in tags or PAYOUT_TABLES_ETAG in tags or f"W/{PAYOUT_TABLES_ETAG}" in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(content=PAYOUT_TABLES_JSON, media_type="application/json", headers=headers)
 
 
 # -----------------------
 # /mines/start
 # -----------------------
-@router.post("/start", response_model=StartGameResponse)
+@router.post("/start", response_model=StartGameResponse, dependencies=[Depends(START_LIMIT)])
 async def start_game(
     payload: StartGameRequest = Body(...),
-    authorization: Optional[str] = Header(None),
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_session),
     redis=Depends(get_redis),
 ):
-    user_id = await get_current_user_id(authorization)
     mines_service = MinesService(redis)
 
     try:
@@ -95,36 +120,64 @@ async def start_game(
 # -----------------------
 # /mines/open
 # -----------------------
-@router.post("/open", response_model=OpenCellResponse)
+@router.post("/open", response_model=OpenCellResponse, dependencies=[Depends(OPEN_LIMIT)])
 async def open_cell(
-    authorization: Optional[str] = Header(None),
+    payload: OpenCellRequest = Body(...),
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_session),
     redis=Depends(get_redis),
 ):
-    user_id = await get_current_user_id(authorization)
     mines_service = MinesService(redis)
 
     try:
-        result = await mines_service.process_open_cell(db, user_id)
+        result = await mines_service.process_open_cell(db, user_id, payload.cell)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+# -----------------------
+# /mines/openMany — несколько клеток / автоигра за один запрос
+# -----------------------
+@router.post("/openMany", response_model=OpenCellsResponse, dependencies=[Depends(OPEN_LIMIT)])
+async def open_many(
+    payload: OpenCellsRequest = Body(...),
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_session),
+    redis=Depends(get_redis),
+):
+    mines_service = MinesService(redis)
+
+    try:
+        return await mines_service.process_open_cells(
+            db,
+            user_id,
+            cells=payload.cells,
+            count=payload.count,
+            cashout=payload.cashout,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 # -----------------------
 # /mines/cashout
 # -----------------------
-@router.post("/cashout", response_model=CashoutResponse)
+@router.post("/cashout", response_model=CashoutResponse, dependencies=[Depends(OPEN_LIMIT)])
 async def cashout(
-    authorization: Optional[str] = Header(None),
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_session),
     redis=Depends(get_redis),
 ):
-    user_id = await get_current_user_id(authorization)
     mines_service = MinesService(redis)
 
     try:
         result = await mines_service.process_cashout(db, user_id)
-        return {"totalWin": result["totalWin"], "message": "Cashout successful"}
+        return {
+            "totalWin": result["totalWin"],
+            "message": "Cashout successful",
+            "mines": result["mines"],
+            "openedCells": result["openedCells"],
+        }
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,48 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from backend.services.auth_service import AuthService
-from shared_models.db import get_session  # предполагаем, что есть зависимости
-from shared_models.schemas.user import UserResponse
-from shared_models.crud.user import get_top_users_by_coins, get_user_by_id
+from backend.dependencies import get_current_user_id, get_user_read_session
+from shared_models.db import get_session, get_read_session
+from shared_models.schemas.user import UserResponse, UserSummary, LadderEntry, LadderRank
+from shared_models.cache import get_user_balance_cached, get_inventory_summary_cached
+from shared_models.crud.user import get_user_by_id, UserLoad
+from shared_models.leaderboard import get_top_snapshot, get_user_rank
+from shared_models.versions import profile_etag, etag_matches
 
 router = APIRouter(
     prefix="/profile",
     tags=["profile"]
 )
 
-auth_service = AuthService()
 # ------------------------
 # Эндпоинты профиля
 # ------------------------
 
 @router.get("/me", response_model=UserResponse)
 async def profile_me(
-    authorization: Optional[str] = Header(None),
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_session)
 ):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-    
-    try:
-        token = authorization.split(" ")[1]
-        user_id = auth_service.decode_access_token(token)
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
-
-    user = await get_user_by_id(db, user_id)
+    # Версия читается до запроса в БД; профиль не менялся — 304 без похода в БД.
+    # Сессия primary, не реплика: отстающая реплика вернула бы данные старше версии в ETag
+    etag = await profile_etag(user_id)
+    headers = {"Cache-Control": "private, no-cache"}
+    if etag is not None:
+        headers["ETag"] = etag
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+    user = await get_user_by_id(db, user_id, load=UserLoad.PROFILE)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    
+
+    response.headers.update(headers)
     return user
 
-@router.get("/getLadder", response_model=List[UserResponse])
+@router.get("/summary", response_model=UserSummary)
+async def profile_summary(
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_user_read_session),
+):
+    # Шапка приложения: два ключа read-through кэша, БД только при промахе
+    user = await get_user_balance_cached(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    inventory = await get_inventory_summary_cached(db, user_id)
+    return UserSummary(**user, inventory_count=inventory["count"])
+
+@router.get("/getLadder", response_model=List[LadderEntry])
 async def profile_get_ladder(
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_read_session),
 ):
+    # Готовый JSON из Redis ZSET, отдаём без повторной сериализации
+    snapshot = await get_top_snapshot(db, limit=100)
+    return Response(content=snapshot, media_type="application/json")
 
-    users = await get_top_users_by_coins(db, limit=100)
-    return users
+@router.get("/getMyRank", response_model=LadderRank)
+async def profile_get_my_rank(
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_session)
+):
+    rank = await get_user_rank(db, user_id)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return rank
 
 @router.get("/getTasks")
 async def profile_get_tasks():
@@ -1,41 +1,28 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query, Header
-from sqlalchemy.orm import Session
-from shared_models.db import get_session 
-from services.ticket_service import buy_ticket
+from fastapi import APIRouter, Depends, HTTPException, Query
+from services.ticket_service import buy_tickets, MAX_TICKETS_PER_PURCHASE
 from shared_models.schemas.gift import GiftRead
-from typing import List, Optional
-from services.auth_service import AuthService
+from backend.dependencies import get_current_user_id
+from backend.rate_limit import RateLimit, Bucket
 from sqlalchemy.ext.asyncio import AsyncSession
 from shared_models.db import get_session
 
 router = APIRouter()
 
-auth_service = AuthService()  # автоматически берёт SECRET_KEY из settings
+# Покупка до MAX_TICKETS_PER_PURCHASE билетов за запрос — частые запросы не нужны
+BUY_LIMIT = RateLimit("tickets_buy", user=Bucket(rate=2, burst=5), ip=Bucket(rate=20, burst=40))
 
-@router.post("/tickets/buy", response_model=List[GiftRead])
+@router.post("/tickets/buy", response_model=List[GiftRead], dependencies=[Depends(BUY_LIMIT)])
 async def buy_ticket_endpoint(
     ticket_type: str = Query(...),
     currency: str = Query(...),
-    authorization: Optional[str] = Header(None),  
+    count: int = Query(1, ge=1, le=MAX_TICKETS_PER_PURCHASE),
+    user_id: int = Depends(get_current_user_id),
     db: AsyncSession = Depends(get_session)
 ):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Authorization header missing")
-
-    try:
-        token = authorization.split(" ")[1] 
-    except IndexError:
-        raise HTTPException(status_code=401, detail="Invalid authorization header format")
-
-    try:
-        user_id = auth_service.decode_access_token(token)
-    except HTTPException as e:
-        raise e
-
     try:
 
-        gifts = await buy_ticket(db, user_id, ticket_type, currency)
-        return gifts
+        result = await buy_tickets(db, user_id, ticket_type, currency, count=count)
+        return result["wins"]
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
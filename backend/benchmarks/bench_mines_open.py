@@ -0,0 +1,115 @@
+"""
+Бенчмарк открытия клеток в mines: старый путь (GET → json → SET) против Lua-скрипта (EVALSHA).
+
+Нужен только Redis, БД не трогается (игры не доходят до выплаты).
+
+    REDIS_URL=redis://localhost:6379/15 python -m backend.benchmarks.bench_mines_open --games 200 --opens 20
+
+Внимание: скрипт пишет ключи mines_bench:* в указанную базу Redis и удаляет их после прогона.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from redis import asyncio as aioredis
+
+from backend.services.mines_service import MinesService, N, OPEN_CELLS_SCRIPT, SETTLE_LEASE_MS, generate_mines_mask
+
+KEY_PREFIX = "mines_bench"
+
+
+# -----------------------------
+# Старый путь: JSON-строка, несколько round trip'ов на клик
+# -----------------------------
+async def legacy_open(redis: aioredis.Redis, key: str, ttl: int) -> bool:
+    data_raw = await redis.get(key)
+    if not data_raw:
+        return False
+    game = json.loads(data_raw)
+    p_mine = game["remaining_mines"] / game["remaining_cells"]
+    if random.random() < p_mine:
+        await redis.delete(key)
+        return False
+    game["opened_cells"] += 1
+    game["remaining_cells"] -= 1
+    await redis.set(key, json.dumps(game), ex=ttl)
+    return True
+
+
+async def legacy_player(redis: aioredis.Redis, user_id: int, opens: int, ttl: int) -> int:
+    key = f"{KEY_PREFIX}:legacy:{user_id}"
+    game = {
+        "user_id": user_id, "bet": 1.0, "currency": "hrpn", "mines": 1,
+        "opened_cells": 0, "remaining_cells": N, "remaining_mines": 1,
+    }
+    await redis.set(key, json.dumps(game), ex=ttl)
+    done = 0
+    for _ in range(opens):
+        done += 1
+        if not await legacy_open(redis, key, ttl):
+            break
+    return done
+
+
+# -----------------------------
+# Новый путь: hash + EVALSHA
+# -----------------------------
+async def script_player(service: MinesService, user_id: int, opens: int) -> int:
+    key = f"{KEY_PREFIX}:script:{user_id}"
+    await service.redis.hset(key, mapping={
+        "user_id": user_id, "bet": "1.0", "currency": "hrpn", "mines": 1,
+        "mines_mask": generate_mines_mask(1), "opened_mask": 0,
+    })
+    await service.redis.expire(key, service.game_ttl)
+    done = 0
+    for cell in random.sample(range(N), opens):
+        done += 1
+        result = service._parse_state(
+            await OPEN_CELLS_SCRIPT(service.redis, [key], [service.game_ttl, N, 1, 0, SETTLE_LEASE_MS, cell])
+        )
+        if result["status"] != "safe":
+            break
+    return done
+
+
+async def run(label: str, coros) -> float:
+    start = time.perf_counter()
+    counts = await asyncio.gather(*coros)
+    elapsed = time.perf_counter() - start
+    total = sum(counts)
+    rate = total / elapsed if elapsed else 0.0
+    print(f"{label:<8} opens={total:<7} time={elapsed:.3f}s  opens/sec={rate:,.0f}")
+    return rate
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--redis-url", default=os.getenv("REDIS_URL", "redis://localhost:6379/15"))
+    parser.add_argument("--games", type=int, default=200, help="одновременных игроков")
+    parser.add_argument("--opens", type=int, default=20, help="открытий на игру (max)")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    redis = aioredis.from_url(args.redis_url, decode_responses=True)
+    service = MinesService(redis)
+    await MinesService.load_scripts(redis)
+
+    try:
+        for r in range(1, args.rounds + 1):
+            print(f"--- round {r}")
+            before = await run("legacy", [legacy_player(redis, u, args.opens, service.game_ttl) for u in range(args.games)])
+            after = await run("script", [script_player(service, u, args.opens) for u in range(args.games)])
+            if before:
+                print(f"speedup  x{after / before:.2f}")
+    finally:
+        keys = [k async for k in redis.scan_iter(f"{KEY_PREFIX}:*")]
+        if keys:
+            await redis.delete(*keys)
+        await redis.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
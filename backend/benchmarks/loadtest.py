@@ -0,0 +1,459 @@
+"""
+Нагрузочный прогон backend.main:app на сценариях реальных игроков:
+логин по подписанному init_data → шапка профиля → mines (старт, K клеток, вывод)
+→ покупка билета → продажа предмета → /profile/me с If-None-Match.
+
+Считает по каждому маршруту p50/p95/p99, пропускную способность и число
+SQL-запросов на HTTP-запрос, сохраняет результаты в JSON для сравнения релизов.
+
+In-process (httpx.ASGITransport, запросы в БД считаются), Postgres и Redis уже запущены:
+
+    SECRET_KEY=... POSTGRES_HOST=... POSTGRES_PORT=... POSTGRES_USER=... POSTGRES_PASSWORD=... \\
+    POSTGRES_DB=... REDIS_URL=redis://localhost:6379/15 \\
+    python -m backend.benchmarks.loadtest --users 100 --duration 30 --out results.json
+
+Локальные серверы без docker (initdb/pg_ctl и redis-server из PATH или --pg-bin/--redis-bin):
+
+    SECRET_KEY=... python -m backend.benchmarks.loadtest --local-servers --users 100 --duration 30
+
+Внешний сервер (запросы в БД не считаются; SECRET_KEY и база — те же, что у сервера):
+
+    python -m backend.benchmarks.loadtest --url http://localhost:8000 --users 100 --duration 30
+
+Сравнение с прошлым прогоном: --baseline old.json.
+
+Внимание: скрипт создаёт пользователей load_* (tg_id от --tg-id-base) и подарки
+«Load gift *», выставляет им балансы и инвентарь. Не запускать на боевой базе.
+"""
+import argparse
+import asyncio
+import contextvars
+import hashlib
+import hmac
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+import httpx
+
+# backend.main и сервисы импортируют config/services/dependencies от корня backend
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+for path in (REPO_DIR, BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+CELLS = 25
+LOAD_GIFTS = 10
+
+
+# -----------------------------
+# Локальные Postgres и Redis
+# -----------------------------
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _binary(name: str, directory: Optional[str]) -> str:
+    path = os.path.join(directory, name) if directory else shutil.which(name)
+    if not path or not os.path.exists(path):
+        raise SystemExit(f"{name} не найден (укажите каталог через --pg-bin / --redis-bin)")
+    return path
+
+
+class LocalServers:
+    """
+    Временные Postgres (initdb + pg_ctl, trust-авторизация) и Redis (без persistence)
+    в каталоге tmp. Выставляет POSTGRES_* и REDIS_URL до импорта приложения.
+    """
+
+    def __init__(self, pg_bin: Optional[str], redis_bin: Optional[str]):
+        self.pg_bin = pg_bin
+        self.redis_bin = redis_bin
+        self.root = tempfile.mkdtemp(prefix="loadtest_")
+        self.pg_data = os.path.join(self.root, "pg")
+        self.redis_proc: Optional[subprocess.Popen] = None
+
+    def start(self) -> None:
+        pg_port, redis_port = _free_port(), _free_port()
+
+        subprocess.run(
+            [_binary("initdb", self.pg_bin), "-D", self.pg_data, "-U", "postgres", "--auth=trust"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+        options = f"-p {pg_port} -c listen_addresses=127.0.0.1 -k {self.root} -c max_connections=200"
+        subprocess.run(
+            [_binary("pg_ctl", self.pg_bin), "-D", self.pg_data, "-o", options,
+             "-l", os.path.join(self.root, "pg.log"), "-w", "start"],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+
+        self.redis_proc = subprocess.Popen(
+            [_binary("redis-server", self.redis_bin), "--port", str(redis_port),
+             "--bind", "127.0.0.1", "--save", "", "--appendonly", "no"],
+            stdout=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", redis_port), timeout=0.2).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+        os.environ.update(
+            POSTGRES_USER="postgres", POSTGRES_PASSWORD="", POSTGRES_HOST="127.0.0.1",
+            POSTGRES_PORT=str(pg_port), POSTGRES_DB="postgres",
+            REDIS_URL=f"redis://127.0.0.1:{redis_port}/0",
+        )
+        print(f"Postgres :{pg_port}, Redis :{redis_port} в {self.root}")
+
+    def stop(self) -> None:
+        if self.redis_proc is not None:
+            self.redis_proc.terminate()
+            self.redis_proc.wait()
+        if os.path.exists(self.pg_data):
+            subprocess.run(
+                [_binary("pg_ctl", self.pg_bin), "-D", self.pg_data, "-m", "fast", "stop"],
+                stdout=subprocess.DEVNULL,
+            )
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+# -----------------------------
+# Данные: пользователи, подарки, инвентарь
+# -----------------------------
+async def seed(users: int, tg_id_base: int, balance: float, items: int) -> List[int]:
+    """
+    Идемпотентно готовит пользователей load_*: баланс, не меньше items предметов.
+    Возвращает tg_id. Схема приводится к последней миграции.
+    """
+    from sqlalchemy import select, func
+    from shared_models import db
+    from shared_models.models import Gift, Inventory
+    from shared_models.crud.user import create_user, get_user_id_by_tg_id, update_user_balance
+    from shared_models.crud.gift import create_gift
+    from shared_models.crud.inventory import add_gifts_to_user
+    from shared_models.schemas.user import UserCreate
+    from shared_models.schemas.gift import GiftCreate
+
+    await db.init_db()
+    async with db.get_context_manager() as session:
+        gift_ids = list((await session.scalars(select(Gift.id).where(Gift.name.like("Load gift %")))).all())
+        for i in range(len(gift_ids), LOAD_GIFTS):
+            gift = await create_gift(session, GiftCreate(
+                name=f"Load gift {i}", telegram_gift_id=f"load-{i}",
+                cost_coins=100.0 * (i + 1), image_url=f"https://example.com/load/{i}.png",
+            ))
+            gift_ids.append(gift.id)
+
+        tg_ids = []
+        for i in range(users):
+            tg_id = tg_id_base + i
+            user_id = await get_user_id_by_tg_id(session, tg_id)
+            if user_id is None:
+                user_id = (await create_user(session, UserCreate(
+                    username=f"load_{i}", tg_id=tg_id, chat_id=tg_id,
+                    avatar_url="https://example.com/avatar.png", ref_code=f"LOAD{tg_id}",
+                ), commit=False)).id
+            await update_user_balance(session, user_id, coins_balance=balance, ton_balance=balance / 1000, commit=False)
+            have = await session.scalar(select(func.count()).select_from(Inventory).where(Inventory.user_id == user_id))
+            if have < items:
+                await add_gifts_to_user(session, user_id, random.choices(gift_ids, k=items - have), commit=False)
+            tg_ids.append(tg_id)
+        await db.commit_session(session)
+
+    await db.engine.dispose()
+    return tg_ids
+
+
+def sign_init_data(tg_id: int, secret_key: str) -> str:
+    """
+    init_data Telegram WebApp с подписью, которую проверяет backend.dependencies.
+    """
+    data = {
+        "auth_date": str(int(time.time())),
+        "query_id": f"load-{tg_id}",
+        "user": json.dumps({"id": tg_id, "first_name": "Load", "username": f"load_{tg_id}"}),
+    }
+    check = "\n".join(f"{k}={v}" for k, v in sorted(data.items()))
+    secret = hmac.new(b"WebAppData", secret_key.encode(), hashlib.sha256).digest()
+    data["hash"] = hmac.new(secret, check.encode(), hashlib.sha256).hexdigest()
+    return urlencode(data)
+
+
+# -----------------------------
+# Статистика
+# -----------------------------
+# Счётчик SQL текущего HTTP-запроса; after-commit задачи наследуют контекст
+_queries: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar("loadtest_queries", default=None)
+
+
+def _count_query(*_args) -> None:
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def count_queries_on(engine) -> None:
+    from sqlalchemy import event
+    event.listen(engine.sync_engine, "before_cursor_execute", _count_query)
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Stats:
+    def __init__(self, count_queries: bool):
+        self.count_queries = count_queries
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.queries: Dict[str, int] = Counter()
+
+    def record(self, route: str, ms: float, status: int, queries: int) -> None:
+        self.latencies[route].append(ms)
+        self.statuses[route][str(status)] += 1
+        self.queries[route] += queries
+
+    def summary(self, elapsed: float) -> dict:
+        routes = {}
+        for route in sorted(self.latencies):
+            values = sorted(self.latencies[route])
+            routes[route] = {
+                "requests": len(values),
+                "rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50), 3),
+                "p95_ms": round(percentile(values, 95), 3),
+                "p99_ms": round(percentile(values, 99), 3),
+                "max_ms": round(values[-1], 3),
+                "statuses": dict(self.statuses[route]),
+                "queries_per_request": round(self.queries[route] / len(values), 2) if self.count_queries else None,
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        errors = sum(n for c in self.statuses.values() for s, n in c.items() if int(s) >= 500)
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "server_errors": errors,
+            "queries_per_request": round(sum(self.queries.values()) / total, 2) if self.count_queries and total else None,
+            "routes": routes,
+        }
+
+
+class Client:
+    def __init__(self, http: httpx.AsyncClient, stats: Stats):
+        self.http = http
+        self.stats = stats
+
+    async def call(self, route: str, method: str, url: str, **kwargs) -> httpx.Response:
+        counter = [0]
+        token = _queries.set(counter)
+        start = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, **kwargs)
+        finally:
+            _queries.reset(token)
+        self.stats.record(route, (time.perf_counter() - start) * 1000, response.status_code, counter[0])
+        return response
+
+
+# -----------------------------
+# Сценарий игрока
+# -----------------------------
+async def player(client: Client, tg_id: int, args, secret_key: str, deadline: float) -> int:
+    response = await client.call("POST /auth", "POST", "/auth", json={"init_data": sign_init_data(tg_id, secret_key)})
+    if response.status_code != 200:
+        return 0
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    etag = None
+    rounds = 0
+
+    async def think() -> None:
+        if args.think_ms:
+            await asyncio.sleep(random.uniform(0, 2 * args.think_ms) / 1000)
+
+    while time.monotonic() < deadline and (not args.rounds or rounds < args.rounds):
+        await client.call("GET /profile/summary", "GET", "/profile/summary", headers=headers)
+        await think()
+
+        started = await client.call("POST /mines/start", "POST", "/mines/start", headers=headers,
+                                    json={"mines": args.mines, "bet": args.bet, "currency": "hrpn"})
+        if started.status_code == 200:
+            ended = False
+            for cell in random.sample(range(CELLS), args.open_cells):
+                await think()
+                opened = await client.call("POST /mines/open", "POST", "/mines/open", headers=headers, json={"cell": cell})
+                if opened.status_code != 200 or opened.json().get("isEnd"):
+                    ended = True
+                    break
+            if not ended:
+                await client.call("POST /mines/cashout", "POST", "/mines/cashout", headers=headers)
+        await think()
+
+        await client.call("POST /tickets/buy", "POST", "/tickets/buy", headers=headers,
+                          params={"ticket_type": "bronze", "currency": "hrpn", "count": 1})
+        await think()
+
+        items = await client.call("GET /inventory/items", "GET", "/inventory/items", headers=headers, params={"limit": 5})
+        if items.status_code == 200 and items.json()["items"]:
+            item_id = items.json()["items"][-1]["id"]
+            await client.call("POST /inventory/sellItem", "POST", "/inventory/sellItem", headers=headers, params={"id": item_id})
+        await think()
+
+        conditional = dict(headers, **({"If-None-Match": etag} if etag else {}))
+        profile = await client.call("GET /profile/me", "GET", "/profile/me", headers=conditional)
+        etag = profile.headers.get("etag", etag)
+        rounds += 1
+    return rounds
+
+
+# -----------------------------
+# Вывод и сравнение
+# -----------------------------
+def print_summary(result: dict, baseline: Optional[dict]) -> None:
+    base_routes = (baseline or {}).get("routes", {})
+    print(f"{'route':<24} {'req':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'q/req':>6}  statuses")
+    for route, r in result["routes"].items():
+        line = (
+            f"{route:<24} {r['requests']:>7} {r['rps']:>8.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+            f"{r['p99_ms']:>8.2f} {r['queries_per_request'] if r['queries_per_request'] is not None else '-':>6}  "
+            f"{r['statuses']}"
+        )
+        old = base_routes.get(route)
+        if old:
+            line += f"  (p95 {r['p95_ms'] - old['p95_ms']:+.2f}ms, rps {r['rps'] - old['rps']:+.1f})"
+        print(line)
+    print(
+        f"total: {result['requests']} requests in {result['elapsed_s']}s, {result['rps']} req/s, "
+        f"q/req {result['queries_per_request']}, 5xx {result['server_errors']}"
+    )
+    if baseline:
+        print(f"baseline: {baseline['rps']} req/s → {result['rps']} req/s")
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+# -----------------------------
+# Запуск
+# -----------------------------
+async def run(args) -> dict:
+    secret_key = os.environ["SECRET_KEY"]
+    tg_ids = await seed(args.users, args.tg_id_base, args.balance, args.items)
+    stats = Stats(count_queries=args.url is None)
+
+    if args.url:
+        http = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                 limits=httpx.Limits(max_connections=args.users))
+        lifespan = None
+    else:
+        from backend.main import app
+        # Исключения приложения считаются ответом 500, а не обрывают прогон
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        http = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout)
+        lifespan = app.router.lifespan_context(app)
+
+    async with http:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+            from shared_models import db
+            count_queries_on(db.engine)
+            if db.replica_engine is not None:
+                count_queries_on(db.replica_engine)
+        try:
+            client = Client(http, stats)
+            start = time.perf_counter()
+            deadline = time.monotonic() + args.duration
+            rounds = await asyncio.gather(*(player(client, tg_id, args, secret_key, deadline) for tg_id in tg_ids))
+            elapsed = time.perf_counter() - start
+        finally:
+            if lifespan is not None:
+                await lifespan.__aexit__(None, None, None)
+
+    result = stats.summary(elapsed)
+    result["rounds"] = sum(rounds)
+    result["meta"] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": _git_revision(),
+        "target": args.url or "in-process",
+        "args": {k: v for k, v in vars(args).items() if k not in ("baseline", "out")},
+    }
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="внешний сервер; по умолчанию backend.main:app в этом процессе")
+    parser.add_argument("--local-servers", action="store_true", help="поднять временные Postgres и Redis")
+    parser.add_argument("--pg-bin", help="каталог с initdb/pg_ctl")
+    parser.add_argument("--redis-bin", help="каталог с redis-server")
+    parser.add_argument("--users", type=int, default=50, help="одновременных игроков")
+    parser.add_argument("--duration", type=float, default=30.0, help="секунд нагрузки")
+    parser.add_argument("--rounds", type=int, default=0, help="раундов на игрока (0 — до конца --duration)")
+    parser.add_argument("--open-cells", type=int, default=3, help="клеток за игру (K)")
+    parser.add_argument("--mines", type=int, default=3)
+    parser.add_argument("--bet", type=float, default=10.0)
+    parser.add_argument("--think-ms", type=float, default=0.0, help="средняя пауза между действиями")
+    parser.add_argument("--balance", type=float, default=1e9, help="HRPN на старте у каждого игрока")
+    parser.add_argument("--items", type=int, default=50, help="предметов в инвентаре на старте")
+    parser.add_argument("--tg-id-base", type=int, default=9_000_000_000)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--rate-limits", action="store_true", help="не отключать RateLimit на игровых маршрутах")
+    parser.add_argument("--out", help="файл для JSON-результатов")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    if not args.rate_limits:
+        # Сотни игроков с одного IP упрутся в per-IP бюджеты раньше, чем в сервер
+        os.environ["RATE_LIMIT_ENABLED"] = "false"
+    if not os.getenv("SECRET_KEY"):
+        raise SystemExit("SECRET_KEY не задан")
+
+    servers = LocalServers(args.pg_bin, args.redis_bin) if args.local_servers else None
+    try:
+        if servers is not None:
+            servers.start()
+        result = asyncio.run(run(args))
+    finally:
+        if servers is not None:
+            servers.stop()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_summary(result, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"results → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
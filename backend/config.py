@@ -9,6 +9,40 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     REDIS_URL: str | None = None
     TOKEN_EXPIRE_MINUTES: int = 60*24*7  # 7 дней по умолчанию
+    TOKEN_CACHE_SIZE: int = 10000  # сколько проверенных JWT держать в памяти процесса
+    LOGIN_CACHE_TTL: int = 60  # сек; повторный логин с тем же init_data отдаёт уже выданный токен
+
+    # Пул соединений к Postgres (см. shared_models.db.PoolConfig)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
+    # Реплика для чтения (необязательна) и сколько секунд после записи
+    # пользователь читает из primary
+    DB_REPLICA_URL: str | None = None
+    DB_READ_STICKY_SECONDS: float = 5.0
+
+    # Очередь денежных операций пользователя (shared_models.user_lock), сек
+    USER_LOCK_TTL: float = 10.0
+    USER_LOCK_WAIT: float = 3.0
+
+    # Token bucket для игровых эндпоинтов (бюджеты — в роутерах, см. backend.rate_limit)
+    RATE_LIMIT_ENABLED: bool = True
+    # Заголовок, в который наш reverse proxy пишет адрес клиента (X-Real-IP или
+    # X-Forwarded-For — берётся последний адрес, его добавил сам proxy).
+    # За proxy request.client.host — адрес proxy, поэтому без заголовка
+    # корзины по IP выключены: иначе это одна общая корзина на всех игроков.
+    RATE_LIMIT_IP_HEADER: str | None = None
+
+    # Токен для /metrics/* (заголовок X-Metrics-Token). Не задан — эндпоинты отдают 404:
+    # они на том же порту, что и API игроков
+    METRICS_TOKEN: str | None = None
+
+    # Сжатие ответов больше порога (байт), см. backend.middleware
+    COMPRESSION_MIN_SIZE: int = 1024
 
     class Config:
         env_file = os.path.join(BASE_DIR, ".env")
@@ -1,7 +1,12 @@
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
 from fastapi import Depends, HTTPException, status, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import ValidationError
-from typing import Optional
+from typing import Optional, Tuple
+from urllib.parse import parse_qs
 from redis import asyncio as aioredis
 
 from config import get_settings
@@ -11,6 +16,9 @@ from shared_models.models import *
 settings = get_settings()
 security = HTTPBearer()
 
+# Ключ проверки подписи WebAppInitData зависит только от SECRET_KEY — считаем один раз
+TELEGRAM_SECRET = hmac.new(b"WebAppData", settings.SECRET_KEY.encode(), hashlib.sha256).digest()
+
 # -----------------------
 # Redis
 # -----------------------
@@ -42,19 +50,108 @@ async def get_user_from_telegram_auth(auth_token: str = Header(...)) -> dict:
     Если Telegram Mini App передаёт auth_token в заголовке.
     Можно здесь расшифровывать данные, которые Telegram шлёт при WebAppInitData.
     """
-    from urllib.parse import parse_qs, unquote
-    import hashlib, hmac
-
     data = {k: v[0] for k, v in parse_qs(auth_token).items()}
 
     check_hash = data.pop("hash", None)
     auth_data = "\n".join(f"{k}={v}" for k, v in sorted(data.items()))
 
-    secret_key = hmac.new(b"WebAppData", settings.SECRET_KEY.encode(), hashlib.sha256).digest()
-    computed_hash = hmac.new(secret_key, auth_data.encode(), hashlib.sha256).hexdigest()
+    computed_hash = hmac.new(TELEGRAM_SECRET, auth_data.encode(), hashlib.sha256).hexdigest()
 
-    if computed_hash != check_hash:
+    if not check_hash or not hmac.compare_digest(computed_hash, check_hash):
         raise HTTPException(status_code=401, detail="Invalid Telegram auth data")
 
-    return data  
+    return data
+
+
+# -----------------------
+# Авторизация по JWT
+# -----------------------
+class TokenCache:
+    """
+    Ограниченный LRU уже проверенных JWT: sha256(token) -> (user_id, exp).
+    Запись живёт до exp токена, повторные запросы с тем же токеном
+    не тратят время на проверку подписи.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[bytes, Tuple[int, float]]" = OrderedDict()
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[int]:
+        key = self._digest(token)
+        item = self._items.get(key)
+        if item is None:
+            return None
+        user_id, exp = item
+        if exp <= time.time():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return user_id
+
+    def put(self, token: str, user_id: int, exp: float) -> None:
+        key = self._digest(token)
+        self._items[key] = (user_id, exp)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE)
+
+
+async def get_current_user_id(authorization: Optional[str] = Header(None)) -> int:
+    """
+    Единая зависимость авторизации для всех роутеров.
+    Объявляйте её в эндпоинте раньше get_session: невалидный запрос
+    получает 401 до того, как будет взята сессия БД.
+    """
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Authorization header missing")
+
+    parts = authorization.split(" ")
+    if len(parts) != 2 or parts[0].lower() != "bearer":
+        raise HTTPException(status_code=401, detail="Invalid authorization format")
+
+    token = parts[1]
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+
+    from backend.services.auth_service import auth_service  # избегаем циклического импорта
+
+    user_id, exp = auth_service.decode_access_claims(token)
+    token_cache.put(token, user_id, exp)
+    return user_id
+
+
+# -----------------------
+# Внутренние эндпоинты
+# -----------------------
+async def require_metrics_token(x_metrics_token: Optional[str] = Header(None)) -> None:
+    """
+    Пускает к /metrics/* только с X-Metrics-Token == settings.METRICS_TOKEN.
+    Без настроенного токена и с неверным отвечает 404, не выдавая, что эндпоинт есть.
+    """
+    expected = settings.METRICS_TOKEN
+    if not expected or not x_metrics_token or not hmac.compare_digest(x_metrics_token, expected):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+# -----------------------
+# Сессии для чтения
+# -----------------------
+async def get_user_read_session(user_id: int = Depends(get_current_user_id)):
+    """
+    Read-only сессия для данных текущего пользователя: реплика, если он
+    не писал последние DB_READ_STICKY_SECONDS, иначе primary.
+    Писать в неё нельзя — для записи get_session.
+    """
+    from shared_models.db import read_session
 
+    async with read_session(user_id) as session:
+        yield session
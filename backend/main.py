@@ -1,10 +1,20 @@
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Depends
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 
-from backend.dependencies import get_redis
-# from config import get_settings
+from backend.dependencies import get_redis, require_metrics_token
+from backend.middleware import CompressionMiddleware
+from shared_models.cache import get_cache_stats
+from config import get_settings
+from shared_models.db import PoolConfig, ReplicaConfig, create_engine_with_retry, get_pool_stats, get_context_manager
+from shared_models.redis_client import set_redis
+from shared_models.catalog import gift_catalog
+from shared_models.user_lock import user_locks, UserBusyError
+from shared_models import leaderboard
+from backend.services.mines_service import MinesService
+from backend.services.mines_history import mines_history
 
 
 #импорт роутеров
@@ -14,10 +24,14 @@ from backend.api.v1 import tickets
 from backend.api.v1 import balance
 from backend.api.v1 import auth
 from backend.api.v1 import inventory
+from backend.api.v1 import history
 
 
 
-# settings = get_settings()
+settings = get_settings()
+
+# Фоновые задачи процесса, гасятся на shutdown
+background_tasks: list[asyncio.Task] = []
 
 app = FastAPI(
     title="Telegram Mini App Backend",
@@ -36,6 +50,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# -----------------------
+# Сжатие ответов
+# -----------------------
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+# -----------------------
+# Очередь денежных операций пользователя
+# -----------------------
+user_locks.ttl = settings.USER_LOCK_TTL
+user_locks.wait = settings.USER_LOCK_WAIT
+
+
+@app.exception_handler(UserBusyError)
+async def user_busy_handler(request: Request, exc: UserBusyError):
+    # Очередь операций пользователя не освободилась за USER_LOCK_WAIT
+    return JSONResponse(
+        status_code=409,
+        content={"detail": "Another operation is in progress"},
+        headers={"Retry-After": "1"},
+    )
+
 # -----------------------
 # Startup / Shutdown events
 # -----------------------
@@ -44,10 +79,33 @@ async def startup_event():
     """
     Здесь можно инициализировать Redis и другие сервисы
     """
+    await create_engine_with_retry(pool=PoolConfig(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+    ), replica=ReplicaConfig(
+        url=settings.DB_REPLICA_URL,
+        sticky_seconds=settings.DB_READ_STICKY_SECONDS,
+    ))
+
+    mines_history.start()
+
     redis = await get_redis()
     if redis:
         print("Redis connected")
-
+        set_redis(redis)
+        await MinesService.load_scripts(redis)
+
+        # Лидерборд живёт в Redis; после потери Redis восстанавливаем его из users
+        async with get_context_manager() as db:
+            loaded = await leaderboard.rebuild_if_empty(db)
+        if loaded:
+            print(f"Leaderboard rebuilt: {loaded} users")
+        # Инвалидации каталога подарков от других воркеров/админки
+        background_tasks.append(asyncio.create_task(gift_catalog.listen(redis)))
     
 
 
@@ -56,6 +114,14 @@ async def shutdown_event():
     """
     Здесь можно закрыть соединения с Redis и другими сервисами
     """
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+
+    # Дописываем в БД накопленную историю игр
+    await mines_history.stop()
+
     redis = await get_redis()
     if redis:
         await redis.close()
@@ -68,6 +134,7 @@ app.include_router(tickets.router)
 app.include_router(balance.router)
 app.include_router(auth.router)
 app.include_router(inventory.router)
+app.include_router(history.router)
 
 
 
@@ -75,6 +142,22 @@ app.include_router(inventory.router)
 async def ping():
     return {"pong": True}
 
+
+@app.get("/metrics/db-pool", dependencies=[Depends(require_metrics_token)], include_in_schema=False)
+async def db_pool_metrics():
+    """
+    Загруженность пула соединений к Postgres (для подбора DB_POOL_SIZE / DB_MAX_OVERFLOW).
+    """
+    return get_pool_stats()
+
+
+@app.get("/metrics/cache", dependencies=[Depends(require_metrics_token)], include_in_schema=False)
+async def cache_metrics():
+    """
+    Попадания/промахи read-through кэша (shared_models.cache) в этом воркере.
+    """
+    return get_cache_stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,98 @@
+import gzip
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli — опциональная зависимость, без неё только gzip
+    brotli = None
+
+
+# -----------------------
+# Сжатие ответов (br / gzip)
+# -----------------------
+class CompressionMiddleware:
+    """
+    Сжимает JSON-ответы больше minimum_size: brotli, если клиент его принимает
+    и пакет установлен, иначе gzip. Маленькие ответы, стриминг и ответы
+    с уже выставленным Content-Encoding проходят как есть.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = set()
+        for part in accept_encoding.split(","):
+            name, _, params = part.strip().partition(";")
+            if params.replace(" ", "") in ("q=0", "q=0.0"):
+                continue
+            accepted.add(name.strip().lower())
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message  # ждём тело, чтобы решить, сжимать ли
+                return
+
+            if passthrough or start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            initial, start = start, None
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Стриминг и маленькие тела отдаём без сжатия
+                passthrough = True
+                await send(initial)
+                await send(message)
+                return
+
+            compressed = self._compress(encoding, body)
+            headers = MutableHeaders(raw=initial["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(initial)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,116 @@
+import math
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request
+
+from backend.dependencies import get_current_user_id
+from config import get_settings
+from shared_models.redis_client import get_redis, LuaScript
+
+settings = get_settings()
+
+# -----------------------
+# Token bucket в Redis
+# -----------------------
+# KEYS — корзины (HASH tokens, ts); ARGV — пары (скорость токенов/сек, ёмкость)
+# для каждой корзины. Запрос проходит, только если токен есть во всех корзинах,
+# и тогда списывается по одному из каждой. Время — Redis TIME, общее для всех
+# воркеров. Ответ: {1, 0} — пропущен, {0, мс до появления токена} — отказ.
+TOKEN_BUCKET_SCRIPT = LuaScript("""
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local capacity = tonumber(ARGV[i * 2])
+    local b = redis.call('HMGET', key, 'tokens', 'ts')
+    local level = tonumber(b[1]) or capacity
+    local ts = tonumber(b[2]) or now
+    level = math.min(capacity, level + math.max(0, now - ts) * rate / 1000)
+    if level < 1 then
+        wait = math.max(wait, math.ceil((1 - level) * 1000 / rate))
+    end
+    tokens[i] = level
+end
+if wait > 0 then
+    return {0, wait}
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2 - 1])
+    local capacity = tonumber(ARGV[i * 2])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+    redis.call('PEXPIRE', key, math.ceil(capacity * 1000 / rate) + 1000)
+end
+return {1, 0}
+""")
+
+
+@dataclass(frozen=True)
+class Bucket:
+    rate: float   # токенов в секунду (устойчивая скорость)
+    burst: int    # ёмкость корзины (сколько можно подряд)
+
+
+def client_ip(request: Request) -> Optional[str]:
+    """
+    Адрес клиента для корзины по IP — только из доверенного заголовка proxy
+    (settings.RATE_LIMIT_IP_HEADER). Заголовок не настроен или пуст — None.
+    """
+    header = settings.RATE_LIMIT_IP_HEADER
+    if not header:
+        return None
+    value = request.headers.get(header)
+    if not value:
+        return None
+    # X-Forwarded-For: клиент может прислать свой, proxy дописывает реальный адрес в конец
+    return value.rsplit(",", 1)[-1].strip() or None
+
+
+class RateLimit:
+    """
+    Зависимость FastAPI с бюджетом маршрута: корзина на пользователя и на IP.
+
+        @router.post("/open", dependencies=[Depends(RateLimit("mines_open", user=Bucket(10, 20)))])
+
+    Зависимости из dependencies=[...] решаются раньше параметров эндпоинта,
+    так что отказ — дешёвый 429 с Retry-After до get_session.
+    Корзина по IP работает только с RATE_LIMIT_IP_HEADER (см. client_ip).
+    Без Redis (или при его ошибке) запросы пропускаются.
+    """
+
+    def __init__(self, name: str, user: Optional[Bucket] = None, ip: Optional[Bucket] = None):
+        self.name = name
+        self.user = user
+        self.ip = ip
+
+    async def __call__(self, request: Request, user_id: int = Depends(get_current_user_id)) -> None:
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        redis = get_redis()
+        if redis is None:
+            return
+
+        keys, args = [], []
+        if self.user is not None:
+            keys.append(f"rl:{self.name}:u:{user_id}")
+            args += [self.user.rate, self.user.burst]
+        ip = client_ip(request) if self.ip is not None else None
+        if ip is not None:
+            keys.append(f"rl:{self.name}:ip:{ip}")
+            args += [self.ip.rate, self.ip.burst]
+        if not keys:
+            return
+
+        try:
+            allowed, wait_ms = await TOKEN_BUCKET_SCRIPT(redis, keys, args)
+        except Exception as e:
+            print(f"⚠️ Rate limit {self.name} недоступен: {e}")
+            return
+        if not int(allowed):
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(int(wait_ms) / 1000)))},
+            )
@@ -1,13 +1,17 @@
 import os
 import jwt
 import json
+import hashlib
 from datetime import datetime, timedelta
 from fastapi import HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from config import settings
-from shared_models.crud.user import get_user_by_tg_id
+from shared_models.crud.user import get_user_id_by_tg_id
+from shared_models.redis_client import get_redis
 from dependencies import get_user_from_telegram_auth  # выносится отдельно
 
+LOGIN_CACHE_KEY = "auth:login:{digest}"
+
 class AuthService:
     def __init__(
         self,
@@ -43,16 +47,23 @@ class AuthService:
 
     # --- Декодирование JWT ---
     def decode_access_token(self, token: str) -> int:
+        user_id, _ = self.decode_access_claims(token)
+        return user_id
+
+    def decode_access_claims(self, token: str) -> tuple[int, float]:
+        """
+        Проверяет подпись и срок JWT, возвращает (user_id, exp как unix timestamp).
+        """
         from jwt import ExpiredSignatureError, InvalidTokenError
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            user_id = int(payload.get("sub"))
-            if user_id is None:
+            sub = payload.get("sub")
+            if sub is None:
                 raise HTTPException(status_code=401, detail="Invalid token")
-            return user_id
+            return int(sub), float(payload["exp"])
         except ExpiredSignatureError:
             raise HTTPException(status_code=401, detail="Token expired")
-        except InvalidTokenError:
+        except (InvalidTokenError, KeyError, ValueError):
             raise HTTPException(status_code=401, detail="Invalid token")
         
 
@@ -60,14 +71,39 @@ class AuthService:
     async def login_via_telegram(self, db: AsyncSession, auth_token: str) -> str:
         """
         Проверяет Telegram токен, ищет пользователя в БД и выдаёт JWT.
+
+        Mini App при холодном старте шлёт один и тот же init_data пачкой,
+        поэтому выданный токен кладётся в Redis под sha256(init_data) на
+        LOGIN_CACHE_TTL секунд. В кэш попадает только init_data, прошедший
+        проверку подписи, так что совпадение ключа означает ту же подпись.
         """
+        redis = get_redis()
+        cache_key = LOGIN_CACHE_KEY.format(digest=hashlib.sha256(auth_token.encode()).hexdigest())
+        if redis is not None:
+            try:
+                cached = await redis.get(cache_key)
+            except Exception as e:
+                print(f"⚠️ Не удалось прочитать кэш логина: {e}")
+                cached = None
+            if cached:
+                return cached
+
         data = await self.verify_telegram_token(auth_token)
         tg_user = json.loads(data["user"])  # Telegram JSON-строка
         tg_id = tg_user["id"]
 
-        db_user = await get_user_by_tg_id(db, tg_id)
-        if not db_user:
+        user_id = await get_user_id_by_tg_id(db, tg_id)
+        if user_id is None:
             raise HTTPException(status_code=404, detail="User not found")
 
-        token = self.create_access_token(user_id=db_user.id)
+        token = self.create_access_token(user_id=user_id)
+
+        if redis is not None:
+            try:
+                await redis.set(cache_key, token, ex=settings.LOGIN_CACHE_TTL)
+            except Exception as e:
+                print(f"⚠️ Не удалось записать кэш логина: {e}")
         return token
+
+
+auth_service = AuthService()  # общий экземпляр; SECRET_KEY из окружения
@@ -2,7 +2,8 @@ from typing import Literal
 from fastapi import APIRouter, HTTPException, Header, Body, Depends
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
-from shared_models.crud.user import get_user_by_id, update_user_balance
+from shared_models.crud.user import change_user_balance
+from shared_models.user_lock import user_locks
 
 class ExchangeRequest(BaseModel):
     inCurrency: Literal["hrpn", "ton"]
@@ -24,29 +25,23 @@ async def convert_currency_for_user(
     if amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
 
-    user = await get_user_by_id(db, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     rate = 1000  # 1 TON = 1000 HRPN
 
     if in_currency == "hrpn":
-        if user.coins_balance < amount:
-            raise HTTPException(status_code=400, detail="Not enough HRPN")
         converted_amount = amount / rate
-        new_hrpn = user.coins_balance - amount
-        new_ton = user.ton_balance + converted_amount
+        ton_delta, hrpn_delta = converted_amount, -amount
     elif in_currency == "ton":
-        if user.ton_balance < amount:
-            raise HTTPException(status_code=400, detail="Not enough TON")
         converted_amount = amount * rate
-        new_ton = user.ton_balance - amount
-        new_hrpn = user.coins_balance + converted_amount
+        ton_delta, hrpn_delta = -amount, converted_amount
     else:
         raise HTTPException(status_code=400, detail="Invalid currency")
 
-    # Обновляем баланс в БД
-    await update_user_balance(db, user_id, ton_balance=new_ton, coins_balance=new_hrpn)
+    # Списание и начисление одним UPDATE … RETURNING
+    async with user_locks.hold(user_id):
+        row = await change_user_balance(db, user_id, ton_delta=ton_delta, coins_delta=hrpn_delta)
+    if row is None:
+        detail = "Not enough HRPN" if in_currency == "hrpn" else "Not enough TON"
+        raise HTTPException(status_code=400, detail=detail)
 
     return ExchangeResponse(
         from_currency=in_currency,
@@ -0,0 +1,21 @@
+import random
+from typing import List
+
+# Поле mines и битовые маски — общее для MinesService и записи истории игр.
+# Клетки нумеруются 0..24, бит i маски соответствует клетке i.
+# mines_mask — где стоят мины (раскладывается один раз в create_game),
+# opened_mask — какие клетки уже открыты. Всё состояние игры — пара 25-битных чисел.
+N = 25  # всего клеток
+
+_rng = random.SystemRandom()
+
+
+def generate_mines_mask(mines: int) -> int:
+    mask = 0
+    for cell in _rng.sample(range(N), mines):
+        mask |= 1 << cell
+    return mask
+
+
+def mask_to_cells(mask: int) -> List[int]:
+    return [cell for cell in range(N) if mask >> cell & 1]
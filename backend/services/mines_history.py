@@ -0,0 +1,117 @@
+import asyncio
+import json
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Optional
+
+from shared_models.db import get_context_manager
+from shared_models.crud.mines_game import create_games
+from shared_models.schemas.mines_game import MinesGameCreate
+from backend.services.mines_board import mask_to_cells
+
+
+class MinesHistoryWriter:
+    """
+    Write-behind запись завершённых игр mines в таблицу mines_games.
+
+    Горячий путь (/mines/open, /mines/cashout) только кладёт запись в очередь в памяти,
+    фоновая задача сбрасывает её пачками многострочным INSERT раз в flush_interval
+    или как только набралось batch_size записей. Очередь ограничена max_pending:
+    при переполнении (БД недоступна) самые старые записи отбрасываются и считаются в dropped.
+    На shutdown очередь сбрасывается полностью.
+    """
+
+    def __init__(self, max_pending: int = 50_000, batch_size: int = 500, flush_interval: float = 1.0):
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._pending: Deque[MinesGameCreate] = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    # -----------------------------
+    # Постановка в очередь
+    # -----------------------------
+    def record(self, game: MinesGameCreate) -> None:
+        if len(self._pending) >= self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+        self._pending.append(game)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def record_finished(self, user_id: int, state: dict, won_amount: float) -> None:
+        """
+        Принимает состояние игры из MinesService (после финального перехода в Redis).
+        """
+        started_at = state.get("started_at") or None
+        self.record(MinesGameCreate(
+            user_id=user_id,
+            bet=state["bet"],
+            num_mines=state["mines"],
+            won_amount=won_amount,
+            started_at=datetime.fromtimestamp(started_at, tz=timezone.utc) if started_at else None,
+            finished_at=datetime.now(timezone.utc),
+            result_data=json.dumps({
+                "currency": state["currency"],
+                "mines": mask_to_cells(state["mines_mask"]),
+                "opened": mask_to_cells(state["opened_mask"]),
+            }, separators=(",", ":")),
+        ))
+
+    # -----------------------------
+    # Сброс в БД
+    # -----------------------------
+    async def flush(self) -> int:
+        written = 0
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            try:
+                async with get_context_manager() as db:
+                    written += await create_games(db, batch)
+            except asyncio.CancelledError:
+                # Задачу отменили снаружи — пачку не теряем
+                self._pending.extendleft(reversed(batch))
+                raise
+            except Exception as e:
+                # Возвращаем пачку в начало очереди (с учётом лимита) и ждём следующего цикла
+                print(f"⚠️ Не удалось записать историю mines ({len(batch)} игр): {e}")
+                free = self.max_pending - len(self._pending)
+                if free < len(batch):
+                    self.dropped += len(batch) - max(free, 0)
+                    batch = batch[len(batch) - max(free, 0):]
+                self._pending.extendleft(reversed(batch))
+                break
+        return written
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # Не cancel(): отмена посреди flush() теряет уже снятую с очереди пачку.
+        # Будим цикл и дожидаемся, пока он сам выйдет после текущего сброса.
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "dropped": self.dropped}
+
+
+mines_history = MinesHistoryWriter()
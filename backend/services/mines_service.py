@@ -1,13 +1,195 @@
-import random
 import json
+import hashlib
+import time
+from functools import lru_cache
 from redis import asyncio as aioredis
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from shared_models.crud.user import get_user_by_id, update_user_balance
+from shared_models.crud.user import change_user_balance
+from shared_models.user_lock import user_locks
+from shared_models.redis_client import LuaScript
+from backend.services.mines_history import mines_history
+from backend.services.mines_board import N, _rng, generate_mines_mask, mask_to_cells
 
 RTP = 0.85  # целевой RTP ~90%
 HOUSE_EDGE = 1 - RTP
-N = 25  # всего клеток
+
+
+# -----------------------------
+# Таблицы выплат
+# -----------------------------
+def _build_payout_table(mines: int, h: float) -> Tuple[float, ...]:
+    """
+    Коэффициенты M_k для всех безопасных клеток при заданном числе мин.
+    """
+    s = N - mines
+    coeffs = []
+
+    prob_survive = 1.0
+    for i in range(s):
+        p_i = float(s - i) / float(N - i)   # вероятность безопасной клетки на шаге i
+        prob_survive *= p_i                 # вероятность выжить до и включая этот шаг
+        F_k = 1.0 / prob_survive            # fair multiplier (>=1)
+        M_k = 1.0 + (F_k - 1.0) * (1.0 - h) # уменьшаем премию над 1 на factor (1-h)
+        coeffs.append(round(M_k, 6))
+
+    return tuple(coeffs)
+
+
+@lru_cache(maxsize=None)
+def get_payout_tables(h: float = HOUSE_EDGE) -> Dict[int, Tuple[float, ...]]:
+    """
+    Таблицы выплат для всех 1–24 мин при house edge h. Считаются один раз на h.
+    """
+    return {mines: _build_payout_table(mines, h) for mines in range(1, N)}
+
+
+# Считаем при импорте: в игре хранится только число мин, коэффициент берётся отсюда
+PAYOUT_TABLES = get_payout_tables(HOUSE_EDGE)
+
+# Готовый ответ для /mines/tables и его ETag (меняется только вместе с RTP)
+PAYOUT_TABLES_JSON = json.dumps(
+    {
+        "houseEdge": round(HOUSE_EDGE, 6),
+        "tables": {str(mines): list(coeffs) for mines, coeffs in PAYOUT_TABLES.items()},
+    },
+    separators=(",", ":"),
+).encode()
+PAYOUT_TABLES_ETAG = '"' + hashlib.sha256(PAYOUT_TABLES_JSON).hexdigest()[:16] + '"'
+
+
+def payout_coeff(mines: int, opened: int) -> float:
+    """Коэффициент после opened безопасных открытий."""
+    return PAYOUT_TABLES[mines][opened - 1]
+
+
+# -----------------------------
+# Lua-скрипты переходов состояния
+# -----------------------------
+# Игра хранится в Redis hash: user_id, bet, currency, mines, mines_mask, opened_mask, started_at.
+# Каждый переход (открытие клетки, вывод) выполняется одним EVALSHA атомарно,
+# поэтому двойной тап или open+cashout одновременно не могут испортить состояние.
+# Ответ скрипта: {status, opened_mask, mines, bet, currency, mines_mask, started_at} (строками).
+#
+# Выигрышная игра (cashout / все безопасные клетки открыты) не удаляется, а переходит
+# в status = settling с арендой settle_until (мс, Redis TIME): выигрыш начисляется в БД,
+# и только после COMMIT ключ удаляется (SETTLE_SCRIPT). Если начисление сорвалось, игра
+# остаётся settling, и следующий вызов (open, cashout, start) доводит расчёт до конца.
+# Гарантия — «хотя бы раз»: между COMMIT и DEL окно такое же, как было при DEL после начисления.
+SETTLE_LEASE_MS = 15000
+
+# Открывает до ARGV[3] клеток из списка кандидатов по порядку (уже открытые пропускаются),
+# останавливается на мине; при ARGV[4] = 1 сразу выводит выигрыш. После полей состояния
+# в ответе идут открытые за вызов клетки по порядку (на мине — она последняя).
+# KEYS[1] — ключ игры; ARGV[1] — TTL; ARGV[2] — число клеток; ARGV[3] — сколько открыть;
+# ARGV[4] — автовывод (0/1); ARGV[5] — аренда расчёта (мс); ARGV[6..] — клетки-кандидаты
+OPEN_CELLS_SCRIPT = LuaScript("""
+local g = redis.call('HMGET', KEYS[1], 'mines', 'opened_mask', 'bet', 'currency', 'mines_mask', 'started_at', 'status')
+if not g[1] then
+    return {'none'}
+end
+if g[7] == 'settling' then
+    return {'settling'}
+end
+local cells = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local safe_total = cells - tonumber(g[1])
+local opened_mask = tonumber(g[2])
+local mines_mask = tonumber(g[5])
+
+local opened, m = 0, opened_mask
+while m ~= 0 do
+    m = bit.band(m, m - 1)
+    opened = opened + 1
+end
+
+local steps = {}
+local status = nil
+for i = 6, #ARGV do
+    if #steps >= limit then
+        break
+    end
+    local cell = tonumber(ARGV[i])
+    local cell_bit = bit.lshift(1, cell)
+    if bit.band(opened_mask, cell_bit) == 0 then
+        table.insert(steps, tostring(cell))
+        if bit.band(mines_mask, cell_bit) ~= 0 then
+            status = 'mine'
+            break
+        end
+        opened_mask = bit.bor(opened_mask, cell_bit)
+        opened = opened + 1
+        if opened >= safe_total then
+            status = 'finished'
+            break
+        end
+    end
+end
+
+if not status then
+    if ARGV[4] == '1' then
+        status = 'cashout'
+    elseif #steps == 0 then
+        return {'opened'}
+    else
+        status = 'safe'
+    end
+end
+
+if status == 'safe' then
+    redis.call('HSET', KEYS[1], 'opened_mask', opened_mask)
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+elseif status == 'mine' then
+    redis.call('DEL', KEYS[1])
+else
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+    redis.call('HSET', KEYS[1], 'opened_mask', opened_mask, 'status', 'settling', 'settle_until', now + tonumber(ARGV[5]))
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+local result = {status, tostring(opened_mask), g[1], g[3], g[4], g[5], g[6] or '0'}
+for _, cell in ipairs(steps) do
+    table.insert(result, cell)
+end
+return result
+""")
+
+# Переводит игру в settling и берёт аренду расчёта. Игра уже в settling с истёкшей
+# арендой — прошлое начисление сорвалось, аренда берётся заново; аренда ещё идёт — {'busy'}.
+# KEYS[1] — ключ игры; ARGV[1] — аренда (мс); ARGV[2] — 1: только незавершённый расчёт
+# (активную игру не трогать, ответ {'none'})
+CASHOUT_SCRIPT = LuaScript("""
+local g = redis.call('HMGET', KEYS[1], 'mines', 'opened_mask', 'bet', 'currency', 'mines_mask', 'started_at', 'status', 'settle_until')
+if not g[1] then
+    return {'none'}
+end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+if g[7] == 'settling' then
+    if tonumber(g[8] or '0') > now then
+        return {'busy'}
+    end
+elseif ARGV[2] == '1' then
+    return {'none'}
+end
+redis.call('HSET', KEYS[1], 'status', 'settling', 'settle_until', now + tonumber(ARGV[1]))
+return {'cashout', g[2], g[1], g[3], g[4], g[5], g[6] or '0'}
+""")
+
+# Завершение расчёта. KEYS[1] — ключ игры; ARGV[1] — 1: выигрыш закоммичен, игру удалить,
+# 0: начисление сорвалось, снять аренду, чтобы следующий вызов повторил его сразу
+SETTLE_SCRIPT = LuaScript("""
+if redis.call('HGET', KEYS[1], 'status') ~= 'settling' then
+    return 0
+end
+if ARGV[1] == '1' then
+    return redis.call('DEL', KEYS[1])
+end
+redis.call('HSET', KEYS[1], 'settle_until', 0)
+return 1
+""")
+
+SCRIPTS = (OPEN_CELLS_SCRIPT, CASHOUT_SCRIPT, SETTLE_SCRIPT)
 
 
 class MinesService:
@@ -22,28 +204,44 @@ class MinesService:
         return f"mines_game:{user_id}"
 
     # -----------------------------
-    # Генерация коэффициентов
+    # Lua-скрипты
     # -----------------------------
-    def generate_coefficients(self, mines: int, h: float = 0.1) -> List[float]:
+    @staticmethod
+    async def load_scripts(redis: aioredis.Redis) -> None:
         """
-        Возвращает список коэффициентов M_k для всех безопасных клеток.
+        Предзагружает скрипты (SCRIPT LOAD) при старте, чтобы первый же вызов шёл через EVALSHA.
         """
-        if mines < 1 or mines >= N:
-            raise ValueError("Количество мин должно быть от 1 до 24")
-
-        s = N - mines
-        coeffs = []
-
-        prob_survive = 1.0
-        for i in range(s):
-            p_i = float(s - i) / float(N - i)   # вероятность безопасной клетки на шаге i
-            prob_survive *= p_i                 # вероятность выжить до и включая этот шаг
-            F_k = 1.0 / prob_survive            # fair multiplier (>=1)
-            M_k = 1.0 + (F_k - 1.0) * (1.0 - h) # уменьшаем премию над 1 на factor (1-h)
-            coeffs.append(round(M_k, 6))
-
-        return coeffs
+        for script in SCRIPTS:
+            await script.load(redis)
+
+    @staticmethod
+    def _parse_state(result: list) -> dict:
+        status = result[0]
+        if isinstance(status, bytes):
+            result = [r.decode() if isinstance(r, bytes) else r for r in result]
+            status = result[0]
+        if len(result) < 7:
+            return {"status": status}
+        opened_mask = int(result[1])
+        return {
+            "status": status,
+            "opened_mask": opened_mask,
+            "opened": opened_mask.bit_count(),
+            "mines": int(result[2]),
+            "bet": float(result[3]),
+            "currency": result[4],
+            "mines_mask": int(result[5]),
+            "started_at": float(result[6]),
+            "steps": [int(cell) for cell in result[7:]],
+        }
 
+    async def _open_cells(self, user_id: int, candidates: List[int], limit: int, auto_cashout: bool) -> dict:
+        key = self._redis_key(user_id)
+        return self._parse_state(await OPEN_CELLS_SCRIPT(
+            self.redis,
+            [key],
+            [self.game_ttl, N, limit, 1 if auto_cashout else 0, SETTLE_LEASE_MS, *candidates],
+        ))
 
     # -----------------------------
     # Создание игры
@@ -52,131 +250,255 @@ class MinesService:
         if mines < 1 or mines > 24:
             raise ValueError("Количество мин должно быть от 1 до 24")
 
-        user = await get_user_by_id(db, user_id)
-        if not user:
-            raise ValueError("Пользователь не найден")
-
-        if currency == "ton":
-            if user.ton_balance < bet:
-                raise ValueError("Недостаточно TON для ставки")
-            await update_user_balance(db, user_id, ton_balance=user.ton_balance - bet)
-        elif currency == "hrpn":
-            if user.coins_balance < bet:
-                raise ValueError("Недостаточно HRPN для ставки")
-            await update_user_balance(db, user_id, coins_balance=user.coins_balance - bet)
-        else:
-            raise ValueError("Неверная валюта")
+        if bet <= 0:
+            raise ValueError("Ставка должна быть положительной")
 
-        coeffs = self.generate_coefficients(mines, h=HOUSE_EDGE)
+        # Старты одного пользователя по очереди: списание и новая игра в Redis
+        async with user_locks.hold(user_id):
+            # Недоначисленный выигрыш прошлой игры — до того, как ключ будет перезаписан
+            await self._settle_pending(db, user_id)
+
+            # Списание одним условным UPDATE: проверка баланса и списание атомарны
+            if currency == "ton":
+                if await change_user_balance(db, user_id, ton_delta=-bet) is None:
+                    raise ValueError("Недостаточно TON для ставки")
+            elif currency == "hrpn":
+                if await change_user_balance(db, user_id, coins_delta=-bet) is None:
+                    raise ValueError("Недостаточно HRPN для ставки")
+            else:
+                raise ValueError("Неверная валюта")
+
+            key = self._redis_key(user_id)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.hset(key, mapping={
+                    "user_id": user_id,
+                    "bet": repr(float(bet)),
+                    "currency": currency,
+                    "mines": mines,
+                    "mines_mask": generate_mines_mask(mines),
+                    "opened_mask": 0,
+                    "started_at": repr(time.time()),
+                })
+                pipe.expire(key, self.game_ttl)
+                await pipe.execute()
 
-        game_data = {
+        return {
             "user_id": user_id,
             "bet": bet,
-            "currency": currency, 
+            "currency": currency,
             "mines": mines,
             "opened_cells": 0,
             "remaining_cells": N,
             "remaining_mines": mines,
-            "coeffs": coeffs,
         }
 
-        key = self._redis_key(user_id)
-        await self.redis.set(key, json.dumps(game_data), ex=self.game_ttl)
-        return game_data
+    # -----------------------------
+    # Раскрытие поля по окончании игры
+    # -----------------------------
+    @staticmethod
+    def _board(state: dict) -> dict:
+        return {
+            "mines": mask_to_cells(state["mines_mask"]),
+            "openedCells": mask_to_cells(state["opened_mask"]),
+        }
+
+    # -----------------------------
+    # Начисление выигрыша по завершённой игре
+    # -----------------------------
+    async def _finish_settle(self, user_id: int, committed: bool) -> None:
+        try:
+            await SETTLE_SCRIPT(self.redis, [self._redis_key(user_id)], [1 if committed else 0])
+        except Exception as e:
+            # Игра останется settling; при committed=True расчёт повторится после аренды
+            print(f"⚠️ Не удалось завершить расчёт mines пользователя {user_id}: {e}")
+
+    async def _pay_out(self, db: AsyncSession, user_id: int, state: dict, cell: Optional[int] = None) -> dict:
+        """
+        Начисляет выигрыш по игре в settling и только после COMMIT удаляет её из Redis.
+        """
+        opened = state["opened"]
+        if opened == 0:
+            mines_history.record_finished(user_id, state, won_amount=0.0)
+            await self._finish_settle(user_id, committed=True)
+            return {"coeff": 0.0, "totalWin": 0.0, "cellNumber": None, "cell": cell, "isEnd": True, **self._board(state)}
+
+        current_coeff = payout_coeff(state["mines"], opened)
+        total_win = round(state["bet"] * current_coeff, 2)
+
+        try:
+            if state["currency"] == "ton":
+                row = await change_user_balance(db, user_id, ton_delta=total_win)
+            else:
+                row = await change_user_balance(db, user_id, coins_delta=total_win)
+            if row is None:
+                raise RuntimeError(f"Пользователь {user_id} не найден, выигрыш не начислен")
+        except Exception:
+            await self._finish_settle(user_id, committed=False)
+            raise
+
+        mines_history.record_finished(user_id, state, won_amount=total_win)
+        await self._finish_settle(user_id, committed=True)
+        return {
+            "coeff": current_coeff,
+            "totalWin": total_win,
+            "cellNumber": opened,
+            "cell": cell,
+            "isEnd": True,
+            **self._board(state),
+        }
 
     # -----------------------------
     # Проигрыш
     # -----------------------------
-    async def process_lose(self, user_id: int) -> dict:
-        key = self._redis_key(user_id)
-        await self.redis.delete(key)
+    def process_lose(self, user_id: int, state: dict, cell: int) -> dict:
+        mines_history.record_finished(user_id, state, won_amount=0.0)
         return {
             "coeff": 0.0,
             "totalWin": 0.0,
             "cellNumber": None,
-            "isEnd": True
+            "cell": cell,
+            "isMine": True,
+            "isEnd": True,
+            **self._board(state),
         }
 
     # -----------------------------
     # Вывод выигрыша
     # -----------------------------
-    async def process_cashout(self, db: AsyncSession, user_id: int) -> dict:
+    async def _claim_settlement(self, user_id: int, pending_only: bool) -> dict:
         key = self._redis_key(user_id)
-        data_raw = await self.redis.get(key)
-        if not data_raw:
-            raise ValueError("Игра не найдена")
-
-        game = json.loads(data_raw)
-        bet = game["bet"]
-        currency = game["currency"]
-        opened = game["opened_cells"]
-        coeffs = game["coeffs"]
-
-        if opened == 0:
-            await self.redis.delete(key)
-            return {"coeff": 0.0, "totalWin": 0.0, "cellNumber": None, "isEnd": True}
-
-        current_coeff = coeffs[opened - 1]
-        total_win = round(bet * current_coeff, 2)
+        state = self._parse_state(await CASHOUT_SCRIPT(
+            self.redis, [key], [SETTLE_LEASE_MS, 1 if pending_only else 0]
+        ))
+        if state["status"] == "busy":
+            raise ValueError("Выигрыш по игре уже начисляется, повторите позже")
+        return state
+
+    async def _settle_pending(self, db: AsyncSession, user_id: int) -> Optional[dict]:
+        """
+        Доводит до конца расчёт, прерванный сбоем начисления.
+        None — незавершённого расчёта нет.
+        """
+        state = await self._claim_settlement(user_id, pending_only=True)
+        if state["status"] == "none":
+            return None
+        return await self._pay_out(db, user_id, state)
 
-        user = await get_user_by_id(db, user_id)
-        if user:
-            if currency == "ton":
-                new_balance = user.ton_balance + total_win
-                await update_user_balance(db, user_id, ton_balance=new_balance)
-            elif currency == "hrpn":
-                new_balance = user.coins_balance + total_win
-                await update_user_balance(db, user_id, coins_balance=new_balance)
+    async def process_cashout(self, db: AsyncSession, user_id: int) -> dict:
+        state = await self._claim_settlement(user_id, pending_only=False)
+        if state["status"] == "none":
+            raise ValueError("Игра не найдена")
 
-        await self.redis.delete(key)
-        return {
-            "coeff": current_coeff,
-            "totalWin": total_win,
-            "cellNumber": opened,
-            "isEnd": True
-        }
+        return await self._pay_out(db, user_id, state)
 
     # -----------------------------
     # Открытие клетки
     # -----------------------------
-    async def process_open_cell(self, db: AsyncSession, user_id: int) -> dict:
-        key = self._redis_key(user_id)
-        data_raw = await self.redis.get(key)
-        if not data_raw:
+    async def process_open_cell(self, db: AsyncSession, user_id: int, cell: int) -> dict:
+        if cell < 0 or cell >= N:
+            raise ValueError(f"Номер клетки должен быть от 0 до {N - 1}")
+
+        state = await self._open_cells(user_id, [cell], limit=1, auto_cashout=False)
+        status = state["status"]
+
+        if status == "settling":
+            result = await self._settle_pending(db, user_id)
+            if result is None:
+                raise ValueError("Игра не найдена или завершена")
+            return result
+        if status == "none":
             raise ValueError("Игра не найдена или завершена")
+        if status == "opened":
+            raise ValueError("Клетка уже открыта")
+        if status == "mine":
+            return self.process_lose(user_id, state, cell)
+        if status == "finished":
+            # Скрипт уже удалил игру — начисляем как при выводе
+            return await self._pay_out(db, user_id, state, cell=cell)
 
-        game = json.loads(data_raw)
-        remaining_cells = game["remaining_cells"]
-        remaining_mines = game["remaining_mines"]
-        if remaining_cells <= 0:
-            raise ValueError("Все клетки уже открыты")
-
-        # Проверяем мину
-        p_mine = remaining_mines / remaining_cells
-        is_mine = random.random() < p_mine
-
-        if is_mine:
-            return await self.process_lose(user_id)
-
-        # Успешное открытие
-        game["opened_cells"] += 1
-        game["remaining_cells"] -= 1
-
-        idx = game["opened_cells"] - 1
-        coeffs = game["coeffs"]
-        current_coeff = coeffs[idx]
-        total_win = round(game["bet"] * current_coeff, 2)
-
-        game["total_win"] = total_win
-        await self.redis.set(key, json.dumps(game), ex=self.game_ttl)
-
-        is_end = game["opened_cells"] >= (N - game["mines"])
-
-        if is_end:
-            return await self.process_cashout(db, user_id)
+        current_coeff = payout_coeff(state["mines"], state["opened"])
+        total_win = round(state["bet"] * current_coeff, 2)
 
         return {
             "coeff": current_coeff,
             "totalWin": total_win,
+            "cell": cell,
             "isEnd": False
         }
+
+    # -----------------------------
+    # Открытие нескольких клеток / автоигра
+    # -----------------------------
+    async def process_open_cells(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        cells: Optional[List[int]] = None,
+        count: Optional[int] = None,
+        cashout: bool = False,
+    ) -> dict:
+        """
+        Открывает клетки из списка cells по порядку либо count случайных закрытых клеток,
+        останавливаясь на мине; при cashout=True после этого сразу выводит выигрыш.
+        Всё за один EVALSHA; в ответе — пошаговые результаты и итог игры.
+        """
+        if (cells is None) == (count is None):
+            raise ValueError("Укажите либо список клеток, либо их количество")
+
+        if cells is not None:
+            if not cells or len(cells) >= N:
+                raise ValueError(f"Можно открыть от 1 до {N - 1} клеток")
+            if len(set(cells)) != len(cells) or any(c < 0 or c >= N for c in cells):
+                raise ValueError(f"Клетки должны быть разными и от 0 до {N - 1}")
+            candidates, limit = cells, len(cells)
+        else:
+            if count < 1 or count >= N:
+                raise ValueError(f"Можно открыть от 1 до {N - 1} клеток")
+            # Скрипт сам пропустит уже открытые клетки в этом случайном порядке
+            candidates, limit = _rng.sample(range(N), N), count
+
+        state = await self._open_cells(user_id, candidates, limit, auto_cashout=cashout)
+        status = state["status"]
+
+        if status == "settling":
+            result = await self._settle_pending(db, user_id)
+            if result is None:
+                raise ValueError("Игра не найдена или завершена")
+            return {**result, "steps": []}
+        if status == "none":
+            raise ValueError("Игра не найдена или завершена")
+        if status == "opened":
+            raise ValueError("Все указанные клетки уже открыты")
+
+        # Пошаговые результаты: коэффициент после каждого безопасного открытия
+        safe_steps = len(state["steps"]) - (1 if status == "mine" else 0)
+        opened_before = state["opened"] - safe_steps
+        steps = []
+        for i, cell in enumerate(state["steps"]):
+            if status == "mine" and i == len(state["steps"]) - 1:
+                steps.append({"cell": cell, "isMine": True, "coeff": 0.0, "totalWin": 0.0})
+            else:
+                coeff = payout_coeff(state["mines"], opened_before + i + 1)
+                steps.append({
+                    "cell": cell,
+                    "isMine": False,
+                    "coeff": coeff,
+                    "totalWin": round(state["bet"] * coeff, 2),
+                })
+
+        if status == "mine":
+            result = self.process_lose(user_id, state, state["steps"][-1])
+        elif status in ("finished", "cashout"):
+            last_cell = state["steps"][-1] if state["steps"] else None
+            result = await self._pay_out(db, user_id, state, cell=last_cell)
+        else:
+            current_coeff = payout_coeff(state["mines"], state["opened"])
+            result = {
+                "coeff": current_coeff,
+                "totalWin": round(state["bet"] * current_coeff, 2),
+                "cell": state["steps"][-1],
+                "isEnd": False,
+            }
+
+        return {**result, "steps": steps}
@@ -1,11 +1,13 @@
 import random
-from sqlalchemy.orm import Session
-from shared_models.models import Gift
-from shared_models.crud.gift import get_all_gifts
+from typing import List
 from sqlalchemy.ext.asyncio import AsyncSession
-from shared_models.crud.user import get_user_by_id
+from shared_models.catalog import gift_catalog, CatalogSnapshot, CatalogGift
+from shared_models.db import unit_of_work
+from shared_models.user_lock import user_locks
+from shared_models.crud.user import change_user_balance
 from shared_models.schemas.lottery_ticket import LotteryTicketCreate
-from shared_models.crud.lottery_tickets import create_lottery_ticket
+from shared_models.crud.lottery_tickets import create_lottery_tickets
+from shared_models.crud.inventory import add_gifts_to_user
 
 
 TICKET_PRICES = {
@@ -20,63 +22,83 @@ TICKET_WIN_COUNTS = {
     "gold": 4,
 }
 
-TON_TO_HRPN = 1000  # курс TON → HRPN
+MAX_TICKETS_PER_PURCHASE = 100
 
-async def buy_ticket(db: AsyncSession, user_id: int, ticket_type: str, currency: str):
-    user = await get_user_by_id(db, user_id)
-    if not user:
-        raise ValueError("User not found")
 
-    # -------------------
-    # Проверка баланса
-    # -------------------
-    ticket_cost = TICKET_PRICES[ticket_type][currency]
+async def buy_tickets(db: AsyncSession, user_id: int, ticket_type: str, currency: str, count: int = 1):
+    """
+    Покупка count билетов за одну транзакцию:
+    одно списание, розыгрыши в памяти по снимку каталога,
+    пакетная вставка билетов и выигранных подарков, один commit.
+    """
+    if ticket_type not in TICKET_PRICES:
+        raise ValueError("Invalid ticket type")
+    if currency not in ("hrpn", "ton"):
+        raise ValueError("Invalid currency")
+    if count < 1 or count > MAX_TICKETS_PER_PURCHASE:
+        raise ValueError(f"Count must be between 1 and {MAX_TICKETS_PER_PURCHASE}")
 
-    if currency == "hrpn":
-        if user.coins_balance < ticket_cost:
-            raise ValueError("Not enough coins")
-        user.coins_balance -= ticket_cost
-    else:  # ton
-        if user.ton_balance < ticket_cost:
-            raise ValueError("Not enough ton")
-        user.ton_balance -= ticket_cost
-
-    await db.commit()
-    await db.refresh(user)
-
-    wins = await generate_wins(db, user_id=user_id, ticket_type=ticket_type)
-
-    ticket_in = LotteryTicketCreate(
-        user_id=user_id,
-        currency=currency,
-        ticket_type=ticket_type,
-        price=ticket_cost,
-        won_gift_ids=[g.id for g in wins] if wins else []
-    )
-    ticket = await create_lottery_ticket(db, ticket_in)
+    ticket_cost = TICKET_PRICES[ticket_type][currency]
+    catalog = await gift_catalog.get(db)
+
+    draws = [draw_wins(catalog, ticket_type) for _ in range(count)]
+
+    tickets_in = [
+        LotteryTicketCreate(
+            user_id=user_id,
+            currency=currency,
+            ticket_type=ticket_type,
+            price=ticket_cost,
+            won_gift_ids=[g.id for g in wins],
+        )
+        for wins in draws
+    ]
+    wins = [g for draw in draws for g in draw]
+
+    # Покупки одного пользователя выполняются по очереди
+    async with user_locks.hold(user_id), unit_of_work(db):
+        # -------------------
+        # Проверка и списание баланса (один условный UPDATE на все билеты)
+        # -------------------
+        total_cost = ticket_cost * count
+        if currency == "hrpn":
+            if await change_user_balance(db, user_id, coins_delta=-total_cost) is None:
+                raise ValueError("Not enough coins")
+        else:  # ton
+            if await change_user_balance(db, user_id, ton_delta=-total_cost) is None:
+                raise ValueError("Not enough ton")
+
+        tickets = await create_lottery_tickets(db, tickets_in)
+        await add_gifts_to_user(db, user_id, [g.id for g in wins])
 
     return {
-        "ticket": ticket,
+        "tickets": tickets,
         "wins": wins
     }
 
-def get_gift_value_hrpn(gift: Gift) -> float:
-    """Возвращает стоимость подарка в HRPN."""
-    if gift.cost_coins is not None:
-        return gift.cost_coins
-    if gift.cost_ton is not None:
-        return gift.cost_ton * TON_TO_HRPN
-    return 0.0
+
+async def buy_ticket(db: AsyncSession, user_id: int, ticket_type: str, currency: str):
+    result = await buy_tickets(db, user_id, ticket_type, currency, count=1)
+    return {
+        "ticket": result["tickets"][0],
+        "wins": result["wins"]
+    }
 
 
 async def generate_wins(db: AsyncSession, user_id: int, ticket_type: str):
     """Генерация выигрышей: шанс окупиться, но долгосрочный минус."""
-    result = await get_all_gifts(db)
-    gifts = result.scalars().all()
-    if not gifts:
+    catalog = await gift_catalog.get(db)
+    return draw_wins(catalog, ticket_type)
+
+
+def draw_wins(catalog: CatalogSnapshot, ticket_type: str) -> List[CatalogGift]:
+    """
+    Розыгрыш одного билета по снимку каталога: без обращений к БД, O(log n) на приз.
+    """
+    if not catalog.gifts:
         return []
 
-    ticket_price = TICKET_PRICES[ticket_type]
+    ticket_price = TICKET_PRICES[ticket_type]["hrpn"]  # ценность билета в HRPN
     max_prizes = TICKET_WIN_COUNTS[ticket_type]
 
     # 🎯 Шаг 1. Определяем мультипликатор выигрыша
@@ -103,14 +125,5 @@ async def generate_wins(db: AsyncSession, user_id: int, ticket_type: str):
             parts.append(part)
             remaining -= part
 
-    # 🎯 Шаг 3. Подбор подарков под каждую часть
-    wins = []
-    for value in parts:
-        suitable = [g for g in gifts if get_gift_value_hrpn(g) <= value]
-        if suitable:
-            chosen = max(suitable, key=get_gift_value_hrpn)
-        else:
-            chosen = min(gifts, key=get_gift_value_hrpn)
-        wins.append(chosen)
-
-    return wins
\ No newline at end of file
+    # 🎯 Шаг 3. Подбор подарков под каждую часть (бинарный поиск по отсортированному каталогу)
+    return [catalog.best_at_most(value) for value in parts]
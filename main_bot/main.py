@@ -10,7 +10,7 @@ import asyncio
 import uuid
 
 # Подключаем общие модели
-from shared_models.db import get_context_manager, create_engine_with_retry, init_db
+from shared_models.db import get_context_manager, create_engine_with_retry
 from shared_models.crud.user import create_user
 from shared_models.schemas.user import UserCreate
 
@@ -108,8 +108,7 @@ async def cmd_start(message: types.Message):
 # ---------- Точка входа ----------
 async def main():
     print("Bot started...")
-    await create_engine_with_retry()
-    await init_db()      
+    await create_engine_with_retry()  # схему накатывает контейнер shared_models
     await dp.start_polling(bot)
 
 
@@ -0,0 +1,153 @@
+import asyncio
+import json
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from shared_models import versions
+from shared_models.crud.inventory import count_inventory
+from shared_models.crud.user import get_user_summary
+from shared_models.redis_client import get_redis
+
+# Общий для всех воркеров read-through кэш в Redis.
+#
+# Запись: cache:{entity}:{id} -> {"v": <версии>, "data": ...}. Версии —
+# счётчики из shared_models.versions, которые CRUD увеличивает после commit
+# каждого изменения баланса/инвентаря. Проверяются тем же MGET, что читает
+# значение: запись с чужой версией — промах, явный DEL не нужен, и медленный
+# читатель не может «вернуть» в кэш данные старше последней записи.
+#
+# Одновременные промахи по одному ключу в процессе схлопываются (single-flight):
+# в БД идёт один запрос, остальные ждут его результата.
+
+
+@dataclass(frozen=True)
+class CacheEntity:
+    name: str
+    ttl: int  # сек; страховка, актуальность обеспечивают версии
+
+    def key(self, entity_id: int) -> str:
+        return f"cache:{self.name}:{entity_id}"
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0  # промахи, дождавшиеся чужой загрузки
+    errors: int = 0     # Redis недоступен — читали из БД напрямую
+
+
+cache_stats = CacheStats()
+
+_inflight: Dict[Tuple[str, str], "asyncio.Future[Any]"] = {}
+
+
+async def _load_once(flight: Tuple[str, str], loader: Callable[[], Awaitable[Any]]) -> Any:
+    future = _inflight.get(flight)
+    if future is not None:
+        cache_stats.coalesced += 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise  # отменили нас самих
+            # Загружавший запрос отменён (клиент ушёл) — грузим сами
+            return await loader()
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[flight] = future
+    try:
+        value = await loader()
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(e)
+            future.exception()  # без ожидающих исключение не должно считаться потерянным
+        raise
+    else:
+        future.set_result(value)
+        return value
+    finally:
+        _inflight.pop(flight, None)
+
+
+async def read_through(
+    entity: CacheEntity,
+    entity_id: int,
+    loader: Callable[[], Awaitable[Optional[Any]]],
+    version_keys: Sequence[str],
+) -> Optional[Any]:
+    """
+    Значение из кэша, если оно записано при текущих версиях version_keys,
+    иначе loader() (один на процесс для ключа) и запись в кэш.
+    loader возвращает JSON-совместимое значение; None не кэшируется.
+    """
+    redis = get_redis()
+    if redis is None:
+        return await loader()
+
+    key = entity.key(entity_id)
+    version_keys = list(version_keys)
+    try:
+        values = await redis.mget([key, *version_keys])
+        version = ".".join(await versions.init_missing(redis, version_keys, values[1:]))
+    except Exception as e:
+        cache_stats.errors += 1
+        print(f"⚠️ Кэш {entity.name} недоступен: {e}")
+        return await loader()
+
+    if values[0] is not None:
+        entry = json.loads(values[0])
+        if entry["v"] == version:
+            cache_stats.hits += 1
+            return entry["data"]
+
+    cache_stats.misses += 1
+    # Версии прочитаны ДО загрузки: если запись попадёт между ними,
+    # значение сохранится со старой версией и следующий запрос его перечитает
+    data = await _load_once((key, version), loader)
+    if data is not None:
+        try:
+            await redis.set(key, json.dumps({"v": version, "data": data}), ex=entity.ttl)
+        except Exception as e:
+            print(f"⚠️ Не удалось записать кэш {entity.name}: {e}")
+    return data
+
+
+def get_cache_stats() -> dict:
+    return {**asdict(cache_stats), "inflight": len(_inflight)}
+
+
+# ---------------------------
+# Сущности
+# ---------------------------
+USER_BALANCE = CacheEntity("user_balance", ttl=60)
+INVENTORY_SUMMARY = CacheEntity("inventory_summary", ttl=300)
+
+
+async def get_user_balance_cached(db: AsyncSession, user_id: int) -> Optional[dict]:
+    """
+    {"id", "username", "ton_balance", "coins_balance"} или None, если пользователя нет.
+    """
+    async def load() -> Optional[dict]:
+        row = await get_user_summary(db, user_id)
+        return dict(row._mapping) if row is not None else None
+
+    return await read_through(USER_BALANCE, user_id, load, [versions.user_version_key(user_id)])
+
+
+async def get_inventory_summary_cached(db: AsyncSession, user_id: int) -> dict:
+    """
+    {"count"} — число предметов в инвентаре. Зависит и от каталога:
+    удаление подарка каскадом удаляет его экземпляры.
+    """
+    async def load() -> dict:
+        return {"count": await count_inventory(db, user_id)}
+
+    return await read_through(
+        INVENTORY_SUMMARY,
+        user_id,
+        load,
+        [versions.user_version_key(user_id), versions.CATALOG_VERSION_KEY],
+    )
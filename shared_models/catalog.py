@@ -0,0 +1,167 @@
+import asyncio
+import bisect
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Sequence, Dict, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from redis import asyncio as aioredis
+from shared_models.models import Gift
+from shared_models.redis_client import get_redis
+
+TON_TO_HRPN = 1000  # курс TON → HRPN
+CATALOG_CHANNEL = "gift_catalog:invalidate"
+
+
+def gift_value_hrpn(gift) -> float:
+    """Возвращает стоимость подарка в HRPN."""
+    if gift.cost_coins is not None:
+        return gift.cost_coins
+    if gift.cost_ton is not None:
+        return gift.cost_ton * TON_TO_HRPN
+    return 0.0
+
+
+# ---------------------------
+# Снимок каталога
+# ---------------------------
+@dataclass(frozen=True)
+class CatalogGift:
+    """
+    Неизменяемая копия подарка из каталога. Не привязана к сессии,
+    поэтому безопасно шарится между запросами и читается схемой GiftRead.
+    """
+    id: int
+    name: str
+    telegram_gift_id: str
+    cost_coins: float
+    cost_ton: Optional[float]
+    image_url: str
+    created_at: datetime
+    value_hrpn: float
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    gifts: Tuple[CatalogGift, ...]  # отсортированы по value_hrpn
+    values: Tuple[float, ...]       # value_hrpn в том же порядке, для bisect
+    by_id: Dict[int, CatalogGift]
+
+    @classmethod
+    def build(cls, gifts: Sequence[Gift]) -> "CatalogSnapshot":
+        items = sorted(
+            (
+                CatalogGift(
+                    id=g.id,
+                    name=g.name,
+                    telegram_gift_id=g.telegram_gift_id,
+                    cost_coins=g.cost_coins,
+                    cost_ton=g.cost_ton,
+                    image_url=g.image_url,
+                    created_at=g.created_at,
+                    value_hrpn=gift_value_hrpn(g),
+                )
+                for g in gifts
+            ),
+            key=lambda g: g.value_hrpn,
+        )
+        return cls(
+            gifts=tuple(items),
+            values=tuple(g.value_hrpn for g in items),
+            by_id={g.id: g for g in items},
+        )
+
+    def best_at_most(self, value: float) -> Optional[CatalogGift]:
+        """
+        Самый дорогой подарок со стоимостью <= value за O(log n).
+        Если таких нет — самый дешёвый подарок каталога.
+        """
+        if not self.gifts:
+            return None
+        i = bisect.bisect_right(self.values, value)
+        return self.gifts[i - 1] if i else self.gifts[0]
+
+
+# ---------------------------
+# Кэш каталога в процессе
+# ---------------------------
+class GiftCatalog:
+    """
+    Процессный снимок таблицы gifts.
+    Сбрасывается при create/update/delete подарка: локально и через Redis pub/sub
+    во всех остальных воркерах. max_age — страховка на случай потерянного сообщения.
+    """
+
+    def __init__(self, max_age: float = 300.0):
+        self.max_age = max_age
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._snapshot_generation = -1
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and self._snapshot_generation == self._generation
+            and time.monotonic() - self._loaded_at < self.max_age
+        )
+
+    async def get(self, db: AsyncSession) -> CatalogSnapshot:
+        if self._fresh():
+            return self._snapshot
+
+        async with self._lock:
+            if self._fresh():
+                return self._snapshot
+
+            generation = self._generation
+            result = await db.execute(select(Gift))
+            snapshot = CatalogSnapshot.build(result.scalars().all())
+
+            # Если во время загрузки пришла инвалидация — снимок не запоминаем
+            if generation == self._generation:
+                self._snapshot = snapshot
+                self._snapshot_generation = generation
+                self._loaded_at = time.monotonic()
+            return snapshot
+
+    def invalidate_local(self) -> None:
+        self._generation += 1
+
+    async def invalidate(self) -> None:
+        """
+        Сбрасывает снимок в этом процессе и оповещает остальные воркеры.
+        """
+        self.invalidate_local()
+        redis = get_redis()
+        if redis is not None:
+            try:
+                await redis.publish(CATALOG_CHANNEL, "1")
+            except Exception as e:
+                print(f"⚠️ Не удалось отправить инвалидацию каталога: {e}")
+
+    async def listen(self, redis: aioredis.Redis, reconnect_delay: float = 1.0) -> None:
+        """
+        Фоновая задача: слушает канал инвалидаций. Запускается один раз на процесс.
+        """
+        while True:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(CATALOG_CHANNEL)
+                # Пока не были подписаны, могли пропустить сообщения
+                self.invalidate_local()
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.invalidate_local()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Подписка на инвалидации каталога оборвалась: {e}")
+                await asyncio.sleep(reconnect_delay)
+            finally:
+                await pubsub.reset()
+
+
+gift_catalog = GiftCatalog()
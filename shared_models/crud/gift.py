@@ -1,22 +1,38 @@
 from typing import Optional, List
-from sqlalchemy import select
+from sqlalchemy import select, insert, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
-from shared_models.models import Gift
+from shared_models.models import Gift, Transaction
+from shared_models.catalog import gift_catalog
+from shared_models.db import on_commit, commit_or_flush
 from shared_models.schemas.gift import GiftCreate, GiftUpdate
+from shared_models import versions
+
+
+def _track_catalog_change(db: AsyncSession) -> None:
+    """
+    После commit сбрасывает снимок каталога во всех воркерах и версию каталога
+    (подарки вложены в ответ /profile/me).
+    """
+    on_commit(db, gift_catalog.invalidate)
+    on_commit(db, versions.bump_catalog)
 
 # ---------------------------
 # CREATE
 # ---------------------------
-async def create_gift(db: AsyncSession, gift_in: GiftCreate) -> Gift:
-    db_gift = Gift(
-        name=gift_in.name,
-        telegram_gift_id=gift_in.telegram_gift_id,
-        cost_coins=gift_in.cost_coins,
-        cost_ton=gift_in.cost_ton
+async def create_gift(db: AsyncSession, gift_in: GiftCreate, commit: bool = True) -> Gift:
+    db_gift = await db.scalar(
+        insert(Gift)
+        .values(
+            name=gift_in.name,
+            telegram_gift_id=gift_in.telegram_gift_id,
+            cost_coins=gift_in.cost_coins,
+            cost_ton=gift_in.cost_ton,
+            image_url=gift_in.image_url,
+        )
+        .returning(Gift)
     )
-    db.add(db_gift)
-    await db.commit()
-    await db.refresh(db_gift)
+    _track_catalog_change(db)
+    await commit_or_flush(db, commit)
     return db_gift
 
 # ---------------------------
@@ -28,6 +44,7 @@ async def get_gift_by_id(db: AsyncSession, gift_id: int) -> Optional[Gift]:
 
 # ---------------------------
 # READ все подарки
+# (горячий путь — shared_models.catalog.gift_catalog, без запроса в БД)
 # ---------------------------
 async def get_all_gifts(db: AsyncSession) -> List[Gift]:
     result = await db.execute(select(Gift))
@@ -36,29 +53,38 @@ async def get_all_gifts(db: AsyncSession) -> List[Gift]:
 # ---------------------------
 # UPDATE
 # ---------------------------
-async def update_gift(db: AsyncSession, gift_id: int, gift_in: GiftUpdate) -> Optional[Gift]:
-    gift = await get_gift_by_id(db, gift_id)
-    if not gift:
-        return None
-
-    if gift_in.name is not None:
-        gift.name = gift_in.name
-    if gift_in.cost_coins is not None:
-        gift.cost_coins = gift_in.cost_coins
-    if gift_in.cost_ton is not None:
-        gift.cost_ton = gift_in.cost_ton
+async def update_gift(
+    db: AsyncSession, gift_id: int, gift_in: GiftUpdate, commit: bool = True
+) -> Optional[Gift]:
+    values = gift_in.model_dump(exclude_none=True)
+    if not values:
+        return await get_gift_by_id(db, gift_id)
 
-    await db.commit()
-    await db.refresh(gift)
+    gift = await db.scalar(
+        update(Gift)
+        .where(Gift.id == gift_id)
+        .values(**values)
+        .returning(Gift)
+        .execution_options(populate_existing=True)
+    )
+    if gift is None:
+        return None
+    _track_catalog_change(db)
+    await commit_or_flush(db, commit)
     return gift
 
 # ---------------------------
 # DELETE
 # ---------------------------
-async def delete_gift(db: AsyncSession, gift_id: int) -> bool:
-    gift = await get_gift_by_id(db, gift_id)
-    if not gift:
+async def delete_gift(db: AsyncSession, gift_id: int, commit: bool = True) -> bool:
+    # inventory.gift_id — ON DELETE CASCADE на стороне БД.
+    # transactions.gift_id без ondelete: отвязываем историю сами (как делал ORM db.delete)
+    await db.execute(
+        update(Transaction).where(Transaction.gift_id == gift_id).values(gift_id=None)
+    )
+    deleted = await db.scalar(delete(Gift).where(Gift.id == gift_id).returning(Gift.id))
+    if deleted is None:
         return False
-    await db.delete(gift)
-    await db.commit()
+    _track_catalog_change(db)
+    await commit_or_flush(db, commit)
     return True
@@ -1,49 +1,176 @@
-from typing import List, Optional
-from sqlalchemy import select
+from typing import List, Optional, Sequence, Tuple
+from sqlalchemy import select, insert, delete, func, Row
+from sqlalchemy.orm import selectinload, joinedload
 from sqlalchemy.ext.asyncio import AsyncSession
 from shared_models.models import Inventory
+from shared_models.db import commit_or_flush
+from shared_models.pagination import keyset_page, DEFAULT_PAGE_SIZE
+from shared_models.versions import track_user_change
 from shared_models.schemas.inventory import InventoryCreate
 
 # ---------------------------
 # CREATE
 # ---------------------------
-async def add_gift_to_user(db: AsyncSession, inventory_in: InventoryCreate) -> Inventory:
-    db_item = Inventory(
-        user_id=inventory_in.user_id,
-        gift_id=inventory_in.gift_id
+async def add_gift_to_user(db: AsyncSession, inventory_in: InventoryCreate, commit: bool = True) -> Inventory:
+    db_item = await db.scalar(
+        insert(Inventory)
+        .values(user_id=inventory_in.user_id, gift_id=inventory_in.gift_id)
+        .returning(Inventory)
     )
-    db.add(db_item)
-    await db.commit()
-    await db.refresh(db_item)
+    track_user_change(db, inventory_in.user_id)
+    await commit_or_flush(db, commit)
     return db_item
 
+
+async def add_gifts_to_user(
+    db: AsyncSession, user_id: int, gift_ids: List[int], commit: bool = True
+) -> int:
+    """
+    Пакетно выдаёт пользователю подарки (одна строка inventory на каждый id, дубли допустимы).
+    Возвращает количество добавленных строк. commit=False — транзакцией управляет вызывающий.
+    """
+    if not gift_ids:
+        return 0
+    await db.execute(
+        insert(Inventory),
+        [{"user_id": user_id, "gift_id": gift_id} for gift_id in gift_ids],
+    )
+    track_user_change(db, user_id)
+    await commit_or_flush(db, commit)
+    return len(gift_ids)
+
 # ---------------------------
 # READ все подарки пользователя
+# (по строке на экземпляр; для больших инвентарей — get_inventory_stacks / get_inventory_page)
 # ---------------------------
 async def get_inventory_by_user_id(db: AsyncSession, user_id: int) -> List[Inventory]:
-    result = await db.execute(select(Inventory).where(Inventory.user_id == user_id))
+    result = await db.execute(
+        select(Inventory)
+        .where(Inventory.user_id == user_id)
+        .options(selectinload(Inventory.gift))
+    )
     return result.scalars().all()
 
+# ---------------------------
+# READ инвентарь стопками: (gift_id, count, oldest_received_at)
+# ---------------------------
+async def get_inventory_stacks(db: AsyncSession, user_id: int) -> List[Row]:
+    """
+    Один GROUP BY по индексу (user_id, gift_id, received_at): размер ответа
+    и число строк растут с количеством разных подарков, а не экземпляров.
+    """
+    result = await db.execute(
+        select(
+            Inventory.gift_id,
+            func.count().label("count"),
+            func.min(Inventory.received_at).label("oldest_received_at"),
+        )
+        .where(Inventory.user_id == user_id)
+        .group_by(Inventory.gift_id)
+        .order_by(func.min(Inventory.received_at), Inventory.gift_id)
+    )
+    return result.all()
+
+# ---------------------------
+# READ количество предметов
+# (горячий путь — shared_models.cache.get_inventory_summary_cached)
+# ---------------------------
+async def count_inventory(db: AsyncSession, user_id: int) -> int:
+    return await db.scalar(
+        select(func.count()).select_from(Inventory).where(Inventory.user_id == user_id)
+    )
+
+# ---------------------------
+# READ отдельные предметы (страницами, новые сначала)
+# ---------------------------
+async def get_inventory_page(
+    db: AsyncSession,
+    user_id: int,
+    gift_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[List[Inventory], Optional[str]]:
+    stmt = select(Inventory).where(Inventory.user_id == user_id)
+    if gift_id is not None:
+        stmt = stmt.where(Inventory.gift_id == gift_id)
+    return await keyset_page(db, stmt, Inventory.received_at, Inventory.id, cursor=cursor, limit=limit)
+
 # ---------------------------
 # READ конкретный элемент
 # ---------------------------
 async def get_inventory_item(db: AsyncSession, inventory_id: int) -> Optional[Inventory]:
-    result = await db.execute(select(Inventory).where(Inventory.id == inventory_id))
+    result = await db.execute(
+        select(Inventory)
+        .where(Inventory.id == inventory_id)
+        .options(joinedload(Inventory.gift))
+    )
     return result.scalar_one_or_none()
 
 # ---------------------------
 # DELETE
 # ---------------------------
-async def remove_gift_from_user(db: AsyncSession, user_id: int, gift_id: int) -> bool:
-    result = await db.execute(
-        select(Inventory).where(
-            Inventory.user_id == user_id,
-            Inventory.gift_id == gift_id
-        )
+async def remove_gift_from_user(db: AsyncSession, user_id: int, gift_id: int, commit: bool = True) -> bool:
+    """
+    Удаляет один экземпляр подарка (у пользователя их может быть несколько).
+    """
+    one_item = (
+        select(Inventory.id)
+        .where(Inventory.user_id == user_id, Inventory.gift_id == gift_id)
+        .limit(1)
+        .scalar_subquery()
     )
-    item = result.scalar_one_or_none()
-    if not item:
+    removed = await db.scalar(delete(Inventory).where(Inventory.id == one_item).returning(Inventory.id))
+    if removed is None:
         return False
-    await db.delete(item)
-    await db.commit()
+    track_user_change(db, user_id)
+    await commit_or_flush(db, commit)
     return True
+
+
+async def remove_inventory_item(
+    db: AsyncSession, user_id: int, inventory_id: int, commit: bool = True
+) -> Optional[int]:
+    """
+    DELETE … WHERE id = :id AND user_id = :user RETURNING gift_id.
+    Проверка владельца и удаление одним запросом: параллельный запрос
+    на тот же предмет получит None, а не второе списание.
+    """
+    gift_id = await db.scalar(
+        delete(Inventory)
+        .where(Inventory.id == inventory_id, Inventory.user_id == user_id)
+        .returning(Inventory.gift_id)
+    )
+    if gift_id is None:
+        return None
+    track_user_change(db, user_id)
+    await commit_or_flush(db, commit)
+    return gift_id
+
+
+async def remove_inventory_items(
+    db: AsyncSession,
+    user_id: int,
+    inventory_ids: Optional[Sequence[int]] = None,
+    gift_id: Optional[int] = None,
+    commit: bool = True,
+) -> List[Row]:
+    """
+    Пакетное удаление предметов пользователя одним DELETE … RETURNING id, gift_id, received_at.
+
+    inventory_ids — конкретные предметы (чужие и уже удалённые просто не попадут в результат),
+    gift_id — все экземпляры подарка, без фильтров — весь инвентарь.
+    """
+    stmt = delete(Inventory).where(Inventory.user_id == user_id)
+    if inventory_ids is not None:
+        if not inventory_ids:
+            return []
+        stmt = stmt.where(Inventory.id.in_(inventory_ids))
+    if gift_id is not None:
+        stmt = stmt.where(Inventory.gift_id == gift_id)
+
+    result = await db.execute(stmt.returning(Inventory.id, Inventory.gift_id, Inventory.received_at))
+    rows = result.all()
+    if rows:
+        track_user_change(db, user_id)
+        await commit_or_flush(db, commit)
+    return rows
@@ -1,26 +1,62 @@
-from typing import List, Optional
-from sqlalchemy import select
+from typing import List, Optional, Tuple
+from sqlalchemy import select, insert, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from shared_models.models import LotteryTicket
+from shared_models.pagination import keyset_page, DEFAULT_PAGE_SIZE
+from shared_models.db import commit_or_flush, mark_user_write
 from shared_models.schemas.lottery_ticket import LotteryTicketCreate, LotteryTicketUpdate  # Пайдант схемы
 
 # ===========================
 # CREATE
 # ===========================
-async def create_lottery_ticket(db: AsyncSession, ticket_in: LotteryTicketCreate) -> LotteryTicket:
-    ticket = LotteryTicket(
-        user_id=ticket_in.user_id,
-        ticket_type=ticket_in.ticket_type,
-        currency = ticket_in.currency,
-        price=ticket_in.price,
-        won_gift_ids=ticket_in.won_gift_ids,
+async def create_lottery_ticket(
+    db: AsyncSession, ticket_in: LotteryTicketCreate, commit: bool = True
+) -> LotteryTicket:
+    ticket = await db.scalar(
+        insert(LotteryTicket)
+        .values(
+            user_id=ticket_in.user_id,
+            ticket_type=ticket_in.ticket_type,
+            currency=ticket_in.currency,
+            price=ticket_in.price,
+            won_gift_ids=ticket_in.won_gift_ids,
+        )
+        .returning(LotteryTicket)
     )
-    db.add(ticket)
-    await db.commit()
-    await db.refresh(ticket)
+    mark_user_write(db, ticket.user_id)
+    await commit_or_flush(db, commit)
     return ticket
 
+
+async def create_lottery_tickets(
+    db: AsyncSession, tickets_in: List[LotteryTicketCreate], commit: bool = True
+) -> List[LotteryTicket]:
+    """
+    Пакетная вставка билетов одним INSERT … RETURNING (без refresh на каждую строку).
+    commit=False — вызывающий код сам управляет транзакцией.
+    """
+    if not tickets_in:
+        return []
+    result = await db.scalars(
+        insert(LotteryTicket).returning(LotteryTicket),
+        [
+            {
+                "user_id": t.user_id,
+                "ticket_type": t.ticket_type,
+                "currency": t.currency,
+                "price": t.price,
+                "won_gift_ids": t.won_gift_ids,
+            }
+            for t in tickets_in
+        ],
+    )
+    tickets = result.all()
+    for user_id in {t.user_id for t in tickets_in}:
+        mark_user_write(db, user_id)
+    await commit_or_flush(db, commit)
+    return tickets
+
 # ===========================
 # READ по ID
 # ===========================
@@ -29,51 +65,66 @@ async def get_lottery_ticket(db: AsyncSession, ticket_id: int) -> Optional[Lotte
     return result.scalar_one_or_none()
 
 # ===========================
-# READ все билеты
+# READ все билеты (страницами, новые сначала)
 # ===========================
-async def get_all_lottery_tickets(db: AsyncSession) -> List[LotteryTicket]:
-    result = await db.execute(select(LotteryTicket).order_by(LotteryTicket.created_at.desc()))
-    return result.scalars().all()
+async def get_all_lottery_tickets(
+    db: AsyncSession,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[List[LotteryTicket], Optional[str]]:
+    return await keyset_page(
+        db, select(LotteryTicket), LotteryTicket.created_at, LotteryTicket.id, cursor=cursor, limit=limit
+    )
 
 # ===========================
-# READ все билеты конкретного пользователя
+# READ билеты конкретного пользователя (страницами)
 # ===========================
-async def get_user_lottery_tickets(db: AsyncSession, user_id: int) -> List[LotteryTicket]:
-    result = await db.execute(
-        select(LotteryTicket)
-        .where(LotteryTicket.user_id == user_id)
-        .order_by(LotteryTicket.created_at.desc())
+async def get_user_lottery_tickets(
+    db: AsyncSession,
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[List[LotteryTicket], Optional[str]]:
+    return await keyset_page(
+        db,
+        select(LotteryTicket).where(LotteryTicket.user_id == user_id),
+        LotteryTicket.created_at,
+        LotteryTicket.id,
+        cursor=cursor,
+        limit=limit,
     )
-    return result.scalars().all()
 
 # ===========================
 # UPDATE
 # ===========================
 async def update_lottery_ticket(
-    db: AsyncSession, ticket_id: int, ticket_in: LotteryTicketUpdate
+    db: AsyncSession, ticket_id: int, ticket_in: LotteryTicketUpdate, commit: bool = True
 ) -> Optional[LotteryTicket]:
-    ticket = await get_lottery_ticket(db, ticket_id)
-    if not ticket:
-        return None
+    # LotteryTicketUpdate сейчас содержит только won_gift_ids
+    if ticket_in.won_gift_ids is None:
+        return await get_lottery_ticket(db, ticket_id)
 
-    if ticket_in.ticket_type is not None:
-        ticket.ticket_type = ticket_in.ticket_type
-    if ticket_in.price is not None:
-        ticket.price = ticket_in.price
-    if ticket_in.won_gift_ids is not None:
-        ticket.won_gift_ids = ticket_in.won_gift_ids
-
-    await db.commit()
-    await db.refresh(ticket)
+    ticket = await db.scalar(
+        update(LotteryTicket)
+        .where(LotteryTicket.id == ticket_id)
+        .values(won_gift_ids=ticket_in.won_gift_ids)
+        .returning(LotteryTicket)
+        .execution_options(populate_existing=True)
+    )
+    if ticket is None:
+        return None
+    mark_user_write(db, ticket.user_id)
+    await commit_or_flush(db, commit)
     return ticket
 
 # ===========================
 # DELETE
 # ===========================
-async def delete_lottery_ticket(db: AsyncSession, ticket_id: int) -> bool:
-    ticket = await get_lottery_ticket(db, ticket_id)
-    if not ticket:
+async def delete_lottery_ticket(db: AsyncSession, ticket_id: int, commit: bool = True) -> bool:
+    deleted = await db.scalar(
+        delete(LotteryTicket).where(LotteryTicket.id == ticket_id).returning(LotteryTicket.id)
+    )
+    if deleted is None:
         return False
-    await db.delete(ticket)
-    await db.commit()
+    await commit_or_flush(db, commit)
     return True
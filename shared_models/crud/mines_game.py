@@ -1,26 +1,58 @@
-from typing import List, Optional
-from sqlalchemy import select
+from typing import List, Optional, Tuple
+from sqlalchemy import select, insert, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from shared_models.models import MinesGame
+from shared_models.pagination import keyset_page, DEFAULT_PAGE_SIZE
+from shared_models.db import commit_or_flush, mark_user_write
 from shared_models.schemas.mines_game import MinesGameCreate, MinesGameUpdate
 
 # ===========================
 # CREATE
 # ===========================
-async def create_game(db: AsyncSession, game_in: MinesGameCreate) -> MinesGame:
-    game = MinesGame(
-        user_id=game_in.user_id,
-        bet=game_in.bet,
-        num_mines=game_in.num_mines,
-        won_amount=game_in.won_amount,
-        result_data=game_in.result_data,
+async def create_game(db: AsyncSession, game_in: MinesGameCreate, commit: bool = True) -> MinesGame:
+    game = await db.scalar(
+        insert(MinesGame)
+        .values(
+            user_id=game_in.user_id,
+            bet=game_in.bet,
+            num_mines=game_in.num_mines,
+            won_amount=game_in.won_amount,
+            result_data=game_in.result_data,
+        )
+        .returning(MinesGame)
     )
-    db.add(game)
-    await db.commit()
-    await db.refresh(game)
+    mark_user_write(db, game.user_id)
+    await commit_or_flush(db, commit)
     return game
 
+
+async def create_games(db: AsyncSession, games_in: List[MinesGameCreate], commit: bool = True) -> int:
+    """
+    Пакетная запись завершённых игр: один многострочный INSERT на пачку, без RETURNING/refresh.
+    Возвращает количество записанных строк. commit=False — транзакцией управляет вызывающий.
+    """
+    if not games_in:
+        return 0
+    rows = []
+    for g in games_in:
+        row = {
+            "user_id": g.user_id,
+            "bet": g.bet,
+            "num_mines": g.num_mines,
+            "won_amount": g.won_amount,
+            "result_data": g.result_data,
+            "finished_at": g.finished_at,
+        }
+        if g.started_at is not None:
+            row["started_at"] = g.started_at
+        rows.append(row)
+    await db.execute(insert(MinesGame), rows)
+    for user_id in {g.user_id for g in games_in}:
+        mark_user_write(db, user_id)
+    await commit_or_flush(db, commit)
+    return len(rows)
+
 # ===========================
 # READ по ID
 # ===========================
@@ -29,49 +61,64 @@ async def get_game(db: AsyncSession, game_id: int) -> Optional[MinesGame]:
     return result.scalar_one_or_none()
 
 # ===========================
-# READ все игры
+# READ все игры (страницами, новые сначала)
 # ===========================
-async def get_all_games(db: AsyncSession) -> List[MinesGame]:
-    result = await db.execute(select(MinesGame).order_by(MinesGame.started_at.desc()))
-    return result.scalars().all()
+async def get_all_games(
+    db: AsyncSession,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[List[MinesGame], Optional[str]]:
+    return await keyset_page(
+        db, select(MinesGame), MinesGame.started_at, MinesGame.id, cursor=cursor, limit=limit
+    )
 
 # ===========================
-# READ все игры конкретного пользователя
+# READ игры конкретного пользователя (страницами)
 # ===========================
-async def get_user_games(db: AsyncSession, user_id: int) -> List[MinesGame]:
-    result = await db.execute(
-        select(MinesGame)
-        .where(MinesGame.user_id == user_id)
-        .order_by(MinesGame.started_at.desc())
+async def get_user_games(
+    db: AsyncSession,
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[List[MinesGame], Optional[str]]:
+    return await keyset_page(
+        db,
+        select(MinesGame).where(MinesGame.user_id == user_id),
+        MinesGame.started_at,
+        MinesGame.id,
+        cursor=cursor,
+        limit=limit,
     )
-    return result.scalars().all()
 
 # ===========================
 # UPDATE
 # ===========================
-async def update_game(db: AsyncSession, game_id: int, game_in: MinesGameUpdate) -> Optional[MinesGame]:
-    game = await get_game(db, game_id)
-    if not game:
-        return None
+async def update_game(
+    db: AsyncSession, game_id: int, game_in: MinesGameUpdate, commit: bool = True
+) -> Optional[MinesGame]:
+    values = game_in.model_dump(exclude_none=True)
+    if not values:
+        return await get_game(db, game_id)
 
-    if game_in.won_amount is not None:
-        game.won_amount = game_in.won_amount
-    if game_in.finished_at is not None:
-        game.finished_at = game_in.finished_at
-    if game_in.result_data is not None:
-        game.result_data = game_in.result_data
-
-    await db.commit()
-    await db.refresh(game)
+    game = await db.scalar(
+        update(MinesGame)
+        .where(MinesGame.id == game_id)
+        .values(**values)
+        .returning(MinesGame)
+        .execution_options(populate_existing=True)
+    )
+    if game is None:
+        return None
+    mark_user_write(db, game.user_id)
+    await commit_or_flush(db, commit)
     return game
 
 # ===========================
 # DELETE
 # ===========================
-async def delete_game(db: AsyncSession, game_id: int) -> bool:
-    game = await get_game(db, game_id)
-    if not game:
+async def delete_game(db: AsyncSession, game_id: int, commit: bool = True) -> bool:
+    deleted = await db.scalar(delete(MinesGame).where(MinesGame.id == game_id).returning(MinesGame.id))
+    if deleted is None:
         return False
-    await db.delete(game)
-    await db.commit()
+    await commit_or_flush(db, commit)
     return True
@@ -1,29 +1,54 @@
-from typing import List, Optional
-from sqlalchemy import select
+from typing import List, Optional, Tuple
+from sqlalchemy import select, insert, update, delete, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from shared_models.models import Transaction
+from shared_models.models import Transaction, Inventory
+from shared_models.db import commit_or_flush, mark_user_write
+from shared_models.versions import track_user_change
+from shared_models.pagination import keyset_page, DEFAULT_PAGE_SIZE
 from shared_models.schemas.transactions import TransactionCreate, TransactionUpdate
 
 # ---------------------------
 # CREATE
 # ---------------------------
-async def create_transaction(db: AsyncSession, tx: TransactionCreate) -> Transaction:
-    db_tx = Transaction(**tx.dict())
-    db.add(db_tx)
-    await db.commit()
-    await db.refresh(db_tx)
+async def create_transaction(db: AsyncSession, tx: TransactionCreate, commit: bool = True) -> Transaction:
+    db_tx = await db.scalar(insert(Transaction).values(**tx.model_dump()).returning(Transaction))
+    mark_user_write(db, db_tx.user_id)
+    await commit_or_flush(db, commit)
     return db_tx
 
+
+async def create_transactions(db: AsyncSession, txs: List[TransactionCreate], commit: bool = True) -> int:
+    """
+    Многострочный INSERT без RETURNING. Возвращает количество записанных строк.
+    """
+    if not txs:
+        return 0
+    await db.execute(insert(Transaction), [tx.model_dump() for tx in txs])
+    for user_id in {tx.user_id for tx in txs}:
+        mark_user_write(db, user_id)
+    await commit_or_flush(db, commit)
+    return len(txs)
+
 # ---------------------------
-# READ все транзакции пользователя
+# READ транзакции пользователя (страницами, новые сначала)
 # ---------------------------
-async def get_transactions_by_user(db: AsyncSession, user_id: int) -> List[Transaction]:
-    result = await db.execute(
-        select(Transaction)
-        .where(Transaction.user_id == user_id)
-        .order_by(Transaction.created_at.desc())
+async def get_transactions_by_user(
+    db: AsyncSession,
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[List[Transaction], Optional[str]]:
+    """
+    Возвращает (страница, курсор следующей страницы). Индекс ix_transactions_user_created.
+    """
+    return await keyset_page(
+        db,
+        select(Transaction).where(Transaction.user_id == user_id),
+        Transaction.created_at,
+        Transaction.id,
+        cursor=cursor,
+        limit=limit,
     )
-    return result.scalars().all()
 
 # ---------------------------
 # READ по ID
@@ -35,25 +60,70 @@ async def get_transaction(db: AsyncSession, tx_id: int) -> Optional[Transaction]
 # ---------------------------
 # UPDATE
 # ---------------------------
-async def update_transaction(db: AsyncSession, tx_id: int, data: TransactionUpdate) -> Optional[Transaction]:
-    tx = await get_transaction(db, tx_id)
-    if not tx:
+async def update_transaction(
+    db: AsyncSession, tx_id: int, data: TransactionUpdate, commit: bool = True
+) -> Optional[Transaction]:
+    values = data.model_dump(exclude_unset=True)
+    if not values:
+        return await get_transaction(db, tx_id)
+
+    tx = await db.scalar(
+        update(Transaction)
+        .where(Transaction.id == tx_id)
+        .values(**values)
+        .returning(Transaction)
+        .execution_options(populate_existing=True)
+    )
+    if tx is None:
         return None
+    mark_user_write(db, tx.user_id)
+    await commit_or_flush(db, commit)
+    return tx
 
-    for key, value in data.dict(exclude_unset=True).items():
-        setattr(tx, key, value)
+# ---------------------------
+# Отказ в выводе подарка
+# ---------------------------
+async def restore_withdrawal(db: AsyncSession, tx_id: int, commit: bool = True) -> Optional[Transaction]:
+    """
+    Переводит pending-заявку gift_withdrawal в rejected и возвращает предмет
+    в инвентарь с прежними id и received_at. Условный UPDATE — повторный вызов
+    (или гонка двух обработчиков) не вернёт предмет дважды.
+    None — заявки нет или она уже обработана.
+    """
+    tx = await db.scalar(
+        update(Transaction)
+        .where(
+            Transaction.id == tx_id,
+            Transaction.type == "gift_withdrawal",
+            Transaction.status == "pending",
+        )
+        .values(status="rejected", completed_at=func.now())
+        .returning(Transaction)
+        .execution_options(populate_existing=True)
+    )
+    if tx is None:
+        return None
 
-    await db.commit()
-    await db.refresh(tx)
+    # Подарок могли удалить из каталога (gift_id обнулён) — возвращать нечего
+    if tx.gift_id is not None:
+        values = {"user_id": tx.user_id, "gift_id": tx.gift_id}
+        if tx.inventory_id is not None:
+            values["id"] = tx.inventory_id
+        if tx.item_received_at is not None:
+            values["received_at"] = tx.item_received_at
+        await db.execute(insert(Inventory).values(**values))
+        track_user_change(db, tx.user_id)
+    else:
+        mark_user_write(db, tx.user_id)
+    await commit_or_flush(db, commit)
     return tx
 
 # ---------------------------
 # DELETE
 # ---------------------------
-async def delete_transaction(db: AsyncSession, tx_id: int) -> Optional[Transaction]:
-    tx = await get_transaction(db, tx_id)
-    if not tx:
+async def delete_transaction(db: AsyncSession, tx_id: int, commit: bool = True) -> Optional[Transaction]:
+    tx = await db.scalar(delete(Transaction).where(Transaction.id == tx_id).returning(Transaction))
+    if tx is None:
         return None
-    await db.delete(tx)
-    await db.commit()
+    await commit_or_flush(db, commit)
     return tx
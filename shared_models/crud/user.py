@@ -1,110 +1,152 @@
+import enum
 from typing import Optional, List
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, insert, update, bindparam, Row
+from sqlalchemy.orm import selectinload, load_only, raiseload
 from sqlalchemy.ext.asyncio import AsyncSession
 from shared_models.models import User
 from shared_models.models import Inventory
 from shared_models.schemas.user import UserCreate
+from shared_models.db import on_commit, commit_or_flush
+from shared_models import leaderboard, versions
+
+
+def _track_balance(db: AsyncSession, user_id: int, coins_balance: float, balance_version: int) -> None:
+    """
+    После commit обновляет позицию пользователя в лидерборде и версию профиля.
+    """
+    on_commit(db, lambda: leaderboard.record_balance(user_id, coins_balance, balance_version))
+    versions.track_user_change(db, user_id)
 
 # ---------------------------
 # CREATE
 # ---------------------------
-async def create_user(db: AsyncSession, user_in: UserCreate) -> User:
-    db_user = User(
-        tg_id=user_in.tg_id,
-        username=user_in.username,
-        name=user_in.name,
-        avatar_url=user_in.avatar_url,
-        chat_id=user_in.chat_id,
-        ref_code=user_in.ref_code,
-        ref_by=user_in.ref_by,
-        ton_balance=user_in.ton_balance,
-        coins_balance=user_in.coins_balance
+async def create_user(db: AsyncSession, user_in: UserCreate, commit: bool = True) -> User:
+    db_user = await db.scalar(
+        insert(User)
+        .values(
+            tg_id=user_in.tg_id,
+            username=user_in.username,
+            name=user_in.name,
+            avatar_url=user_in.avatar_url,
+            chat_id=user_in.chat_id,
+            ref_code=user_in.ref_code,
+            ref_by=user_in.ref_by,
+            ton_balance=user_in.ton_balance,
+            coins_balance=user_in.coins_balance
+        )
+        .returning(User)
     )
-    db.add(db_user)
-    await db.commit()
-    await db.refresh(db_user)
+    _track_balance(db, db_user.id, db_user.coins_balance or 0.0, db_user.balance_version)
+    await commit_or_flush(db, commit)
     return db_user
 
 # ---------------------------
-# READ
+# Профили загрузки
 # ---------------------------
-async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
-    result = await db.execute(
-        select(User)
-        .options(
-            selectinload(User.inventory).selectinload(Inventory.gift),
-            selectinload(User.wallets),
-            selectinload(User.games),
-            selectinload(User.lottery_tickets),
-            selectinload(User.transactions),
-        )
-        .where(User.id == user_id)
-    )
+class UserLoad(str, enum.Enum):
+    """
+    Сколько данных тянуть вместе с пользователем.
+    Выбирайте самый маленький профиль, которого хватает вызывающему коду.
+    """
+    LOGIN = "login"      # только id
+    BALANCE = "balance"  # скалярные поля, без связей
+    PROFILE = "profile"  # + инвентарь с подарками (для UserResponse)
+    FULL = "full"        # все связи
+
+
+# Опции собираются один раз при импорте и переиспользуются во всех запросах.
+# raiseload("*") не даёт случайно дёрнуть незагруженную связь (в async это всё равно ошибка).
+_LOAD_OPTIONS = {
+    UserLoad.LOGIN: (load_only(User.id), raiseload("*")),
+    UserLoad.BALANCE: (raiseload("*"),),
+    UserLoad.PROFILE: (
+        selectinload(User.inventory).selectinload(Inventory.gift),
+        raiseload("*"),
+    ),
+    UserLoad.FULL: (
+        selectinload(User.inventory).selectinload(Inventory.gift),
+        selectinload(User.wallets),
+        selectinload(User.games),
+        selectinload(User.lottery_tickets),
+        selectinload(User.transactions),
+    ),
+}
+
+
+def _select_user(load: UserLoad):
+    return select(User).options(*_LOAD_OPTIONS[load])
+
+
+# ---------------------------
+# READ (ORM)
+# ---------------------------
+async def get_user_by_id(db: AsyncSession, user_id: int, load: UserLoad = UserLoad.FULL) -> Optional[User]:
+    result = await db.execute(_select_user(load).where(User.id == user_id))
     return result.scalar_one_or_none()
 
 
-async def get_user_by_tg_id(db: AsyncSession, tg_id: int) -> Optional[User]:
-    result = await db.execute(
-        select(User)
-        .options(
-            selectinload(User.inventory).selectinload(Inventory.gift),
-            selectinload(User.wallets),
-            selectinload(User.games),
-            selectinload(User.lottery_tickets),
-            selectinload(User.transactions),
-        )
-        .where(User.tg_id == tg_id)
-    )
+async def get_user_by_tg_id(db: AsyncSession, tg_id: int, load: UserLoad = UserLoad.FULL) -> Optional[User]:
+    result = await db.execute(_select_user(load).where(User.tg_id == tg_id))
     return result.scalar_one_or_none()
 
 
-async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
-    result = await db.execute(
-        select(User)
-        .options(
-            selectinload(User.inventory).selectinload(Inventory.gift),
-            selectinload(User.wallets),
-            selectinload(User.games),
-            selectinload(User.lottery_tickets),
-            selectinload(User.transactions),
-        )
-        .where(User.username == username)
-    )
+async def get_user_by_username(db: AsyncSession, username: str, load: UserLoad = UserLoad.FULL) -> Optional[User]:
+    result = await db.execute(_select_user(load).where(User.username == username))
     return result.scalar_one_or_none()
 
 
-async def get_users_by_ref_by(db: AsyncSession, ref_by_username: str) -> List[User]:
-    result = await db.execute(
-        select(User)
-        .options(
-            selectinload(User.inventory).selectinload(Inventory.gift),
-            selectinload(User.wallets),
-            selectinload(User.games),
-            selectinload(User.lottery_tickets),
-            selectinload(User.transactions),
-        )
-        .where(User.ref_by == ref_by_username)
-    )
+async def get_users_by_ref_by(db: AsyncSession, ref_by_username: str, load: UserLoad = UserLoad.FULL) -> List[User]:
+    result = await db.execute(_select_user(load).where(User.ref_by == ref_by_username))
     return result.scalars().all()
 
 
-async def get_top_users_by_coins(db: AsyncSession, limit: int = 100) -> List[User]:
+async def get_top_users_by_coins(db: AsyncSession, limit: int = 100, load: UserLoad = UserLoad.FULL) -> List[User]:
     result = await db.execute(
-        select(User)
-        .options(
-            selectinload(User.inventory).selectinload(Inventory.gift),
-            selectinload(User.wallets),
-            selectinload(User.games),
-            selectinload(User.lottery_tickets),
-            selectinload(User.transactions),
-        )
+        _select_user(load)
         .order_by(User.coins_balance.desc())
         .limit(limit)
     )
     return result.scalars().all()
 
 
+# ---------------------------
+# READ (Core, горячий путь)
+# ---------------------------
+# Готовые statement'ы: строятся один раз, SQLAlchemy кэширует их компиляцию,
+# результат — обычные строки без ORM-материализации и identity map.
+_USER_BALANCE_STMT = (
+    select(User.id, User.ton_balance, User.coins_balance)
+    .where(User.id == bindparam("user_id"))
+)
+_USER_SUMMARY_STMT = (
+    select(User.id, User.username, User.ton_balance, User.coins_balance)
+    .where(User.id == bindparam("user_id"))
+)
+_USER_ID_BY_TG_ID_STMT = select(User.id).where(User.tg_id == bindparam("tg_id"))
+
+
+async def get_user_balance(db: AsyncSession, user_id: int) -> Optional[Row]:
+    """
+    Возвращает строку (id, ton_balance, coins_balance) или None.
+    """
+    result = await db.execute(_USER_BALANCE_STMT, {"user_id": user_id})
+    return result.one_or_none()
+
+
+async def get_user_summary(db: AsyncSession, user_id: int) -> Optional[Row]:
+    """
+    Строка (id, username, ton_balance, coins_balance) для шапки приложения.
+    Горячий путь — shared_models.cache.get_user_balance_cached.
+    """
+    result = await db.execute(_USER_SUMMARY_STMT, {"user_id": user_id})
+    return result.one_or_none()
+
+
+async def get_user_id_by_tg_id(db: AsyncSession, tg_id: int) -> Optional[int]:
+    result = await db.execute(_USER_ID_BY_TG_ID_STMT, {"tg_id": tg_id})
+    return result.scalar_one_or_none()
+
+
 # ---------------------------
 # UPDATE баланса
 # ---------------------------
@@ -112,17 +154,76 @@ async def update_user_balance(
     db: AsyncSession,
     user_id: int,
     ton_balance: Optional[float] = None,
-    coins_balance: Optional[float] = None
+    coins_balance: Optional[float] = None,
+    commit: bool = True,
 ) -> Optional[User]:
-    user = await get_user_by_id(db, user_id)
-    if not user:
-        return None
-
+    """
+    Выставляет абсолютные значения балансов одним UPDATE … RETURNING.
+    Для списаний/начислений используйте change_user_balance — там нет гонки.
+    """
+    values = {}
     if ton_balance is not None:
-        user.ton_balance = ton_balance
+        values["ton_balance"] = ton_balance
     if coins_balance is not None:
-        user.coins_balance = coins_balance
+        values["coins_balance"] = coins_balance
+    if not values:
+        return await get_user_by_id(db, user_id, load=UserLoad.BALANCE)
+    values["balance_version"] = User.balance_version + 1
 
-    await db.commit()
-    await db.refresh(user)
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(**values)
+        .returning(User)
+        .execution_options(populate_existing=True)
+    )
+    user = result.scalar_one_or_none()
+    if user is not None:
+        _track_balance(db, user.id, user.coins_balance, user.balance_version)
+    await commit_or_flush(db, commit)
     return user
+
+
+async def change_user_balance(
+    db: AsyncSession,
+    user_id: int,
+    ton_delta: float = 0.0,
+    coins_delta: float = 0.0,
+    commit: bool = True,
+) -> Optional[Row]:
+    """
+    Атомарно меняет балансы на дельты (отрицательная дельта — списание):
+
+        UPDATE users SET coins_balance = coins_balance + :d
+        WHERE id = :id AND coins_balance >= -:d
+        RETURNING id, ton_balance, coins_balance, balance_version
+
+    Одна круговая поездка в БД, без предварительного SELECT и без окна lost update.
+    Возвращает строку с новыми балансами или None, если пользователь не найден
+    либо средств не хватает (в этом случае ничего не списано).
+    commit=False — вызывающий код сам управляет транзакцией.
+    """
+    stmt = update(User).where(User.id == user_id)
+    values = {}
+    if ton_delta:
+        values["ton_balance"] = User.ton_balance + ton_delta
+        if ton_delta < 0:
+            stmt = stmt.where(User.ton_balance >= -ton_delta)
+    if coins_delta:
+        values["coins_balance"] = User.coins_balance + coins_delta
+        if coins_delta < 0:
+            stmt = stmt.where(User.coins_balance >= -coins_delta)
+    if not values:
+        return await get_user_balance(db, user_id)
+    values["balance_version"] = User.balance_version + 1
+
+    result = await db.execute(
+        stmt.values(**values)
+        .returning(User.id, User.ton_balance, User.coins_balance, User.balance_version)
+        .execution_options(synchronize_session=False)
+    )
+    row = result.one_or_none()
+    if row is not None:
+        _track_balance(db, row.id, row.coins_balance, row.balance_version)
+    await commit_or_flush(db, commit)
+    return row
@@ -1,21 +1,25 @@
 from typing import List, Optional
-from sqlalchemy import select
+from sqlalchemy import select, insert, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 from shared_models.models import Wallet
+from shared_models.db import commit_or_flush, mark_user_write
 from shared_models.schemas.wallet import WalletCreate
 
 # ---------------------------
 # CREATE
 # ---------------------------
-async def create_wallet(db: AsyncSession, wallet_in: WalletCreate) -> Wallet:
-    db_wallet = Wallet(
-        user_id=wallet_in.user_id,
-        wallet_address=wallet_in.wallet_address,
-        wallet_type=wallet_in.wallet_type
+async def create_wallet(db: AsyncSession, wallet_in: WalletCreate, commit: bool = True) -> Wallet:
+    db_wallet = await db.scalar(
+        insert(Wallet)
+        .values(
+            user_id=wallet_in.user_id,
+            wallet_address=wallet_in.wallet_address,
+            wallet_type=wallet_in.wallet_type
+        )
+        .returning(Wallet)
     )
-    db.add(db_wallet)
-    await db.commit()
-    await db.refresh(db_wallet)
+    mark_user_write(db, db_wallet.user_id)
+    await commit_or_flush(db, commit)
     return db_wallet
 
 # ---------------------------
@@ -35,10 +39,9 @@ async def get_wallet_by_id(db: AsyncSession, wallet_id: int) -> Optional[Wallet]
 # ---------------------------
 # DELETE
 # ---------------------------
-async def delete_wallet(db: AsyncSession, wallet_id: int) -> bool:
-    wallet = await get_wallet_by_id(db, wallet_id)
-    if not wallet:
+async def delete_wallet(db: AsyncSession, wallet_id: int, commit: bool = True) -> bool:
+    deleted = await db.scalar(delete(Wallet).where(Wallet.id == wallet_id).returning(Wallet.id))
+    if deleted is None:
         return False
-    await db.delete(wallet)
-    await db.commit()
+    await commit_or_flush(db, commit)
     return True
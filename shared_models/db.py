@@ -1,9 +1,18 @@
 import asyncio
+import bisect
+import time
 from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, asdict
 import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from .base import Base
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Optional, Callable, Awaitable
+from shared_models.redis_client import get_redis
 from shared_models.models import * 
 import shared_models.models  
 
@@ -18,19 +27,215 @@ DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{D
 engine: "AsyncEngine | None" = None
 SessionLocal: "async_sessionmaker[AsyncSession] | None" = None
 
+# Реплика для чтения (необязательна). Без неё read_session идёт в primary.
+replica_engine: "AsyncEngine | None" = None
+ReplicaSessionLocal: "async_sessionmaker[AsyncSession] | None" = None
 
-async def create_engine_with_retry(retries=10, delay=3):
+
+# ---------------------------
+# Настройки пула
+# ---------------------------
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class PoolConfig:
+    """
+    Параметры пула соединений и кэша prepared statements asyncpg.
+    Значения по умолчанию совпадают с умолчаниями SQLAlchemy/asyncpg.
+    Каждый процесс (backend, main_bot, withdraw_bot) задаёт их своим окружением,
+    суммарно pool_size + max_overflow по всем процессам должно влезать в max_connections.
+    """
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: int = 30
+    pool_recycle: int = -1
+    pool_pre_ping: bool = False
+    statement_cache_size: int = 100  # 0 — отключить (нужно за pgbouncer в transaction mode)
+
+    @classmethod
+    def from_env(cls) -> "PoolConfig":
+        default = cls()
+        return cls(
+            pool_size=_env_int("DB_POOL_SIZE", default.pool_size),
+            max_overflow=_env_int("DB_MAX_OVERFLOW", default.max_overflow),
+            pool_timeout=_env_int("DB_POOL_TIMEOUT", default.pool_timeout),
+            pool_recycle=_env_int("DB_POOL_RECYCLE", default.pool_recycle),
+            pool_pre_ping=_env_bool("DB_POOL_PRE_PING", default.pool_pre_ping),
+            statement_cache_size=_env_int("DB_STATEMENT_CACHE_SIZE", default.statement_cache_size),
+        )
+
+
+@dataclass
+class ReplicaConfig:
+    """
+    Реплика для read-only запросов.
+    url — DSN реплики (postgresql+asyncpg://...), None — реплики нет.
+    sticky_seconds — сколько секунд после записи пользователя его чтения
+    идут в primary (должно покрывать отставание реплики); 0 — не прилипать.
+    """
+    url: Optional[str] = None
+    sticky_seconds: float = 5.0
+
+    @classmethod
+    def from_env(cls) -> "ReplicaConfig":
+        default = cls()
+        return cls(
+            url=os.getenv("DB_REPLICA_URL") or default.url,
+            sticky_seconds=_env_float("DB_READ_STICKY_SECONDS", default.sticky_seconds),
+        )
+
+
+# ---------------------------
+# Метрики пула
+# ---------------------------
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+@dataclass
+class PoolWaitStats:
+    """
+    Гистограмма времени ожидания соединения из пула (мс).
+    buckets[i] — число ожиданий <= WAIT_BUCKETS_MS[i], последний элемент — всё, что дольше.
+    """
+    buckets: list = field(default_factory=lambda: [0] * (len(WAIT_BUCKETS_MS) + 1))
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    timeouts: int = 0
+
+    def observe(self, wait_ms: float) -> None:
+        self.buckets[bisect.bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+        self.count += 1
+        self.total_ms += wait_ms
+        self.max_ms = max(self.max_ms, wait_ms)
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Обычный асинхронный QueuePool, который замеряет, сколько запрос ждал соединение.
+    """
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_wait_stats.timeouts += 1
+            raise
+        finally:
+            pool_wait_stats.observe((time.perf_counter() - start) * 1000)
+
+
+pool_config: Optional[PoolConfig] = None
+replica_config: ReplicaConfig = ReplicaConfig()
+
+
+def get_pool_stats() -> dict:
+    """
+    Снимок состояния пула: занятые/свободные соединения, overflow и гистограмма ожидания.
+    """
+    if engine is None:
+        return {"connected": False}
+    pool = engine.sync_engine.pool
+    return {
+        "connected": True,
+        "config": asdict(pool_config) if pool_config else None,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "replica": replica_engine is not None,
+        "wait": {
+            "count": pool_wait_stats.count,
+            "avg_ms": pool_wait_stats.total_ms / pool_wait_stats.count if pool_wait_stats.count else 0.0,
+            "max_ms": pool_wait_stats.max_ms,
+            "timeouts": pool_wait_stats.timeouts,
+            "histogram_ms": {
+                **{f"le_{b}": n for b, n in zip(WAIT_BUCKETS_MS, pool_wait_stats.buckets)},
+                "inf": pool_wait_stats.buckets[-1],
+            },
+        },
+    }
+
+
+def _build_engine(url: str, pool: PoolConfig):
+    url = make_url(url).update_query_dict(
+        {"prepared_statement_cache_size": str(pool.statement_cache_size)}
+    )
+    return create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        poolclass=TimedQueuePool,
+        pool_size=pool.pool_size,
+        max_overflow=pool.max_overflow,
+        pool_timeout=pool.pool_timeout,
+        pool_recycle=pool.pool_recycle,
+        pool_pre_ping=pool.pool_pre_ping,
+        connect_args={"statement_cache_size": pool.statement_cache_size},
+    )
+
+
+async def _connect_replica(pool: PoolConfig) -> None:
+    """
+    Поднимает движок реплики. Недоступная реплика не мешает старту:
+    чтения просто идут в primary.
+    """
+    global replica_engine, ReplicaSessionLocal
+    if not replica_config.url:
+        return
+    try:
+        replica_engine = _build_engine(replica_config.url, pool)
+        async with replica_engine.connect() as conn:
+            await conn.run_sync(lambda conn: None)
+        ReplicaSessionLocal = async_sessionmaker(
+            bind=replica_engine,
+            expire_on_commit=False,
+            class_=AsyncSession
+        )
+        print("✅ Подключение к реплике установлено")
+    except Exception as e:
+        print(f"⚠️ Реплика недоступна, чтения идут в primary: {e}")
+        if replica_engine is not None:
+            await replica_engine.dispose()
+        replica_engine = None
+        ReplicaSessionLocal = None
+
+
+async def create_engine_with_retry(
+    retries=10,
+    delay=3,
+    pool: Optional[PoolConfig] = None,
+    replica: Optional[ReplicaConfig] = None,
+):
     """
     Создаёт асинхронный движок и sessionmaker с повторными попытками подключения.
+    pool — настройки пула; по умолчанию читаются из окружения (PoolConfig.from_env).
+    replica — реплика для чтения (ReplicaConfig.from_env по умолчанию), пул у неё такой же.
     """
-    global engine, SessionLocal
+    global engine, SessionLocal, pool_config, replica_config
+    pool_config = pool or PoolConfig.from_env()
+    replica_config = replica or ReplicaConfig.from_env()
     for attempt in range(1, retries + 1):
         try:
-            engine = create_async_engine(
-                DATABASE_URL,
-                echo=False,
-                future=True,
-            )
+            engine = _build_engine(DATABASE_URL, pool_config)
 
             # Тестовое подключение
             async with engine.begin() as conn:
@@ -43,6 +248,7 @@ async def create_engine_with_retry(retries=10, delay=3):
                 class_=AsyncSession
             )
             print("✅ Подключение к базе установлено")
+            await _connect_replica(pool_config)
             return
         except Exception as e:
             print(f"⚠️ Попытка {attempt} не удалась: {e}")
@@ -52,16 +258,44 @@ async def create_engine_with_retry(retries=10, delay=3):
                 raise e
 
 
+# ---------------------------
+# Миграции
+# ---------------------------
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+BASELINE_REVISION = "0001"
+
+
+def _upgrade_schema(connection) -> None:
+    from alembic import command
+    from alembic.config import Config
+    from sqlalchemy import inspect
+
+    config = Config(ALEMBIC_INI)
+    config.attributes["connection"] = connection
+
+    # База, созданная раньше через create_all: схема совпадает с baseline,
+    # помечаем её без выполнения, дальше — обычный upgrade
+    inspector = inspect(connection)
+    legacy = inspector.has_table("users") and not inspector.has_table("alembic_version")
+    connection.commit()
+    if legacy:
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, "head")
+    connection.commit()
+
+
 async def init_db():
     """
-    Инициализация базы данных: создаёт таблицы.
+    Приводит схему к последней миграции (alembic upgrade head).
+    Вызывается одним процессом — контейнером shared_models; бэкенд и боты
+    стартуют без DDL и без рефлексии схемы.
     """
     if engine is None or SessionLocal is None:
         await create_engine_with_retry()
 
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        print("✅ Таблицы созданы / проверены")
+    async with engine.connect() as conn:
+        await conn.run_sync(_upgrade_schema)
+    print("✅ Миграции применены")
 
 
 @asynccontextmanager
@@ -76,4 +310,174 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
     if SessionLocal is None:
         await create_engine_with_retry()
     async with SessionLocal() as session:
-        yield session        
\ No newline at end of file
+        yield session
+
+
+# ---------------------------
+# Чтение с реплики
+# ---------------------------
+# После записи пользователя (commit) в Redis ставится метка на sticky_seconds:
+# пока она жива, его чтения идут в primary и он видит свои изменения,
+# даже если реплика отстаёт. Остальные чтения — на реплику.
+READ_STICKY_KEY = "db:sticky:{user_id}"
+_STICKY_USERS_KEY = "sticky_user_ids"
+
+
+def mark_user_write(db: AsyncSession, user_id: int) -> None:
+    """
+    Отмечает запись данных пользователя в этой сессии. После commit его
+    чтения на sticky_seconds уходят в primary. Одна метка на пользователя за commit.
+    """
+    if replica_config.sticky_seconds <= 0:
+        return
+    user_ids = db.info.get(_STICKY_USERS_KEY)
+    if user_ids is None:
+        user_ids = db.info[_STICKY_USERS_KEY] = set()
+        on_commit(db, lambda: _set_sticky(user_ids))
+    user_ids.add(user_id)
+
+
+async def _set_sticky(user_ids) -> None:
+    redis = get_redis()
+    if redis is None or not user_ids:
+        return
+    ttl_ms = int(replica_config.sticky_seconds * 1000)
+    async with redis.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            pipe.set(READ_STICKY_KEY.format(user_id=user_id), 1, px=ttl_ms)
+        await pipe.execute()
+
+
+async def _use_replica(user_id: Optional[int]) -> bool:
+    if ReplicaSessionLocal is None:
+        return False
+    if user_id is None or replica_config.sticky_seconds <= 0:
+        return True
+    redis = get_redis()
+    if redis is None:
+        return False  # не знаем, писал ли пользователь — читаем из primary
+    try:
+        return not await redis.exists(READ_STICKY_KEY.format(user_id=user_id))
+    except Exception as e:
+        print(f"⚠️ Не удалось проверить sticky-метку, читаем из primary: {e}")
+        return False
+
+
+@asynccontextmanager
+async def read_session(user_id: Optional[int] = None) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Сессия только для чтения: реплика, если она есть и пользователь
+    недавно ничего не писал, иначе primary. user_id=None — общие данные
+    (лидерборд, каталог), допускающие отставание реплики.
+    """
+    if SessionLocal is None:
+        await create_engine_with_retry()
+    factory = ReplicaSessionLocal if await _use_replica(user_id) else SessionLocal
+    async with factory() as session:
+        yield session
+
+
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    async with read_session() as session:
+        yield session
+
+
+# ---------------------------
+# Колбэки после commit
+# ---------------------------
+# Побочные эффекты в Redis (лидерборд, кэши) должны срабатывать только когда
+# изменения реально закоммичены. CRUD регистрирует их через on_commit, они
+# запускаются сразу после COMMIT и выбрасываются при ROLLBACK.
+_AFTER_COMMIT_KEY = "after_commit_callbacks"
+_AFTER_COMMIT_TASKS_KEY = "after_commit_tasks"
+
+
+def on_commit(db: AsyncSession, callback: Callable[[], Awaitable[None]]) -> None:
+    """
+    Регистрирует корутину, которая выполнится после успешного commit этой сессии.
+    """
+    db.info.setdefault(_AFTER_COMMIT_KEY, []).append(callback)
+
+
+async def _run_after_commit(callback: Callable[[], Awaitable[None]]) -> None:
+    try:
+        await callback()
+    except Exception as e:
+        print(f"⚠️ Ошибка в after-commit колбэке: {e}")
+
+
+@event.listens_for(Session, "after_commit")
+def _schedule_after_commit(session: Session) -> None:
+    session.info.pop(_STICKY_USERS_KEY, None)
+    callbacks = session.info.pop(_AFTER_COMMIT_KEY, None)
+    if not callbacks:
+        return
+    loop = asyncio.get_running_loop()
+    tasks = session.info.setdefault(_AFTER_COMMIT_TASKS_KEY, [])
+    for callback in callbacks:
+        tasks.append(loop.create_task(_run_after_commit(callback)))
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_after_commit(session: Session) -> None:
+    session.info.pop(_AFTER_COMMIT_KEY, None)
+    session.info.pop(_STICKY_USERS_KEY, None)
+
+
+async def commit_session(db: AsyncSession) -> None:
+    """
+    COMMIT и ожидание всех after-commit колбэков: к моменту ответа клиенту
+    Redis уже отражает закоммиченные изменения.
+    """
+    await db.commit()
+    tasks = db.info.pop(_AFTER_COMMIT_TASKS_KEY, None)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+# ---------------------------
+# Unit of work
+# ---------------------------
+# CRUD-функции по умолчанию коммитят сами. Внутри unit_of_work они только
+# flush'ат, а единственный COMMIT (с after-commit колбэками) делается на
+# выходе из блока — одна транзакция и один fsync на всю операцию.
+_UOW_DEPTH_KEY = "unit_of_work_depth"
+
+
+def in_unit_of_work(db: AsyncSession) -> bool:
+    return db.info.get(_UOW_DEPTH_KEY, 0) > 0
+
+
+@asynccontextmanager
+async def unit_of_work(db: AsyncSession) -> AsyncGenerator[AsyncSession, None]:
+    """
+    async with unit_of_work(db):
+        await change_user_balance(db, ...)
+        await create_transaction(db, ...)
+
+    Исключение внутри блока откатывает всё. Вложенные блоки
+    присоединяются к внешнему.
+    """
+    depth = db.info.get(_UOW_DEPTH_KEY, 0)
+    db.info[_UOW_DEPTH_KEY] = depth + 1
+    try:
+        yield db
+    except BaseException:
+        db.info[_UOW_DEPTH_KEY] = depth
+        if depth == 0:
+            await db.rollback()
+        raise
+    db.info[_UOW_DEPTH_KEY] = depth
+    if depth == 0:
+        await commit_session(db)
+
+
+async def commit_or_flush(db: AsyncSession, commit: bool = True) -> None:
+    """
+    Завершение записи в CRUD: COMMIT, если транзакцией никто не управляет,
+    иначе только flush (id и server defaults доступны, COMMIT сделает владелец).
+    """
+    if commit and not in_unit_of_work(db):
+        await commit_session(db)
+    else:
+        await db.flush()
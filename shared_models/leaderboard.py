@@ -0,0 +1,219 @@
+import json
+from typing import Optional, List, Iterable
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from shared_models.models import User
+from shared_models.redis_client import get_redis, LuaScript
+
+# ZSET: member = user_id, score = coins_balance
+LEADERBOARD_KEY = "leaderboard:coins"
+# HASH: user_id -> users.balance_version, с которой записан score
+LEADERBOARD_VERSIONS_KEY = "leaderboard:versions"
+# STRING на пользователя: {"username", "avatar_url"} для слим-ответа без похода в users.
+# Живёт META_TTL — смена имени/аватара доезжает до топа не позже чем через него
+LEADERBOARD_META_KEY = "leaderboard:user:{user_id}"
+META_TTL = 600
+# Готовый JSON топа, общий для всех воркеров
+LEADERBOARD_SNAPSHOT_KEY = "leaderboard:snapshot:{limit}"
+SNAPSHOT_TTL_MS = 2000
+REBUILD_BATCH = 5000
+
+# KEYS[1] — ZSET, KEYS[2] — HASH версий; ARGV — тройки (user_id, score, version).
+# after-commit колбэки двух транзакций могут выполниться в любом порядке,
+# поэтому score пишется, только если его версия новее уже записанной.
+# Ответ — сколько записей применено.
+RECORD_SCRIPT = LuaScript("""
+local applied = 0
+for i = 1, #ARGV, 3 do
+    local member, version = ARGV[i], tonumber(ARGV[i + 2])
+    local current = tonumber(redis.call('HGET', KEYS[2], member))
+    if current == nil or version > current then
+        redis.call('HSET', KEYS[2], member, ARGV[i + 2])
+        redis.call('ZADD', KEYS[1], ARGV[i + 1], member)
+        applied = applied + 1
+    end
+end
+return applied
+""")
+
+
+# ---------------------------
+# Обновление рейтинга
+# ---------------------------
+async def _record_many(redis, entries: Iterable[tuple]) -> None:
+    args = []
+    for user_id, coins_balance, balance_version in entries:
+        args += [str(user_id), coins_balance or 0.0, balance_version or 0]
+    if args:
+        await RECORD_SCRIPT(redis, [LEADERBOARD_KEY, LEADERBOARD_VERSIONS_KEY], args)
+
+
+async def record_balance(user_id: int, coins_balance: float, balance_version: int) -> None:
+    """
+    Обновляет позицию пользователя. Вызывается после commit каждого изменения баланса;
+    balance_version — users.balance_version из того же UPDATE … RETURNING.
+    """
+    redis = get_redis()
+    if redis is None:
+        return
+    await _record_many(redis, [(user_id, coins_balance, balance_version)])
+
+
+async def rebuild_if_empty(db: AsyncSession) -> int:
+    """
+    Заполняет ZSET из таблицы users, если он пуст (первый запуск / потеря Redis).
+    Возвращает число загруженных пользователей.
+    """
+    redis = get_redis()
+    if redis is None or await redis.zcard(LEADERBOARD_KEY):
+        return 0
+
+    # Версии без ZSET (его удалили отдельно) не должны блокировать загрузку
+    await redis.delete(LEADERBOARD_VERSIONS_KEY)
+    loaded = 0
+    result = await db.stream(
+        select(User.id, User.coins_balance, User.balance_version).execution_options(yield_per=REBUILD_BATCH)
+    )
+    async for rows in result.partitions(REBUILD_BATCH):
+        # Через тот же скрипт: обновления, пришедшие во время загрузки, не затираются
+        await _record_many(redis, rows)
+        loaded += len(rows)
+    return loaded
+
+
+# ---------------------------
+# Чтение
+# ---------------------------
+async def _load_meta(db: AsyncSession, user_ids: List[int]) -> dict:
+    redis = get_redis()
+    meta = {}
+    if not user_ids:
+        return meta
+
+    cached = await redis.mget([LEADERBOARD_META_KEY.format(user_id=uid) for uid in user_ids])
+    missing = []
+    for uid, raw in zip(user_ids, cached):
+        if raw:
+            meta[uid] = json.loads(raw)
+        else:
+            missing.append(uid)
+
+    if missing:
+        result = await db.execute(
+            select(User.id, User.username, User.avatar_url).where(User.id.in_(missing))
+        )
+        fresh = {r.id: {"username": r.username, "avatar_url": r.avatar_url} for r in result}
+        if fresh:
+            async with redis.pipeline(transaction=False) as pipe:
+                for uid, m in fresh.items():
+                    pipe.set(LEADERBOARD_META_KEY.format(user_id=uid), json.dumps(m, separators=(",", ":")), ex=META_TTL)
+                await pipe.execute()
+        meta.update(fresh)
+    return meta
+
+
+def _serialize(entries: Iterable[dict]) -> bytes:
+    return json.dumps(list(entries), separators=(",", ":"), ensure_ascii=False).encode()
+
+
+async def _top_from_db(db: AsyncSession, limit: int) -> bytes:
+    # Без Redis — слим-запрос к БД без связей
+    result = await db.execute(
+        select(User.id, User.username, User.avatar_url, User.coins_balance)
+        .order_by(User.coins_balance.desc())
+        .limit(limit)
+    )
+    return _serialize(r._asdict() for r in result)
+
+
+async def get_top_snapshot(db: AsyncSession, limit: int = 100) -> bytes:
+    """
+    JSON топа [{id, username, avatar_url, coins_balance}, …].
+    Собирается раз в SNAPSHOT_TTL_MS на весь кластер и отдаётся как есть,
+    так что стоимость не зависит ни от числа пользователей, ни от их инвентаря.
+    Redis недоступен — топ из БД.
+    """
+    redis = get_redis()
+    if redis is None:
+        return await _top_from_db(db, limit)
+    try:
+        return await _top_from_redis(db, redis, limit)
+    except Exception as e:
+        print(f"⚠️ Лидерборд в Redis недоступен, топ из БД: {e}")
+        return await _top_from_db(db, limit)
+
+
+async def _top_from_redis(db: AsyncSession, redis, limit: int) -> bytes:
+    snapshot_key = LEADERBOARD_SNAPSHOT_KEY.format(limit=limit)
+    cached = await redis.get(snapshot_key)
+    if cached:
+        return cached.encode() if isinstance(cached, str) else cached
+
+    top = await redis.zrevrange(LEADERBOARD_KEY, 0, limit - 1, withscores=True)
+    user_ids = [int(member) for member, _ in top]
+    meta = await _load_meta(db, user_ids)
+
+    payload = _serialize(
+        {
+            "id": uid,
+            "username": meta.get(uid, {}).get("username"),
+            "avatar_url": meta.get(uid, {}).get("avatar_url"),
+            "coins_balance": score,
+        }
+        for uid, (_, score) in zip(user_ids, top)
+        if uid in meta
+    )
+    await redis.set(snapshot_key, payload, px=SNAPSHOT_TTL_MS)
+    return payload
+
+
+async def _rank_from_db(db: AsyncSession, user_id: int) -> Optional[dict]:
+    coins_balance = (
+        select(func.coalesce(User.coins_balance, 0.0)).where(User.id == user_id).scalar_subquery()
+    )
+    result = await db.execute(
+        select(
+            coins_balance.label("coins_balance"),
+            select(func.count()).where(func.coalesce(User.coins_balance, 0.0) > coins_balance).scalar_subquery().label("above"),
+        )
+    )
+    row = result.one()
+    if row.coins_balance is None:
+        return None
+    return {"id": user_id, "rank": row.above + 1, "coins_balance": row.coins_balance}
+
+
+async def get_user_rank(db: AsyncSession, user_id: int) -> Optional[dict]:
+    """
+    Место пользователя (с 1) и его баланс через ZREVRANK / ZSCORE.
+    Redis недоступен — место считается в БД (count пользователей с большим балансом).
+    None — пользователя нет.
+    """
+    redis = get_redis()
+    if redis is None:
+        return await _rank_from_db(db, user_id)
+    try:
+        return await _rank_from_redis(db, redis, user_id)
+    except Exception as e:
+        print(f"⚠️ Лидерборд в Redis недоступен, место из БД: {e}")
+        return await _rank_from_db(db, user_id)
+
+
+async def _rank_from_redis(db: AsyncSession, redis, user_id: int) -> Optional[dict]:
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zrevrank(LEADERBOARD_KEY, str(user_id))
+        pipe.zscore(LEADERBOARD_KEY, str(user_id))
+        rank, score = await pipe.execute()
+
+    if rank is None:
+        # Пользователь ещё не попал в рейтинг (не менял баланс с момента регистрации)
+        result = await db.execute(
+            select(User.coins_balance, User.balance_version).where(User.id == user_id)
+        )
+        row = result.one_or_none()
+        if row is None:
+            return None
+        await record_balance(user_id, row.coins_balance or 0.0, row.balance_version)
+        rank, score = await redis.zrevrank(LEADERBOARD_KEY, str(user_id)), row.coins_balance or 0.0
+
+    return {"id": user_id, "rank": rank + 1, "coins_balance": score}
@@ -4,8 +4,8 @@ from shared_models.db import init_db, create_engine_with_retry
 
 async def main():
     await create_engine_with_retry()  # создаём движок и sessionmaker
-    await init_db()                   # создаём таблицы
-    print("✅ Shared_models готов и таблицы созданы")
+    await init_db()                   # применяем миграции
+    print("✅ Shared_models готов, схема на последней миграции")
     
     while True:
         await asyncio.sleep(3600)    # держим контейнер живым
@@ -0,0 +1,111 @@
+"""baseline: схема, которую раньше создавал create_all
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Существующие базы, созданные через create_all, помечаются этой ревизией
+без выполнения (см. shared_models.db.init_db), новые — создаются с нуля.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("username", sa.String(), nullable=False, unique=True),
+        sa.Column("tg_id", sa.BigInteger(), nullable=False, unique=True),
+        sa.Column("chat_id", sa.BigInteger(), nullable=False, unique=True),
+        sa.Column("avatar_url", sa.String(), nullable=True),
+        sa.Column("ref_code", sa.String(), nullable=False, unique=True),
+        sa.Column("ref_by", sa.BigInteger(), nullable=True),
+        sa.Column("ton_balance", sa.Float(), nullable=True),
+        sa.Column("coins_balance", sa.Float(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+
+    op.create_table(
+        "gifts",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("telegram_gift_id", sa.String(), nullable=False),
+        sa.Column("cost_coins", sa.Float(), nullable=False),
+        sa.Column("cost_ton", sa.Float(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("image_url", sa.String(), nullable=False),
+    )
+
+    op.create_table(
+        "wallets",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("wallet_address", sa.String(), nullable=False, unique=True),
+        sa.Column("wallet_type", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+
+    op.create_table(
+        "inventory",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=True),
+        sa.Column("gift_id", sa.Integer(), sa.ForeignKey("gifts.id", ondelete="CASCADE"), nullable=True),
+        sa.Column("received_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+
+    op.create_table(
+        "mines_games",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("bet", sa.Float(), nullable=False),
+        sa.Column("num_mines", sa.Integer(), nullable=False),
+        sa.Column("won_amount", sa.Float(), nullable=True),
+        sa.Column("started_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("result_data", sa.String(), nullable=True),
+    )
+
+    op.create_table(
+        "lottery_tickets",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("ticket_type", sa.Enum("bronze", "silver", "gold", name="tickettypeenum"), nullable=False),
+        sa.Column("currency", sa.Enum("hrpn", "ton", name="currency"), nullable=False),
+        sa.Column("price", sa.Float(), nullable=False),
+        sa.Column("won_gift_ids", postgresql.ARRAY(sa.Integer()), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+
+    op.create_table(
+        "transactions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=True),
+        sa.Column("gift_id", sa.Integer(), sa.ForeignKey("gifts.id"), nullable=True),
+        sa.Column("status", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("transactions")
+    op.drop_table("lottery_tickets")
+    op.drop_table("mines_games")
+    op.drop_table("inventory")
+    op.drop_table("wallets")
+    op.drop_table("gifts")
+    op.drop_index("ix_users_id", table_name="users")
+    op.drop_table("users")
+    sa.Enum(name="currency").drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name="tickettypeenum").drop(op.get_bind(), checkfirst=True)
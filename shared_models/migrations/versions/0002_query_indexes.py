@@ -0,0 +1,56 @@
+"""индексы под реальные запросы CRUD
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+Индексы создаются CONCURRENTLY вне транзакции, чтобы не блокировать
+запись в большие таблицы на время построения.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+# (имя, таблица, колонки, WHERE для частичного индекса)
+INDEXES = [
+    # FK user_id: выборки по пользователю и каскадные удаления
+    ("ix_wallets_user_id", "wallets", ["user_id"], None),
+    ("ix_inventory_user_gift", "inventory", ["user_id", "gift_id"], None),
+    ("ix_inventory_gift_id", "inventory", ["gift_id"], None),
+    # Keyset-пагинация истории (user_id, ts, id) и общие списки (ts, id)
+    ("ix_mines_games_user_started", "mines_games", ["user_id", "started_at", "id"], None),
+    ("ix_mines_games_started", "mines_games", ["started_at", "id"], None),
+    ("ix_lottery_tickets_user_created", "lottery_tickets", ["user_id", "created_at", "id"], None),
+    ("ix_lottery_tickets_created", "lottery_tickets", ["created_at", "id"], None),
+    ("ix_transactions_user_created", "transactions", ["user_id", "created_at", "id"], None),
+    # Фильтры бота вывода по типу/статусу и очередь pending
+    ("ix_transactions_type_status", "transactions", ["type", "status"], None),
+    ("ix_transactions_pending", "transactions", ["created_at", "id"], "status = 'pending'"),
+    ("ix_transactions_gift_id", "transactions", ["gift_id"], None),
+    # Рефералы пользователя
+    ("ix_users_ref_by", "users", ["ref_by"], None),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,53 @@
+"""индексы инвентаря под стопки и постраничный список
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+(user_id, gift_id) расширяется до (user_id, gift_id, received_at), чтобы
+GROUP BY gift_id с min(received_at) выполнялся по индексу; старый индекс
+становится его префиксом и удаляется.
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_inventory_user_gift_received",
+            "inventory",
+            ["user_id", "gift_id", "received_at"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_inventory_user_received",
+            "inventory",
+            ["user_id", "received_at", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_inventory_user_gift",
+            table_name="inventory",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_inventory_user_gift",
+            "inventory",
+            ["user_id", "gift_id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index("ix_inventory_user_received", table_name="inventory", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_inventory_user_gift_received", table_name="inventory", postgresql_concurrently=True, if_exists=True)
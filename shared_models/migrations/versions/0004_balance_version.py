@@ -0,0 +1,28 @@
+"""users.balance_version для упорядочивания обновлений лидерборда
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+Счётчик растёт в каждом UPDATE баланса; лидерборд в Redis не принимает
+score с версией не новее уже записанной. ADD COLUMN с константным DEFAULT
+в Postgres 11+ не переписывает таблицу.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("balance_version", sa.BigInteger(), nullable=False, server_default=sa.text("0")),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("users", "balance_version")
@@ -0,0 +1,27 @@
+"""предмет заявки на вывод подарка
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+transactions.inventory_id / item_received_at — какой предмет снят из
+инвентаря под gift_withdrawal, чтобы при отказе вернуть его как был.
+Без FK: строка inventory к этому моменту удалена.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("transactions", sa.Column("inventory_id", sa.Integer(), nullable=True))
+    op.add_column("transactions", sa.Column("item_received_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("transactions", "item_received_at")
+    op.drop_column("transactions", "inventory_id")
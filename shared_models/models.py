@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Enum, BigInteger
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Enum, BigInteger, Index, text
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -19,9 +19,12 @@ class User(Base):
     chat_id = Column(BigInteger, unique=True, nullable=False)
     avatar_url = Column(String, nullable=True)
     ref_code = Column(String, unique=True, nullable=False)
-    ref_by = Column(BigInteger, nullable=True, default=None)
+    ref_by = Column(BigInteger, nullable=True, default=None, index=True)
     ton_balance = Column(Float, default=0.0)
     coins_balance = Column(Float, default=0.0)
+    # Растёт при каждом изменении баланса (строка под row lock — порядок commit'ов),
+    # по нему лидерборд отбрасывает запоздавшие обновления
+    balance_version = Column(BigInteger, nullable=False, default=0, server_default=text("0"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     wallets = relationship("Wallet", back_populates="user")
@@ -40,7 +43,7 @@ class Wallet(Base):
     __tablename__ = "wallets"
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     wallet_address = Column(String, unique=True, nullable=False)
     wallet_type = Column(String, nullable=False)  # ton, ethereum, etc
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -55,12 +58,20 @@ class Inventory(Base):
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
-    gift_id = Column(Integer, ForeignKey("gifts.id", ondelete="CASCADE"))
+    gift_id = Column(Integer, ForeignKey("gifts.id", ondelete="CASCADE"), index=True)
     received_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User", back_populates="inventory")
     gift = relationship("Gift", back_populates="owners")
 
+    # Все выборки инвентаря идут по user_id или (user_id, gift_id);
+    # received_at в ключе — GROUP BY стопок и min() отдаются по индексу,
+    # (user_id, received_at, id) — keyset-пагинация списка предметов
+    __table_args__ = (
+        Index("ix_inventory_user_gift_received", "user_id", "gift_id", "received_at"),
+        Index("ix_inventory_user_received", "user_id", "received_at", "id"),
+    )
+
 # ------------------------------
 # Доступные подарки
 # ------------------------------
@@ -96,6 +107,12 @@ class MinesGame(Base):
 
     user = relationship("User", back_populates="games")
 
+    # Keyset-пагинация истории: (user_id, started_at, id) и общий список (started_at, id)
+    __table_args__ = (
+        Index("ix_mines_games_user_started", "user_id", "started_at", "id"),
+        Index("ix_mines_games_started", "started_at", "id"),
+    )
+
 
 
 # ------------------------------
@@ -127,6 +144,11 @@ class LotteryTicket(Base):
 
     user = relationship("User", back_populates="lottery_tickets")
 
+    __table_args__ = (
+        Index("ix_lottery_tickets_user_created", "user_id", "created_at", "id"),
+        Index("ix_lottery_tickets_created", "created_at", "id"),
+    )
+
 
 # ------------------------------
 # Запросы на вывод
@@ -138,10 +160,26 @@ class Transaction(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     type = Column(String, nullable=False)  # deposit, ton_withdrawal, gift_withdrawal, gift_sale
     amount = Column(Float, nullable=True)  # TON сумма (если применимо)
-    gift_id = Column(Integer, ForeignKey("gifts.id"), nullable=True)  # если это подарок
+    gift_id = Column(Integer, ForeignKey("gifts.id"), nullable=True, index=True)  # если это подарок
     status = Column(String, default="pending")  # pending, completed, rejected
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     completed_at = Column(DateTime(timezone=True), nullable=True)
+    # Для gift_withdrawal: предмет, снятый из инвентаря (строка удалена),
+    # чтобы отклонённая заявка вернула его с тем же id и временем получения
+    inventory_id = Column(Integer, nullable=True)
+    item_received_at = Column(DateTime(timezone=True), nullable=True)
 
     user = relationship("User", back_populates="transactions")
-    gift = relationship("Gift", back_populates="transactions", lazy="joined")
\ No newline at end of file
+    gift = relationship("Gift", back_populates="transactions", lazy="joined")
+
+    __table_args__ = (
+        Index("ix_transactions_user_created", "user_id", "created_at", "id"),
+        Index("ix_transactions_type_status", "type", "status"),
+        # Очередь заявок на вывод: маленький частичный индекс только по pending
+        Index(
+            "ix_transactions_pending",
+            "created_at",
+            "id",
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
@@ -0,0 +1,58 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple, List, Any
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Keyset-пагинация по (ts, id) по убыванию.
+# Курсор — непрозрачная строка с (ts, id) последней строки страницы;
+# следующая страница выбирается условием (ts, id) < курсор, поэтому
+# стоимость запроса не зависит от глубины истории (в отличие от OFFSET).
+# Под каждый такой запрос должен быть составной индекс (…, ts, id).
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Поднимает ValueError на битом курсоре.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts_raw, id_raw = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(ts_raw), int(id_raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+async def keyset_page(
+    db: AsyncSession,
+    stmt: Select,
+    ts_col,
+    id_col,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Возвращает (строки страницы, курсор следующей страницы или None).
+    Берём limit + 1 строку, чтобы узнать, есть ли продолжение, без COUNT.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if cursor:
+        ts, row_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(ts_col, id_col) < tuple_(ts, row_id))
+    stmt = stmt.order_by(ts_col.desc(), id_col.desc()).limit(limit + 1)
+
+    rows = (await db.scalars(stmt)).unique().all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, ts_col.key), getattr(last, id_col.key))
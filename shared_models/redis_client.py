@@ -0,0 +1,39 @@
+import hashlib
+from typing import Optional
+from redis import asyncio as aioredis
+from redis.exceptions import NoScriptError
+
+# Общий Redis-клиент процесса. Процесс (backend, бот) регистрирует его при старте,
+# shared_models использует для кэшей и инвалидаций. Если клиент не задан —
+# всё, что завязано на Redis, работает в деградированном локальном режиме.
+_redis: Optional[aioredis.Redis] = None
+
+
+def set_redis(client: Optional[aioredis.Redis]) -> None:
+    global _redis
+    _redis = client
+
+
+def get_redis() -> Optional[aioredis.Redis]:
+    return _redis
+
+
+class LuaScript:
+    """
+    Lua-скрипт, вызываемый через EVALSHA. После перезапуска Redis / SCRIPT FLUSH
+    загружается заново и вызов повторяется.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode()).hexdigest()
+
+    async def load(self, redis: aioredis.Redis) -> None:
+        await redis.script_load(self.source)
+
+    async def __call__(self, redis: aioredis.Redis, keys: list, args: list):
+        try:
+            return await redis.evalsha(self.sha, len(keys), *keys, *args)
+        except NoScriptError:
+            await self.load(redis)
+            return await redis.evalsha(self.sha, len(keys), *keys, *args)
@@ -1,6 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime
+from typing import List
 from shared_models.schemas.gift import GiftRead
+from shared_models.schemas.pagination import Page
 
 
 class InventoryBase(BaseModel):
@@ -19,5 +21,32 @@ class InventoryRead(BaseModel):
     gift: GiftRead
     received_at: datetime
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+# -----------------------
+# Компактные ответы: метаданные подарков один раз в боковой таблице gifts
+# -----------------------
+class InventoryStack(BaseModel):
+    gift_id: int
+    count: int
+    oldest_received_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class InventoryStacksResponse(BaseModel):
+    stacks: List[InventoryStack]
+    gifts: List[GiftRead]
+
+
+class InventoryItem(BaseModel):
+    id: int
+    gift_id: int
+    received_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class InventoryItemsPage(Page[InventoryItem]):
+    gifts: List[GiftRead]
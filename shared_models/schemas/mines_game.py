@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime
 from typing import Optional
 
@@ -10,6 +10,8 @@ class MinesGameBase(BaseModel):
 
 class MinesGameCreate(MinesGameBase):
     user_id: int
+    started_at: Optional[datetime] = None   # None — server default now()
+    finished_at: Optional[datetime] = None
 
 class MinesGameUpdate(BaseModel):
     won_amount: Optional[float] = None
@@ -22,5 +24,4 @@ class MinesGameRead(MinesGameBase):
     started_at: datetime
     finished_at: Optional[datetime] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 from datetime import datetime
 
@@ -10,6 +10,8 @@ class TransactionBase(BaseModel):
 
 class TransactionCreate(TransactionBase):
     user_id: int
+    inventory_id: Optional[int] = None
+    item_received_at: Optional[datetime] = None
 
 class TransactionUpdate(BaseModel):
     status: Optional[str] = None
@@ -21,5 +23,4 @@ class TransactionRead(TransactionBase):
     created_at: datetime
     completed_at: Optional[datetime]
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 from shared_models.schemas.inventory import InventoryRead  # <-- импортируем вложенную схему
 
@@ -35,5 +35,27 @@ class UserResponse(UserBase):
     ref_by: Optional[str] = None
     inventory: Optional[List[InventoryRead]] = [] 
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Шапка приложения: балансы и размер инвентаря (из кэша, без полного профиля)
+class UserSummary(BaseModel):
+    id: int
+    username: str
+    ton_balance: float
+    coins_balance: float
+    inventory_count: int
+
+
+# Слим-запись лидерборда
+class LadderEntry(BaseModel):
+    id: int
+    username: str
+    avatar_url: Optional[str] = None
+    coins_balance: float
+
+
+class LadderRank(BaseModel):
+    id: int
+    rank: int
+    coins_balance: float
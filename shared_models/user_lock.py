@@ -0,0 +1,155 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from shared_models.redis_client import get_redis, LuaScript
+
+# Последовательное выполнение денежных операций одного пользователя.
+#
+# Два уровня:
+#   1. asyncio.Lock на пользователя в процессе — конкурирующие запросы
+#      в одном воркере ждут в очереди, не трогая ни Redis, ни БД;
+#   2. Redis-lock lock:user:{id} между воркерами, значение — токен владельца
+#      (счётчик lock:user:{id}:fence). Освобождение — только своего токена,
+#      так что просроченный держатель не снимет чужую блокировку.
+#
+# Блокировка best-effort с TTL: токен при записи в БД не проверяется, и воркер,
+# чья блокировка истекла (долгий запрос, пауза), может писать одновременно
+# с новым держателем. Корректность держится не на ней: списания — условные
+# UPDATE (change_user_balance, remove_inventory_items), поэтому одновременная
+# запись не уводит баланс в минус и не продаёт предмет дважды. Блокировка лишь
+# выстраивает операции пользователя в очередь и снимает гонки за row lock.
+#
+# Берётся до первого запроса в БД и отпускается после COMMIT:
+# ожидание не держит соединение из пула и не упирается в row lock на users.
+USER_LOCK_KEY = "lock:user:{user_id}"
+USER_FENCE_KEY = "lock:user:{user_id}:fence"
+FENCE_TTL = 7 * 24 * 3600
+
+# KEYS[1] — ключ блокировки, KEYS[2] — счётчик токенов; ARGV[1] — TTL блокировки (мс),
+# ARGV[2] — TTL счётчика (сек). Ответ: {1, token} или {0, pttl занятой блокировки}.
+# Отсутствующий счётчик стартует с текущего времени в мкс — токены не повторяются
+# и после его истечения.
+ACQUIRE_SCRIPT = LuaScript("""
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return {0, redis.call('PTTL', KEYS[1])}
+end
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    local t = redis.call('TIME')
+    redis.call('SET', KEYS[2], t[1] * 1000000 + t[2])
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('SET', KEYS[1], token, 'PX', ARGV[1])
+return {1, token}
+""")
+
+# KEYS[1] — ключ блокировки; ARGV[1] — токен держателя
+RELEASE_SCRIPT = LuaScript("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+
+class UserBusyError(Exception):
+    """
+    Блокировку пользователя не удалось получить за отведённое время.
+    """
+
+
+class _LocalSlot:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class UserLocks:
+    """
+    async with user_locks.hold(user_id) as token:
+        ...  # списание, запись, COMMIT
+
+    ttl — страховка на случай падения воркера посреди операции (сек),
+    wait — сколько максимум ждать очереди, дальше UserBusyError.
+    Без Redis работает только локальная очередь процесса.
+    """
+
+    def __init__(self, ttl: float = 10.0, wait: float = 3.0):
+        self.ttl = ttl
+        self.wait = wait
+        self._local: Dict[int, _LocalSlot] = {}
+
+    async def _acquire_shared(self, user_id: int, deadline: float) -> Optional[int]:
+        redis = get_redis()
+        if redis is None:
+            return None
+        keys = [USER_LOCK_KEY.format(user_id=user_id), USER_FENCE_KEY.format(user_id=user_id)]
+        args = [int(self.ttl * 1000), FENCE_TTL]
+        delay = 0.005
+        while True:
+            try:
+                acquired, value = await ACQUIRE_SCRIPT(redis, keys, args)
+            except Exception as e:
+                print(f"⚠️ Redis-блокировка пользователя {user_id} недоступна, только локальная: {e}")
+                return None
+            if int(acquired):
+                return int(value)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise UserBusyError(f"User {user_id} is busy")
+            # Экспоненциальная пауза с джиттером, но не дольше остатка TTL и ожидания
+            pttl = int(value) / 1000 if int(value) > 0 else delay
+            await asyncio.sleep(min(random.uniform(delay / 2, delay), pttl, remaining))
+            delay = min(delay * 2, 0.1)
+
+    async def _release_shared(self, user_id: int, token: int) -> None:
+        redis = get_redis()
+        if redis is None:
+            return
+        try:
+            await RELEASE_SCRIPT(redis, [USER_LOCK_KEY.format(user_id=user_id)], [token])
+        except Exception as e:
+            # Ключ сам истечёт через ttl
+            print(f"⚠️ Не удалось снять блокировку пользователя {user_id}: {e}")
+
+    @asynccontextmanager
+    async def hold(self, user_id: int, wait: Optional[float] = None) -> AsyncIterator[Optional[int]]:
+        """
+        Возвращает токен владельца Redis-блокировки (None — Redis недоступен,
+        действует только локальная очередь). Нужен только для освобождения:
+        это не fencing token, записи в БД его не проверяют.
+        """
+        deadline = time.monotonic() + (self.wait if wait is None else wait)
+        slot = self._local.get(user_id)
+        if slot is None:
+            slot = self._local[user_id] = _LocalSlot()
+        slot.users += 1
+        try:
+            if slot.lock.locked():
+                try:
+                    await asyncio.wait_for(slot.lock.acquire(), timeout=max(deadline - time.monotonic(), 0))
+                except asyncio.TimeoutError:
+                    raise UserBusyError(f"User {user_id} is busy") from None
+            else:
+                await slot.lock.acquire()
+            try:
+                token = await self._acquire_shared(user_id, deadline)
+                try:
+                    yield token
+                finally:
+                    if token is not None:
+                        await self._release_shared(user_id, token)
+            finally:
+                slot.lock.release()
+        finally:
+            slot.users -= 1
+            if slot.users == 0:
+                del self._local[user_id]
+
+
+user_locks = UserLocks()
@@ -0,0 +1,120 @@
+import time
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from shared_models.db import on_commit, mark_user_write
+from shared_models.redis_client import get_redis
+
+# Счётчики версий для условных ответов (ETag / 304).
+# Версия пользователя растёт после commit каждого изменения его баланса
+# или инвентаря, версия каталога — после изменения таблицы gifts
+# (от неё зависят вложенные подарки в профиле).
+USER_VERSION_KEY = "version:user:{user_id}"
+CATALOG_VERSION_KEY = "version:catalog"
+# Ключ может истечь или пропасть вместе с Redis: новая версия начинается
+# с текущего времени в наносекундах, поэтому не совпадёт ни с одной выданной раньше.
+VERSION_TTL = 7 * 24 * 3600
+# Версия пользователя живёт недолго (TTL ставится при создании, INCR его не
+# продлевает). Если увеличение после commit не дошло до Redis и DEL тоже не
+# удался, клиент получает 304 со старыми данными не дольше этого срока.
+# Цена — один полный ответ на пользователя раз в USER_VERSION_TTL.
+USER_VERSION_TTL = 300
+
+
+def user_version_key(user_id: int) -> str:
+    return USER_VERSION_KEY.format(user_id=user_id)
+
+
+def version_ttl(key: str) -> int:
+    return USER_VERSION_TTL if key.startswith("version:user:") else VERSION_TTL
+
+
+# ---------------------------
+# Увеличение версий
+# ---------------------------
+async def _bump(key: str) -> None:
+    redis = get_redis()
+    if redis is None:
+        return
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, time.time_ns(), nx=True, ex=version_ttl(key))
+            pipe.incr(key)
+            await pipe.execute()
+        return
+    except Exception as e:
+        print(f"⚠️ Не удалось увеличить версию {key}: {e}")
+    # Старая версия не должна пережить изменение: без ключа следующее чтение
+    # создаст новую. Не удался и DEL — остаётся TTL ключа
+    try:
+        await redis.delete(key)
+    except Exception as e:
+        print(f"⚠️ Не удалось сбросить версию {key}, устареет через TTL: {e}")
+
+
+async def bump_user(user_id: int) -> None:
+    await _bump(user_version_key(user_id))
+
+
+async def bump_catalog() -> None:
+    await _bump(CATALOG_VERSION_KEY)
+
+
+def track_user_change(db: AsyncSession, user_id: int) -> None:
+    """
+    Помечает, что данные профиля пользователя изменились: версия вырастет
+    после commit, чтения пользователя на время уйдут в primary.
+    При rollback ничего не произойдёт.
+    """
+    on_commit(db, lambda: bump_user(user_id))
+    mark_user_write(db, user_id)
+
+
+# ---------------------------
+# Чтение
+# ---------------------------
+async def init_missing(redis, keys: List[str], values: List[Optional[str]]) -> List[str]:
+    """
+    Дочитывает версии после MGET по keys: отсутствующие инициализируются (SET NX).
+    """
+    if None not in values:
+        return values
+    async with redis.pipeline(transaction=False) as pipe:
+        for key, value in zip(keys, values):
+            if value is None:
+                pipe.set(key, time.time_ns(), nx=True, ex=version_ttl(key))
+        pipe.mget(keys)
+        return (await pipe.execute())[-1]
+
+
+async def profile_etag(user_id: int) -> Optional[str]:
+    """
+    Weak ETag профиля из версий пользователя и каталога — один MGET.
+    Отсутствующие версии инициализируются (SET NX). None — Redis недоступен,
+    условные ответы не используются.
+
+    Читать ETag нужно ДО запроса в БД: если изменение попадёт между ними,
+    ответ окажется новее своей версии, и клиент просто получит его ещё раз.
+    """
+    redis = get_redis()
+    if redis is None:
+        return None
+
+    keys = [user_version_key(user_id), CATALOG_VERSION_KEY]
+    try:
+        versions = await init_missing(redis, keys, await redis.mget(keys))
+    except Exception as e:
+        print(f"⚠️ Не удалось прочитать версию профиля: {e}")
+        return None
+    return f'W/"{versions[0]}.{versions[1]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Сравнение If-None-Match по правилам weak comparison (RFC 9110).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
@@ -0,0 +1,66 @@
+import os
+import sys
+
+# Те же корни импорта, что у backend: пакеты из корня репозитория и config/services из backend
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT_DIR, os.path.join(ROOT_DIR, "backend")]
+os.environ.setdefault("SECRET_KEY", "test-secret-key-" + "x" * 32)
+
+import fakeredis
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from shared_models.base import Base
+from shared_models.models import User, Gift, Inventory, Transaction
+from shared_models.redis_client import set_redis
+from shared_models.schemas.user import UserCreate
+from shared_models.crud.user import create_user
+
+# lottery_tickets использует ARRAY (только Postgres) — в sqlite не создаём
+TABLES = [User.__table__, Gift.__table__, Inventory.__table__, Transaction.__table__]
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def redis():
+    client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    set_redis(client)
+    yield client
+    set_redis(None)
+    await client.aclose()
+
+
+@pytest.fixture
+async def db(redis):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    # Как в Postgres: внешние ключи проверяются (в sqlite по умолчанию выключены)
+    event.listen(engine.sync_engine, "connect", lambda conn, _: conn.execute("PRAGMA foreign_keys=ON"))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+@pytest.fixture
+def make_user(db):
+    counter = iter(range(1, 1_000_000))
+
+    async def factory(coins_balance: float = 0.0, ton_balance: float = 0.0) -> User:
+        n = next(counter)
+        return await create_user(db, UserCreate(
+            username=f"user{n}",
+            tg_id=n,
+            chat_id=n,
+            avatar_url=f"https://t.me/i/{n}.jpg",
+            ref_code=f"ref{n}",
+            coins_balance=coins_balance,
+            ton_balance=ton_balance,
+        ))
+
+    return factory
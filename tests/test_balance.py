@@ -0,0 +1,47 @@
+import pytest
+
+from shared_models.crud.user import change_user_balance, get_user_balance
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_debit_within_balance(db, make_user):
+    user = await make_user(coins_balance=100.0)
+
+    row = await change_user_balance(db, user.id, coins_delta=-40.0)
+
+    assert row.coins_balance == 60.0
+    assert (await get_user_balance(db, user.id)).coins_balance == 60.0
+
+
+async def test_overdraft_is_refused(db, make_user):
+    user = await make_user(coins_balance=10.0, ton_balance=1.0)
+
+    assert await change_user_balance(db, user.id, coins_delta=-10.01) is None
+    assert await change_user_balance(db, user.id, ton_delta=-2.0) is None
+
+    row = await get_user_balance(db, user.id)
+    assert (row.coins_balance, row.ton_balance) == (10.0, 1.0)
+
+
+async def test_exchange_refused_when_one_side_is_short(db, make_user):
+    # Дебет и кредит в одном UPDATE: нехватка на списании не даёт и начисления
+    user = await make_user(coins_balance=5.0, ton_balance=0.0)
+
+    assert await change_user_balance(db, user.id, ton_delta=1.0, coins_delta=-50.0) is None
+
+    row = await get_user_balance(db, user.id)
+    assert (row.coins_balance, row.ton_balance) == (5.0, 0.0)
+
+
+async def test_unknown_user(db):
+    assert await change_user_balance(db, 404, coins_delta=1.0) is None
+
+
+async def test_balance_version_grows(db, make_user):
+    user = await make_user(coins_balance=10.0)
+
+    first = await change_user_balance(db, user.id, coins_delta=1.0)
+    second = await change_user_balance(db, user.id, coins_delta=-1.0)
+
+    assert second.balance_version == first.balance_version + 1
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from shared_models import cache, versions
+
+pytestmark = pytest.mark.anyio
+
+ENTITY = cache.CacheEntity("test", ttl=60)
+VERSION_KEYS = [versions.user_version_key(1)]
+
+
+class Loader:
+    """Счётчик вызовов загрузчика с задержкой."""
+
+    def __init__(self, value="fresh", delay=0.0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.value
+
+
+def _read(loader):
+    return cache.read_through(ENTITY, 1, loader, VERSION_KEYS)
+
+
+async def test_second_read_is_a_hit(redis):
+    loader = Loader()
+
+    assert await _read(loader) == "fresh"
+    assert await _read(loader) == "fresh"
+    assert loader.calls == 1
+
+
+async def test_concurrent_misses_share_one_load(redis):
+    loader = Loader(delay=0.05)
+    coalesced = cache.cache_stats.coalesced
+
+    results = await asyncio.gather(*(_read(loader) for _ in range(10)))
+
+    assert results == ["fresh"] * 10
+    assert loader.calls == 1
+    assert cache.cache_stats.coalesced - coalesced == 9
+    assert cache.get_cache_stats()["inflight"] == 0
+
+
+async def test_version_change_is_a_miss(redis):
+    loader = Loader()
+    await _read(loader)
+
+    await versions.bump_user(1)
+    loader.value = "changed"
+
+    assert await _read(loader) == "changed"
+    assert loader.calls == 2
+
+
+async def test_waiter_loads_itself_when_leader_is_cancelled(redis):
+    loader = Loader(delay=0.05)
+
+    leader = asyncio.create_task(_read(loader))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(_read(loader))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await waiter == "fresh"
+    assert loader.calls == 2
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+
+async def test_leader_error_reaches_waiters(redis):
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise LookupError("db down")
+
+    results = await asyncio.gather(_read(failing), _read(failing), return_exceptions=True)
+
+    assert all(isinstance(r, LookupError) for r in results)
+    assert cache.get_cache_stats()["inflight"] == 0
+
+
+async def test_none_is_not_cached(redis):
+    loader = Loader(value=None)
+
+    assert await _read(loader) is None
+    assert await _read(loader) is None
+    assert loader.calls == 2
+
+
+async def test_redis_down_reads_through(redis):
+    loader = Loader()
+    errors = cache.cache_stats.errors
+    redis.connection_pool.connection_kwargs["server"].connected = False
+
+    assert await _read(loader) == "fresh"
+    assert cache.cache_stats.errors - errors == 1
@@ -0,0 +1,57 @@
+import random
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from shared_models.catalog import CatalogSnapshot, TON_TO_HRPN, gift_value_hrpn
+
+
+def _gift(gift_id: int, cost_coins=None, cost_ton=None):
+    return SimpleNamespace(
+        id=gift_id,
+        name=f"gift{gift_id}",
+        telegram_gift_id=str(gift_id),
+        cost_coins=cost_coins,
+        cost_ton=cost_ton,
+        image_url="",
+        created_at=datetime(2026, 1, 1),
+    )
+
+
+def _linear_best(gifts, value):
+    # Прежний выбор приза: самый дорогой из подходящих, иначе самый дешёвый
+    suitable = [g for g in gifts if gift_value_hrpn(g) <= value]
+    if suitable:
+        return max(gift_value_hrpn(g) for g in suitable)
+    return min(gift_value_hrpn(g) for g in gifts)
+
+
+def test_empty_catalog():
+    assert CatalogSnapshot.build([]).best_at_most(100.0) is None
+
+
+def test_boundaries():
+    catalog = CatalogSnapshot.build([_gift(1, 50), _gift(2, 100), _gift(3, cost_ton=0.2)])
+
+    assert catalog.best_at_most(100.0).id == 2   # ровно стоимость подарка
+    assert catalog.best_at_most(99.99).id == 1
+    assert catalog.best_at_most(10**9).id == 3   # 0.2 TON = 200 HRPN
+    assert catalog.best_at_most(10.0).id == 1    # дешевле всех — самый дешёвый
+
+
+def test_ton_price_converted():
+    catalog = CatalogSnapshot.build([_gift(1, cost_ton=1.5)])
+    assert catalog.by_id[1].value_hrpn == 1.5 * TON_TO_HRPN
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_linear_scan(seed):
+    rng = random.Random(seed)
+    gifts = [_gift(i, cost_coins=rng.choice([None, rng.randint(1, 500)]), cost_ton=rng.choice([None, 0.1, 0.25]))
+             for i in range(40)]
+    catalog = CatalogSnapshot.build(gifts)
+
+    for _ in range(200):
+        value = rng.uniform(-10, 600)
+        assert catalog.best_at_most(value).value_hrpn == _linear_best(gifts, value)
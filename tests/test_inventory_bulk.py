@@ -0,0 +1,105 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from backend.api.v1 import inventory as routes
+from shared_models.catalog import gift_catalog
+from shared_models.crud.gift import create_gift
+from shared_models.crud.inventory import add_gifts_to_user, get_inventory_by_user_id
+from shared_models.crud.transactions import restore_withdrawal
+from shared_models.crud.user import get_user_balance
+from shared_models.models import Transaction
+from shared_models.schemas.gift import GiftCreate
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def owner(db, make_user):
+    """
+    Пользователь с тремя предметами: два подарка по 50 HRPN и один за 200.
+    """
+    gift_catalog.invalidate_local()
+    user_id = (await make_user()).id
+    cheap = await create_gift(db, GiftCreate(name="cheap", telegram_gift_id="1", cost_coins=50, image_url=""))
+    rare = await create_gift(db, GiftCreate(name="rare", telegram_gift_id="2", cost_coins=200, image_url=""))
+    await add_gifts_to_user(db, user_id, [cheap.id, cheap.id, rare.id])
+    items = sorted((await get_inventory_by_user_id(db, user_id)), key=lambda i: i.id)
+    yield user_id, [i.id for i in items], cheap.id
+    gift_catalog.invalidate_local()
+
+
+async def _items(db, user_id):
+    db.expunge_all()
+    return {(i.id, i.received_at) for i in await get_inventory_by_user_id(db, user_id)}
+
+
+async def test_sell_many(db, owner):
+    user_id, item_ids, _ = owner
+
+    result = await routes.sell_many(routes.ItemsRequest(ids=item_ids[:2] + [999]), user_id=user_id, db=db)
+
+    assert (result.sold, result.gain) == (2, 100.0)
+    assert (await get_user_balance(db, user_id)).coins_balance == 100.0
+    assert len(await _items(db, user_id)) == 1
+
+
+async def test_sell_someone_elses_items(db, owner, make_user):
+    _, item_ids, _ = owner
+    stranger = (await make_user()).id
+
+    with pytest.raises(HTTPException) as exc:
+        await routes.sell_many(routes.ItemsRequest(ids=item_ids), user_id=stranger, db=db)
+    assert exc.value.status_code == 404
+
+
+async def test_sell_all_of_gift(db, owner):
+    user_id, _, cheap_id = owner
+
+    result = await routes.sell_all(gift_id=cheap_id, user_id=user_id, db=db)
+
+    assert result.sold == 2
+    assert len(await _items(db, user_id)) == 1
+
+
+async def test_withdraw_many_creates_pending_requests(db, owner):
+    user_id, item_ids, _ = owner
+
+    result = await routes.withdraw_many(routes.ItemsRequest(ids=item_ids[:2]), user_id=user_id, db=db)
+
+    assert result.requested == 2
+    txs = (await db.scalars(select(Transaction).where(Transaction.type == "gift_withdrawal"))).all()
+    assert {tx.inventory_id for tx in txs} == set(item_ids[:2])
+    assert all(tx.status == "pending" for tx in txs)
+    assert len(await _items(db, user_id)) == 1
+
+    # Уже выведенный предмет нельзя ни продать, ни вывести снова
+    with pytest.raises(HTTPException):
+        await routes.sell_many(routes.ItemsRequest(ids=item_ids[:1]), user_id=user_id, db=db)
+
+
+async def test_rejected_withdrawal_restores_item(db, owner):
+    user_id, item_ids, _ = owner
+    before = await _items(db, user_id)
+
+    await routes.withdraw_item(id=item_ids[0], user_id=user_id, db=db)
+    tx_id = await db.scalar(select(Transaction.id).where(Transaction.type == "gift_withdrawal"))
+
+    tx = await restore_withdrawal(db, tx_id)
+
+    assert tx.status == "rejected" and tx.completed_at is not None
+    # Тот же id и то же время получения
+    assert await _items(db, user_id) == before
+
+    # Повторный отказ ничего не возвращает второй раз
+    assert await restore_withdrawal(db, tx_id) is None
+    assert await _items(db, user_id) == before
+
+
+async def test_restore_only_pending_withdrawals(db, owner):
+    user_id, item_ids, _ = owner
+    await routes.sell_item(id=item_ids[0], user_id=user_id, db=db)
+    sale_id = await db.scalar(select(Transaction.id).where(Transaction.type == "gift_sale"))
+
+    assert await restore_withdrawal(db, sale_id) is None
+    assert len(await _items(db, user_id)) == 2
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from shared_models import leaderboard
+from shared_models.crud.user import change_user_balance
+from shared_models.redis_client import set_redis
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def players(db, make_user):
+    """
+    Три пользователя с балансами 300 > 200 > 100.
+    """
+    users = [await make_user(coins_balance=balance) for balance in (100.0, 300.0, 200.0)]
+    return [u.id for u in users]
+
+
+async def test_rank_from_redis(db, redis, players):
+    low, top, mid = players
+
+    assert await leaderboard.get_user_rank(db, top) == {"id": top, "rank": 1, "coins_balance": 300.0}
+    assert (await leaderboard.get_user_rank(db, low))["rank"] == 3
+
+
+async def test_rank_without_redis(db, redis, players):
+    low, top, mid = players
+    set_redis(None)
+
+    assert await leaderboard.get_user_rank(db, mid) == {"id": mid, "rank": 2, "coins_balance": 200.0}
+    assert await leaderboard.get_user_rank(db, 404) is None
+
+
+async def test_rank_when_redis_fails(db, redis, players):
+    low, top, mid = players
+    redis.connection_pool.connection_kwargs["server"].connected = False
+
+    assert (await leaderboard.get_user_rank(db, low))["rank"] == 3
+    top_list = json.loads(await leaderboard.get_top_snapshot(db, limit=2))
+    assert [entry["id"] for entry in top_list] == [top, mid]
+
+
+async def test_rank_follows_balance_change(db, redis, players):
+    low, top, mid = players
+
+    await change_user_balance(db, low, coins_delta=1000.0)
+
+    assert (await leaderboard.get_user_rank(db, low))["rank"] == 1
+
+
+async def test_late_update_does_not_overwrite_newer_score(redis):
+    await leaderboard.record_balance(7, 500.0, 3)
+    await leaderboard.record_balance(7, 400.0, 2)  # колбэк более раннего commit пришёл позже
+
+    assert await redis.zscore(leaderboard.LEADERBOARD_KEY, "7") == 500.0
+
+    await leaderboard.record_balance(7, 450.0, 4)
+    assert await redis.zscore(leaderboard.LEADERBOARD_KEY, "7") == 450.0
+
+
+async def test_top_snapshot_meta_expires(db, redis, players):
+    low, top, mid = players
+
+    top_list = json.loads(await leaderboard.get_top_snapshot(db, limit=3))
+
+    assert [entry["id"] for entry in top_list] == [top, mid, low]
+    ttl = await redis.ttl(leaderboard.LEADERBOARD_META_KEY.format(user_id=top))
+    assert 0 < ttl <= leaderboard.META_TTL
@@ -0,0 +1,103 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+
+from backend.services import mines_history as mh
+
+pytestmark = pytest.mark.anyio
+
+
+class Written(list):
+    """Записанные игры + управление подменой: fail, delay."""
+    fail = False
+    delay = 0.0
+
+
+@pytest.fixture
+def written(monkeypatch):
+    """
+    Подменяет запись в БД: create_games «пишет» в список.
+    """
+    rows = Written()
+
+    @asynccontextmanager
+    async def session():
+        yield None
+
+    async def create_games(db, batch):
+        await asyncio.sleep(rows.delay)
+        if rows.fail:
+            raise ConnectionError("db down")
+        rows.extend(batch)
+        return len(batch)
+
+    monkeypatch.setattr(mh, "get_context_manager", session)
+    monkeypatch.setattr(mh, "create_games", create_games)
+    return rows
+
+
+def _game(i: int) -> dict:
+    return {"bet": float(i), "mines": 3, "currency": "hrpn", "mines_mask": 0b111, "opened_mask": 1 << 10, "started_at": 0}
+
+
+async def test_record_finished_decodes_board(written):
+    writer = mh.MinesHistoryWriter()
+    writer.record_finished(1, _game(5), won_amount=7.5)
+
+    await writer.flush()
+
+    (game,) = written
+    assert game.won_amount == 7.5 and game.bet == 5.0
+    assert json.loads(game.result_data) == {"currency": "hrpn", "mines": [0, 1, 2], "opened": [10]}
+
+
+async def test_stop_flushes_everything(written):
+    writer = mh.MinesHistoryWriter(batch_size=2, flush_interval=0.05)
+    written.delay = 0.05
+    writer.start()
+    for i in range(5):
+        writer.record_finished(1, _game(i), won_amount=0.0)
+    await asyncio.sleep(0.02)  # фоновая задача внутри flush()
+
+    await writer.stop()
+
+    assert sorted(g.bet for g in written) == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert writer.stats() == {"pending": 0, "dropped": 0}
+
+
+async def test_cancelled_flush_keeps_batch(written):
+    writer = mh.MinesHistoryWriter(batch_size=2)
+    written.delay = 0.5
+    for i in range(3):
+        writer.record_finished(1, _game(i), won_amount=0.0)
+
+    task = asyncio.create_task(writer.flush())
+    await asyncio.sleep(0.02)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert writer.stats()["pending"] == 3
+
+
+async def test_failed_flush_requeues(written):
+    writer = mh.MinesHistoryWriter(batch_size=2)
+    written.fail = True
+    for i in range(3):
+        writer.record_finished(1, _game(i), won_amount=0.0)
+
+    assert await writer.flush() == 0
+    assert writer.stats()["pending"] == 3
+
+    written.fail = False
+    assert await writer.flush() == 3
+    assert [g.bet for g in written] == [0.0, 1.0, 2.0]
+
+
+def test_overflow_drops_oldest():
+    writer = mh.MinesHistoryWriter(max_pending=2)
+    for i in range(3):
+        writer.record_finished(1, _game(i), won_amount=0.0)
+
+    assert writer.stats() == {"pending": 2, "dropped": 1}
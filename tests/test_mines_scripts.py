@@ -0,0 +1,326 @@
+import pytest
+
+from backend.services import mines_service as ms
+from shared_models.crud.user import get_user_balance
+from shared_models.redis_client import LuaScript
+
+pytestmark = pytest.mark.anyio
+
+# В Lua fakeredis нет библиотеки bit (в Redis она есть, LuaJIT-совместимая).
+# Для скриптов достаточно band/bor/lshift над неотрицательными 25-битными числами.
+BIT_SHIM = """
+local bit = {}
+function bit.band(a, b)
+    local r, p = 0, 1
+    while a > 0 and b > 0 do
+        if a % 2 == 1 and b % 2 == 1 then r = r + p end
+        a, b, p = math.floor(a / 2), math.floor(b / 2), p * 2
+    end
+    return r
+end
+function bit.bor(a, b)
+    local r, p = 0, 1
+    while a > 0 or b > 0 do
+        if a % 2 == 1 or b % 2 == 1 then r = r + p end
+        a, b, p = math.floor(a / 2), math.floor(b / 2), p * 2
+    end
+    return r
+end
+function bit.lshift(a, n)
+    return a * 2 ^ n
+end
+"""
+
+USER_ID = 1
+BET = 10.0
+# Мины в клетках 0, 1, 2
+MINES_MASK = 0b111
+
+
+@pytest.fixture(autouse=True)
+def bit_shim(monkeypatch):
+    for name in ("OPEN_CELLS_SCRIPT", "CASHOUT_SCRIPT", "SETTLE_SCRIPT"):
+        monkeypatch.setattr(ms, name, LuaScript(BIT_SHIM + getattr(ms, name).source))
+
+
+@pytest.fixture(autouse=True)
+def finished_games(monkeypatch):
+    games = []
+    monkeypatch.setattr(ms.mines_history, "record_finished", lambda user_id, state, won_amount: games.append((state["status"], won_amount)))
+    return games
+
+
+@pytest.fixture
+async def game(db, redis, make_user):
+    """
+    Игра на 3 мины со ставкой BET и известной раскладкой MINES_MASK.
+    """
+    user = await make_user(coins_balance=100.0)
+    service = ms.MinesService(redis)
+    await service.create_game(db, user.id, BET, 3, "hrpn")
+    await redis.hset(service._redis_key(user.id), "mines_mask", MINES_MASK)
+    return service, user.id
+
+
+async def test_load_scripts_preloads_all(redis):
+    await ms.MinesService.load_scripts(redis)
+
+    assert await redis.script_exists(*(script.sha for script in ms.SCRIPTS)) == [True] * len(ms.SCRIPTS)
+
+
+async def test_open_after_script_flush(db, redis, game):
+    service, user_id = game
+    await redis.script_flush()
+
+    assert (await service.process_open_cell(db, user_id, 10))["isEnd"] is False
+
+
+async def test_create_game_debits_bet(db, game):
+    _, user_id = game
+    assert (await get_user_balance(db, user_id)).coins_balance == 100.0 - BET
+
+
+async def test_create_game_refuses_overdraft(db, redis, make_user):
+    user = await make_user(coins_balance=5.0)
+    service = ms.MinesService(redis)
+
+    with pytest.raises(ValueError):
+        await service.create_game(db, user.id, BET, 3, "hrpn")
+    assert not await redis.exists(service._redis_key(user.id))
+
+
+async def test_open_safe_cell(db, redis, game):
+    service, user_id = game
+
+    result = await service.process_open_cell(db, user_id, 10)
+
+    assert result["isEnd"] is False
+    assert result["coeff"] == ms.payout_coeff(3, 1)
+    assert int(await redis.hget(service._redis_key(user_id), "opened_mask")) == 1 << 10
+
+
+async def test_open_same_cell_twice(db, game):
+    service, user_id = game
+    await service.process_open_cell(db, user_id, 10)
+
+    with pytest.raises(ValueError):
+        await service.process_open_cell(db, user_id, 10)
+
+
+async def test_mine_ends_game(db, redis, game, finished_games):
+    service, user_id = game
+    await service.process_open_cell(db, user_id, 10)
+
+    result = await service.process_open_cell(db, user_id, 1)
+
+    assert result["isMine"] is True and result["isEnd"] is True
+    assert result["mines"] == [0, 1, 2]
+    assert result["openedCells"] == [10]
+    assert not await redis.exists(service._redis_key(user_id))
+    assert finished_games == [("mine", 0.0)]
+    assert (await get_user_balance(db, user_id)).coins_balance == 100.0 - BET
+
+
+async def test_cashout_pays_bet_times_coeff(db, redis, game, finished_games):
+    service, user_id = game
+    for cell in (10, 11):
+        await service.process_open_cell(db, user_id, cell)
+
+    result = await service.process_cashout(db, user_id)
+
+    win = round(BET * ms.payout_coeff(3, 2), 2)
+    assert result["totalWin"] == win
+    assert (await get_user_balance(db, user_id)).coins_balance == pytest.approx(100.0 - BET + win)
+    assert not await redis.exists(service._redis_key(user_id))
+    assert finished_games == [("cashout", win)]
+
+    # Игра уже удалена — повторный вывод не начисляет второй раз
+    with pytest.raises(ValueError):
+        await service.process_cashout(db, user_id)
+
+
+async def test_opening_last_safe_cell_finishes(db, redis, game, finished_games):
+    service, user_id = game
+    safe = [cell for cell in range(ms.N) if not MINES_MASK >> cell & 1]
+
+    for cell in safe[:-1]:
+        assert (await service.process_open_cell(db, user_id, cell))["isEnd"] is False
+
+    result = await service.process_open_cell(db, user_id, safe[-1])
+    assert result["isEnd"] is True
+    assert result["totalWin"] == round(BET * ms.payout_coeff(3, len(safe)), 2)
+    assert finished_games == [("finished", result["totalWin"])]
+    assert not await redis.exists(service._redis_key(user_id))
+
+
+# -----------------------------
+# Расчёт выигрыша (settling)
+# -----------------------------
+@pytest.fixture
+def failing_credit(monkeypatch):
+    real = ms.change_user_balance
+
+    async def broken(*args, **kwargs):
+        raise ConnectionError("pool timeout")
+
+    monkeypatch.setattr(ms, "change_user_balance", broken)
+    return lambda: monkeypatch.setattr(ms, "change_user_balance", real)
+
+
+async def test_failed_credit_keeps_game_for_retry(db, redis, game, failing_credit, finished_games):
+    service, user_id = game
+    key = service._redis_key(user_id)
+    await service.process_open_cell(db, user_id, 10)
+
+    with pytest.raises(ConnectionError):
+        await service.process_cashout(db, user_id)
+
+    assert await redis.hget(key, "status") == "settling"
+    assert (await get_user_balance(db, user_id)).coins_balance == 100.0 - BET
+    assert finished_games == []
+
+    failing_credit()
+    result = await service.process_cashout(db, user_id)
+
+    win = round(BET * ms.payout_coeff(3, 1), 2)
+    assert result["totalWin"] == win
+    assert (await get_user_balance(db, user_id)).coins_balance == pytest.approx(100.0 - BET + win)
+    assert not await redis.exists(key)
+    assert finished_games == [("cashout", win)]
+
+
+async def test_open_on_settling_game_finishes_payout(db, redis, game, failing_credit):
+    service, user_id = game
+    await service.process_open_cell(db, user_id, 10)
+    with pytest.raises(ConnectionError):
+        await service.process_cashout(db, user_id)
+    failing_credit()
+
+    result = await service.process_open_cell(db, user_id, 11)
+
+    assert result["isEnd"] is True and result["cellNumber"] == 1
+    assert not await redis.exists(service._redis_key(user_id))
+
+
+async def test_new_game_settles_pending_win_first(db, redis, game, failing_credit):
+    service, user_id = game
+    await service.process_open_cell(db, user_id, 10)
+    with pytest.raises(ConnectionError):
+        await service.process_cashout(db, user_id)
+    failing_credit()
+
+    await service.create_game(db, user_id, BET, 3, "hrpn")
+
+    win = round(BET * ms.payout_coeff(3, 1), 2)
+    assert (await get_user_balance(db, user_id)).coins_balance == pytest.approx(100.0 - 2 * BET + win)
+    key = service._redis_key(user_id)
+    assert await redis.hget(key, "status") is None
+    assert await redis.hget(key, "opened_mask") == "0"
+
+
+async def test_missing_user_is_not_silently_dropped(db, redis, game, monkeypatch):
+    service, user_id = game
+    await service.process_open_cell(db, user_id, 10)
+
+    async def no_user(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(ms, "change_user_balance", no_user)
+    with pytest.raises(RuntimeError):
+        await service.process_cashout(db, user_id)
+    assert await redis.hget(service._redis_key(user_id), "status") == "settling"
+
+
+async def test_second_cashout_waits_for_running_settlement(db, game):
+    service, user_id = game
+    await service.process_open_cell(db, user_id, 10)
+
+    # Первый обработчик взял аренду и ещё начисляет
+    state = await service._claim_settlement(user_id, pending_only=False)
+    assert state["status"] == "cashout"
+
+    with pytest.raises(ValueError):
+        await service.process_cashout(db, user_id)
+
+
+# -----------------------------
+# Поле и маски
+# -----------------------------
+@pytest.mark.parametrize("mines", [1, 3, 24])
+def test_generated_mask_has_exact_mine_count(mines):
+    for _ in range(50):
+        mask = ms.generate_mines_mask(mines)
+        assert mask.bit_count() == mines
+        assert mask < 1 << ms.N
+
+
+def test_mask_to_cells():
+    assert ms.mask_to_cells(0) == []
+    assert ms.mask_to_cells(MINES_MASK | 1 << 24) == [0, 1, 2, 24]
+
+
+async def test_board_revealed_at_end(db, game):
+    service, user_id = game
+    await service.process_open_cell(db, user_id, 24)
+    await service.process_open_cell(db, user_id, 7)
+
+    result = await service.process_cashout(db, user_id)
+
+    assert result["mines"] == [0, 1, 2]
+    assert result["openedCells"] == [7, 24]
+
+
+# -----------------------------
+# Несколько клеток / автоигра
+# -----------------------------
+async def test_open_many_stops_on_mine(db, redis, game, finished_games):
+    service, user_id = game
+
+    result = await service.process_open_cells(db, user_id, cells=[10, 11, 2, 12])
+
+    assert [step["cell"] for step in result["steps"]] == [10, 11, 2]
+    assert [step["isMine"] for step in result["steps"]] == [False, False, True]
+    assert result["isEnd"] is True
+    assert finished_games == [("mine", 0.0)]
+    assert not await redis.exists(service._redis_key(user_id))
+
+
+async def test_open_many_skips_already_opened(db, game):
+    service, user_id = game
+    await service.process_open_cell(db, user_id, 10)
+
+    result = await service.process_open_cells(db, user_id, cells=[10, 11])
+
+    assert [step["cell"] for step in result["steps"]] == [11]
+    assert result["steps"][0]["coeff"] == ms.payout_coeff(3, 2)
+    assert result["isEnd"] is False
+
+
+async def test_open_many_with_cashout(db, redis, game):
+    service, user_id = game
+
+    result = await service.process_open_cells(db, user_id, cells=[10, 11, 12], cashout=True)
+
+    win = round(BET * ms.payout_coeff(3, 3), 2)
+    assert result["isEnd"] is True and result["totalWin"] == win
+    assert (await get_user_balance(db, user_id)).coins_balance == pytest.approx(100.0 - BET + win)
+    assert not await redis.exists(service._redis_key(user_id))
+
+
+async def test_open_random_count(db, redis, game):
+    service, user_id = game
+    # Только одна безопасная клетка закрыта — случайное открытие обязано найти мину или её
+    await redis.hset(service._redis_key(user_id), "mines_mask", (1 << ms.N) - 1 - (1 << 5))
+    await redis.hset(service._redis_key(user_id), "mines", ms.N - 1)
+
+    result = await service.process_open_cells(db, user_id, count=1)
+
+    assert len(result["steps"]) == 1
+    assert result["isEnd"] is True
+
+
+@pytest.mark.parametrize("kwargs", [{}, {"cells": [], "count": None}, {"cells": [1, 1]}, {"cells": [25]}, {"count": 0}])
+async def test_open_many_validation(db, game, kwargs):
+    service, user_id = game
+    with pytest.raises(ValueError):
+        await service.process_open_cells(db, user_id, **kwargs)
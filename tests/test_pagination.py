@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from shared_models.models import Transaction
+from shared_models.pagination import encode_cursor, decode_cursor
+from shared_models.crud.transactions import get_transactions_by_user
+
+pytestmark = pytest.mark.anyio
+
+
+def test_cursor_round_trip():
+    ts = datetime(2026, 10, 18, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(ts, 42)) == (ts, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "MjAyNg"])
+def test_broken_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+async def _seed_transactions(db, user_id: int, count: int):
+    # По три транзакции на одну метку времени: порядок внутри — по id
+    start = datetime(2026, 1, 1)
+    await db.execute(insert(Transaction), [
+        {"user_id": user_id, "type": "deposit", "created_at": start + timedelta(minutes=i // 3)}
+        for i in range(count)
+    ])
+    await db.commit()
+
+
+async def test_pages_cover_history_once(db, make_user):
+    user = await make_user()
+    other = await make_user()
+    await _seed_transactions(db, user.id, 10)
+    await _seed_transactions(db, other.id, 4)
+
+    seen, pages, cursor = [], 0, None
+    while True:
+        rows, cursor = await get_transactions_by_user(db, user.id, cursor=cursor, limit=3)
+        seen += [(row.created_at, row.id) for row in rows]
+        pages += 1
+        if cursor is None:
+            break
+
+    assert pages == 4
+    assert len(seen) == 10 and len(set(seen)) == 10
+    assert seen == sorted(seen, reverse=True)
+
+
+async def test_exact_last_page_has_no_cursor(db, make_user):
+    user = await make_user()
+    await _seed_transactions(db, user.id, 3)
+
+    rows, cursor = await get_transactions_by_user(db, user.id, limit=3)
+
+    assert len(rows) == 3
+    assert cursor is None
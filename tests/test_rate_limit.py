@@ -0,0 +1,95 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from backend import rate_limit as rl
+from backend.rate_limit import Bucket, RateLimit, client_ip
+
+pytestmark = pytest.mark.anyio
+
+
+def _request(forwarded_for=None):
+    headers = [(b"x-forwarded-for", forwarded_for.encode())] if forwarded_for else []
+    return Request({"type": "http", "headers": headers})
+
+
+@pytest.fixture
+def ip_header(monkeypatch):
+    monkeypatch.setattr(rl.settings, "RATE_LIMIT_IP_HEADER", "X-Forwarded-For")
+
+
+async def _passes(limit, user_id=1, request=None):
+    try:
+        await limit(request or _request(), user_id=user_id)
+    except HTTPException as e:
+        assert e.status_code == 429
+        return int(e.headers["Retry-After"])
+    return True
+
+
+async def test_burst_then_429(redis):
+    limit = RateLimit("test", user=Bucket(rate=1, burst=3))
+
+    assert [await _passes(limit) for _ in range(3)] == [True] * 3
+    assert await _passes(limit) == 1
+    # Корзины разных пользователей независимы
+    assert await _passes(limit, user_id=2) is True
+
+
+async def test_retry_after_follows_rate(redis):
+    limit = RateLimit("test", user=Bucket(rate=0.2, burst=1))
+
+    assert await _passes(limit) is True
+    assert await _passes(limit) == 5
+
+
+async def test_ip_bucket_is_shared_by_users(redis, ip_header):
+    limit = RateLimit("test", user=Bucket(rate=1, burst=10), ip=Bucket(rate=1, burst=2))
+    request = _request("10.0.0.1")
+
+    assert await _passes(limit, 1, request) is True
+    assert await _passes(limit, 2, request) is True
+    assert await _passes(limit, 3, request) == 1
+    assert await _passes(limit, 3, _request("10.0.0.2")) is True
+
+
+async def test_rejection_spends_no_tokens(redis, ip_header):
+    # Пустая корзина IP не должна съедать токены пользователя
+    limit = RateLimit("test", user=Bucket(rate=1, burst=2), ip=Bucket(rate=1, burst=1))
+
+    assert await _passes(limit, 1, _request("10.0.0.1")) is True
+    assert await _passes(limit, 1, _request("10.0.0.1")) == 1
+    assert await _passes(limit, 1, _request("10.0.0.2")) is True
+
+
+async def test_disabled(redis, monkeypatch):
+    monkeypatch.setattr(rl.settings, "RATE_LIMIT_ENABLED", False)
+    limit = RateLimit("test", user=Bucket(rate=1, burst=1))
+
+    assert [await _passes(limit) for _ in range(3)] == [True] * 3
+
+
+async def test_redis_outage_lets_requests_through(redis):
+    limit = RateLimit("test", user=Bucket(rate=1, burst=1))
+    redis.connection_pool.connection_kwargs["server"].connected = False
+
+    assert [await _passes(limit) for _ in range(3)] == [True] * 3
+
+
+async def test_script_reloaded_after_flush(redis):
+    limit = RateLimit("test", user=Bucket(rate=1, burst=2))
+    assert await _passes(limit) is True
+
+    await redis.script_flush()
+
+    assert await _passes(limit) is True
+    assert await _passes(limit) == 1
+
+
+def test_client_ip_needs_trusted_header(monkeypatch):
+    assert client_ip(_request("1.1.1.1")) is None
+
+    monkeypatch.setattr(rl.settings, "RATE_LIMIT_IP_HEADER", "X-Forwarded-For")
+    # Клиент может подставить свой адрес в начало — берём последний, дописанный proxy
+    assert client_ip(_request("6.6.6.6, 10.0.0.1")) == "10.0.0.1"
+    assert client_ip(_request()) is None
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from backend import dependencies
+from backend.dependencies import TokenCache, get_current_user_id
+from backend.services.auth_service import auth_service
+
+pytestmark = pytest.mark.anyio
+
+
+def test_hit_and_miss():
+    cache = TokenCache(maxsize=10)
+    cache.put("token-a", 1, time.time() + 60)
+
+    assert cache.get("token-a") == 1
+    assert cache.get("token-b") is None
+
+
+def test_expired_entry_is_dropped():
+    cache = TokenCache(maxsize=10)
+    cache.put("token", 1, time.time() - 1)
+
+    assert cache.get("token") is None
+    assert len(cache._items) == 0
+
+
+def test_lru_eviction():
+    cache = TokenCache(maxsize=2)
+    exp = time.time() + 60
+    cache.put("a", 1, exp)
+    cache.put("b", 2, exp)
+    cache.get("a")          # a — самый свежий
+    cache.put("c", 3, exp)  # вытесняет b
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+async def test_dependency_caches_verified_token(monkeypatch):
+    monkeypatch.setattr(dependencies, "token_cache", TokenCache(maxsize=10))
+    token = auth_service.create_access_token(42)
+
+    assert await get_current_user_id(f"Bearer {token}") == 42
+
+    calls = []
+    monkeypatch.setattr(auth_service, "decode_access_claims", lambda t: calls.append(t))
+    assert await get_current_user_id(f"Bearer {token}") == 42
+    assert calls == []
+
+
+@pytest.mark.parametrize("header", [None, "", "Token abc", "Bearer", "Bearer a b"])
+async def test_dependency_rejects_malformed_header(header):
+    with pytest.raises(HTTPException) as exc:
+        await get_current_user_id(header)
+    assert exc.value.status_code == 401
+
+
+async def test_dependency_rejects_forged_token(monkeypatch):
+    monkeypatch.setattr(dependencies, "token_cache", TokenCache(maxsize=10))
+    token = auth_service.create_access_token(42) + "x"
+
+    with pytest.raises(HTTPException) as exc:
+        await get_current_user_id(f"Bearer {token}")
+    assert exc.value.status_code == 401
+    assert dependencies.token_cache.get(token) is None
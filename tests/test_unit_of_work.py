@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import select, func
+
+from shared_models.db import unit_of_work, on_commit
+from shared_models.crud.user import change_user_balance, get_user_balance
+from shared_models.crud.gift import create_gift, delete_gift
+from shared_models.crud.transactions import create_transaction
+from shared_models.models import Transaction
+from shared_models.schemas.gift import GiftCreate
+from shared_models.schemas.transactions import TransactionCreate
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_rollback_keeps_balance(db, make_user):
+    user_id = (await make_user(coins_balance=100.0)).id
+
+    with pytest.raises(RuntimeError):
+        async with unit_of_work(db):
+            await change_user_balance(db, user_id, coins_delta=-30.0)
+            await create_transaction(db, TransactionCreate(user_id=user_id, type="gift_sale", amount=30.0))
+            raise RuntimeError("boom")
+
+    assert (await get_user_balance(db, user_id)).coins_balance == 100.0
+    assert await db.scalar(select(func.count()).select_from(Transaction)) == 0
+
+
+async def test_commits_on_exit(db, make_user):
+    user_id = (await make_user(coins_balance=100.0)).id
+
+    async with unit_of_work(db):
+        await change_user_balance(db, user_id, coins_delta=-30.0)
+        async with unit_of_work(db):
+            # Вложенный блок присоединяется к внешнему
+            await create_transaction(db, TransactionCreate(user_id=user_id, type="gift_sale", amount=30.0))
+
+    # Откат после выхода ничего не отменяет — всё уже закоммичено
+    await db.rollback()
+    assert (await get_user_balance(db, user_id)).coins_balance == 70.0
+    assert await db.scalar(select(func.count()).select_from(Transaction)) == 1
+
+
+async def test_after_commit_callbacks_only_on_commit(db, make_user):
+    user_id = (await make_user()).id
+    fired = []
+
+    async def callback():
+        fired.append(1)
+
+    with pytest.raises(RuntimeError):
+        async with unit_of_work(db):
+            await change_user_balance(db, user_id, coins_delta=1.0)
+            on_commit(db, callback)
+            raise RuntimeError("boom")
+    assert fired == []
+
+    async with unit_of_work(db):
+        await change_user_balance(db, user_id, coins_delta=1.0)
+        on_commit(db, callback)
+    assert fired == [1]
+
+
+async def test_delete_gift_keeps_transaction_history(db, make_user):
+    user_id = (await make_user()).id
+    gift = await create_gift(db, GiftCreate(name="g", telegram_gift_id="t", cost_coins=5, image_url=""))
+    tx = await create_transaction(db, TransactionCreate(user_id=user_id, type="gift_sale", gift_id=gift.id))
+
+    assert await delete_gift(db, gift.id) is True
+    assert await delete_gift(db, gift.id) is False
+
+    assert await db.scalar(select(Transaction.gift_id).where(Transaction.id == tx.id)) is None
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from shared_models.redis_client import set_redis
+from shared_models.user_lock import UserLocks, UserBusyError, USER_LOCK_KEY
+
+pytestmark = pytest.mark.anyio
+
+
+async def _critical(locks, user_id, trace, delay=0.01):
+    async with locks.hold(user_id):
+        trace.append("in")
+        await asyncio.sleep(delay)
+        trace.append("out")
+
+
+async def test_same_process_is_serialized(redis):
+    locks = UserLocks()
+    trace = []
+
+    await asyncio.gather(*(_critical(locks, 1, trace) for _ in range(5)))
+
+    assert trace == ["in", "out"] * 5
+    assert locks._local == {}
+
+
+async def test_workers_are_serialized_through_redis(redis):
+    # Два экземпляра — два воркера: общая только Redis-блокировка
+    trace = []
+
+    await asyncio.gather(_critical(UserLocks(), 1, trace, 0.05), _critical(UserLocks(), 1, trace, 0.05))
+
+    assert trace == ["in", "out", "in", "out"]
+
+
+async def test_other_users_do_not_wait(redis):
+    locks = UserLocks()
+
+    async with locks.hold(1) as first:
+        async with locks.hold(2, wait=0) as second:
+            assert first is not None and second is not None
+
+
+async def test_busy_after_wait(redis):
+    holder, waiter = UserLocks(), UserLocks()
+
+    async with holder.hold(1):
+        with pytest.raises(UserBusyError):
+            async with waiter.hold(1, wait=0.05):
+                pass
+        # Локальная очередь тоже ограничена ожиданием
+        with pytest.raises(UserBusyError):
+            async with holder.hold(1, wait=0.05):
+                pass
+
+
+async def test_expired_holder_keeps_new_owner_lock(redis):
+    key = USER_LOCK_KEY.format(user_id=1)
+    old = UserLocks(ttl=0.05).hold(1)
+    new = UserLocks().hold(1, wait=0)
+
+    old_token = await old.__aenter__()
+    await asyncio.sleep(0.1)  # блокировка истекла, её забирает другой воркер
+    new_token = await new.__aenter__()
+    assert new_token > old_token
+
+    # Просроченный держатель отпускает только свой токен
+    await old.__aexit__(None, None, None)
+    assert await redis.get(key) == str(new_token)
+
+    await new.__aexit__(None, None, None)
+    assert await redis.exists(key) == 0
+
+
+async def test_local_only_without_redis():
+    set_redis(None)
+    locks = UserLocks()
+    trace = []
+
+    async with locks.hold(1) as token:
+        assert token is None
+
+    await asyncio.gather(*(_critical(locks, 1, trace) for _ in range(3)))
+    assert trace == ["in", "out"] * 3
+
+
+async def test_redis_outage_falls_back_to_local(redis):
+    redis.connection_pool.connection_kwargs["server"].connected = False
+
+    async with UserLocks().hold(1, wait=0) as token:
+        assert token is None
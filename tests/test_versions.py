@@ -0,0 +1,71 @@
+import pytest
+from fastapi import Response
+
+from backend.api.v1.profile import profile_me
+from shared_models import versions
+from shared_models.crud.user import change_user_balance
+from shared_models.redis_client import set_redis
+
+pytestmark = pytest.mark.anyio
+
+
+async def _me(db, user_id, if_none_match=None):
+    response = Response()
+    result = await profile_me(response=response, user_id=user_id, if_none_match=if_none_match, db=db)
+    if isinstance(result, Response):
+        return result.status_code, result.headers.get("etag")
+    return 200, response.headers.get("etag")
+
+
+async def test_profile_me_not_modified(db, redis, make_user):
+    user_id = (await make_user()).id
+
+    status, etag = await _me(db, user_id)
+    assert status == 200 and etag.startswith('W/"')
+
+    assert await _me(db, user_id, if_none_match=etag) == (304, etag)
+
+    await change_user_balance(db, user_id, coins_delta=10.0)
+    status, fresh = await _me(db, user_id, if_none_match=etag)
+    assert status == 200 and fresh != etag
+
+
+async def test_user_version_ttl_is_short(redis):
+    await versions.profile_etag(1)
+
+    assert 0 < await redis.ttl(versions.user_version_key(1)) <= versions.USER_VERSION_TTL
+    assert await redis.ttl(versions.CATALOG_VERSION_KEY) > versions.USER_VERSION_TTL
+
+
+async def test_failed_bump_drops_version(redis, monkeypatch):
+    etag = await versions.profile_etag(1)
+
+    def broken_pipeline(*args, **kwargs):
+        raise ConnectionError("redis blip")
+
+    with monkeypatch.context() as m:
+        m.setattr(redis, "pipeline", broken_pipeline)
+        await versions.bump_user(1)
+
+    assert await redis.exists(versions.user_version_key(1)) == 0
+    assert await versions.profile_etag(1) != etag
+
+
+async def test_no_etag_without_redis(db, make_user):
+    user_id = (await make_user()).id
+    set_redis(None)
+
+    assert await versions.profile_etag(user_id) is None
+    assert await _me(db, user_id) == (200, None)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("*", True),
+    ('W/"1.2"', True),
+    ('"1.2"', True),
+    ('W/"0.1", W/"1.2"', True),
+    ('W/"1.3"', False),
+])
+def test_etag_matches(header, expected):
+    assert versions.etag_matches(header, 'W/"1.2"') is expected